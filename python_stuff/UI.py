@@ -1,17 +1,41 @@
-import socket, time,sys
+import math, os, time,sys
 from enum import Enum
 from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt6.QtGui import QGuiApplication
-from PyQt6.QtNetwork import QTcpSocket,QAbstractSocket
-import struct, math
-
-PACKET_LEN = 20
-A_SENS = 16384.0  # MPU9250/MPU6050 accel LSB/g (adjust if different)
-VBAT_RATIO = 13.21 # voltage max for battery should be 12.6V dont go below 10.5V absolute minimum 9V will fuck it 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+import battery
+from profiler import PROFILER, profiled, span
+from render import RenderScheduler, ScheduledUpdates, StaticLayer
+from commands import CommandScheduler
+from ingest import IngestWorker, LinkState
+from linkmon import OK, STALLED
+from recorder import Recorder
+from protocol import G_SENS, A_SENS
+from replay import ReplaySocket
+from spectrum import AXES, UNITS, WelchSpectrum
+from stabilizer import Stabilizer
+from throttle import InputEngine
+from transport import TRANSPORT_HELP, make_transport
 
 HOST_DEFAULT = "192.168.4.1"
 PORT_DEFAULT = 2323
+TRANSPORT_DEFAULT = "tcp"     # or "udp" (sim_server.py only): one frame per datagram, stale ones dropped
 SEND_HZ = 30
+KEEPALIVE_S = 0.5  # resend an unchanged setpoint this often
+RENDER_HZ = 60   # cap for the dashboard refresh (30 is plenty on battery)
+STAB_HZ = 100    # host level-hold loop (stabilizer.py); its output still goes out at SEND_HZ
+MAX_TILT = math.radians(15)   # level hold: roll/pitch target at full W/A/S/D deflection
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+# keyboard flying: Qt key -> (throttle.InputEngine control, direction); Shift ramps faster
+KEY_BINDINGS = {
+    QtCore.Qt.Key.Key_Up: ('throttle', 1), QtCore.Qt.Key.Key_Down: ('throttle', -1),
+    QtCore.Qt.Key.Key_Right: ('yaw', 1), QtCore.Qt.Key.Key_Left: ('yaw', -1),
+    QtCore.Qt.Key.Key_W: ('pitch', 1), QtCore.Qt.Key.Key_S: ('pitch', -1),
+    QtCore.Qt.Key.Key_D: ('roll', 1), QtCore.Qt.Key.Key_A: ('roll', -1),
+}
 
 class mode(Enum):
     connect = 0
@@ -22,13 +46,16 @@ class mode(Enum):
 
 ## pin23 voltage from battery on divider
 
-class TiltBall(QtWidgets.QWidget):
+class TiltBall(QtWidgets.QWidget, ScheduledUpdates):
     """Unit circle with a dot at (x,y) where x,y ∈ [-1,1]."""
     def __init__(self, diameter=220, parent=None):
         super().__init__(parent)
         self._x = 0.0
         self._y = 0.0
         self._pad = 12
+        self._static = StaticLayer(self._draw_static)
+        self._ballBrush = QtGui.QBrush(QtGui.QColor("#2e8b57"))
+        self._textPen = QtGui.QPen(QtGui.QColor("#666"))
         self.setFixedSize(diameter, diameter)
 
     def set_xy(self, x: float, y: float):
@@ -37,20 +64,21 @@ class TiltBall(QtWidgets.QWidget):
         y = max(-1.0, min(1.0, float(y)))
         if x != self._x or y != self._y:
             self._x, self._y = x, y
-            self.update()
+            self.schedule_update()
 
     # optional: convenience from accelerometer in g's
     def set_from_g(self, ax_g: float, ay_g: float, az_g: float):
         g = (ax_g*ax_g + ay_g*ay_g + az_g*az_g) ** 0.5 or 1.0
         self.set_xy(ax_g / g, ay_g / g)
 
-    def paintEvent(self, ev):
-        p = QtGui.QPainter(self)
-        p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
-
+    def _geometry(self):
         r = self.rect().adjusted(self._pad, self._pad, -self._pad, -self._pad)
         center = QtCore.QPointF(r.center())
         radius = min(r.width(), r.height()) / 2.0
+        return r, center, radius
+
+    def _draw_static(self, p, _w):
+        r, center, radius = self._geometry()
 
         # background
         p.fillRect(self.rect(), QtGui.QColor("#ffffff"))
@@ -66,14 +94,6 @@ class TiltBall(QtWidgets.QWidget):
         p.setPen(pen_circle)
         p.drawEllipse(center, radius, radius)
 
-        # ball
-        px = center.x() + self._x * radius
-        py = center.y() - self._y * radius  # invert Y for screen coords
-        dot_r = 8
-        p.setBrush(QtGui.QBrush(QtGui.QColor("#2e8b57")))
-        p.setPen(QtCore.Qt.PenStyle.NoPen)
-        p.drawEllipse(QtCore.QPointF(px, py), dot_r, dot_r)
-
         # axis ticks (optional)
         p.setPen(QtGui.QPen(QtGui.QColor("#bbb"), 1))
         for t in (-0.5, 0.5):
@@ -82,70 +102,207 @@ class TiltBall(QtWidgets.QWidget):
             p.drawLine(int(center.x()-4), int(center.y() - t*radius),
                        int(center.x()+4), int(center.y() - t*radius))
 
+    @profiled("paint TiltBall")
+    def paintEvent(self, ev):
+        p = QtGui.QPainter(self)
+        # background, grid, circle and ticks come from the cached layer
+        self._static.paint(p, self)
+        p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+        _, center, radius = self._geometry()
+
+        # ball
+        px = center.x() + self._x * radius
+        py = center.y() - self._y * radius  # invert Y for screen coords
+        dot_r = 8
+        p.setBrush(self._ballBrush)
+        p.setPen(QtCore.Qt.PenStyle.NoPen)
+        p.drawEllipse(QtCore.QPointF(px, py), dot_r, dot_r)
+
         # text
-        p.setPen(QtGui.QPen(QtGui.QColor("#666")))
+        p.setPen(self._textPen)
         p.drawText(self.rect().adjusted(4, 4, -4, -4),
                    QtCore.Qt.AlignmentFlag.AlignTop | QtCore.Qt.AlignmentFlag.AlignLeft,
                    f"x={self._x:+.2f}  y={self._y:+.2f}")
         p.end()
 
-class KeyPill(QtWidgets.QLabel):
+class KeyPill(QtWidgets.QWidget):
+    """Rounded key label; pressed state is painted directly (no stylesheet re-polish)."""
     def __init__(self, text: str, parent=None):
-        super().__init__(text, parent)
-        self.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        super().__init__(parent)
+        self._text = text
+        self._pressed = False
         self.setFixedHeight(36)
         self.setMinimumWidth(44)
-        self.setStyleSheet(self._style(False))
+        self._font = QtGui.QFont(self.font())
+        self._boldFont = QtGui.QFont(self.font()); self._boldFont.setWeight(QtGui.QFont.Weight.DemiBold)
+
+    def text(self) -> str:
+        return self._text
+
+    def sizeHint(self):
+        return QtCore.QSize(max(44, self.fontMetrics().horizontalAdvance(self._text) + 24), 36)
 
     def setPressed(self, pressed: bool):
-        self.setStyleSheet(self._style(pressed))
-
-    @staticmethod
-    def _style(pressed: bool) -> str:
-        if pressed:
-            return """
-            QLabel {
-              background-color: #2e8b57;  /* green */
-              color: white;
-              border-radius: 18px;
-              padding: 6px 12px;
-              font-weight: 600;
-            }"""
-        else:
-            return """
-            QLabel {
-              background-color: #e0e0e0;
-              color: #444;
-              border-radius: 18px;
-              padding: 6px 12px;
-            }"""
-
-class BarPair(QtWidgets.QWidget):
-    """Two vertical bars (TX | RX) for a single motor."""
-    def __init__(self, max_value=255,bar_w=56, bar_h=140, parent=None):
+        if pressed != self._pressed:
+            self._pressed = pressed
+            self.update()
+
+    def paintEvent(self, ev):
+        p = QtGui.QPainter(self); p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+        p.setPen(QtCore.Qt.PenStyle.NoPen)
+        p.setBrush(QtGui.QColor("#2e8b57" if self._pressed else "#e0e0e0"))  # green when down
+        p.drawRoundedRect(QtCore.QRectF(self.rect()), 18, 18)
+        p.setPen(QtGui.QColor("white" if self._pressed else "#444"))
+        p.setFont(self._boldFont if self._pressed else self._font)
+        p.drawText(self.rect(), QtCore.Qt.AlignmentFlag.AlignCenter, self._text)
+        p.end()
+
+class MotorPanel(QtWidgets.QWidget, ScheduledUpdates):
+    """
+    TX | RX bar pair plus numbers for every motor, drawn in a single paint.
+    Bars are clamped to 0..max_value; the numbers show the value as given, so
+    an out-of-range echo is visible. Names, bar outlines and number bubbles
+    live in a cached static layer.
+    """
+    def __init__(self, names, max_value=255, bar_w=56, bar_h=140, parent=None):
         super().__init__(parent)
-        self.tx = QtWidgets.QProgressBar(); self.tx.setOrientation(QtCore.Qt.Orientation.Vertical)
-        self.rx = QtWidgets.QProgressBar(); self.rx.setOrientation(QtCore.Qt.Orientation.Vertical)
-        for bar in (self.tx, self.rx):
-            bar.setRange(0, max_value)
-            bar.setTextVisible(False)
-            bar.setFixedSize(bar_w, bar_h)
-            bar.setStyleSheet("""
-                QProgressBar { background:#eee; border:1px solid #ccc; border-radius:3px; }
-                QProgressBar::chunk { background:#2e8b57; }
-            """)
-        lay = QtWidgets.QHBoxLayout(self)
-        lay.setContentsMargins(0,0,0,0); lay.setSpacing(6)
-        lay.addWidget(self.tx); lay.addWidget(self.rx)
+        self._names = tuple(names)
+        self._max = max(1, int(max_value))
+        self._tx = dict.fromkeys(self._names, 0)
+        self._rx = dict.fromkeys(self._names, 0)
+        self._barW, self._barH = bar_w, bar_h
+        self._gap, self._colGap = 6, 18
+        self._headH, self._numH = 24, 28
+        self._static = StaticLayer(self._draw_static)
+        self._fill = QtGui.QColor("#2e8b57")
+        self._numFont = QtGui.QFont("Consolas"); self._numFont.setStyleHint(QtGui.QFont.StyleHint.Monospace)
+        self._numFont.setPixelSize(14)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Fixed)
+        self.setMinimumSize(self.sizeHint())
+
+    def sizeHint(self):
+        n = len(self._names)
+        w = n * (2*self._barW + self._gap) + (n - 1) * self._colGap
+        h = self._headH + self._barH + 8 + self._numH
+        return QtCore.QSize(w, h)
 
     def setMax(self, m: int):
-        self.tx.setRange(0, m); self.rx.setRange(0, m)
+        self._max = max(1, int(m))
+        self.schedule_update()
+
+    def set_tx(self, name: str, v: int):
+        v = int(v)
+        if self._tx[name] != v:
+            self._tx[name] = v
+            self.schedule_update()
+
+    def set_rx(self, name: str, v: int):
+        v = int(v)
+        if self._rx[name] != v:
+            self._rx[name] = v
+            self.schedule_update()
+
+    def _columns(self):
+        """(name, tx bar rect, rx bar rect, tx number rect, rx number rect) per motor."""
+        pair_w = 2*self._barW + self._gap
+        n = len(self._names)
+        spare = self.width() - (n * pair_w + (n - 1) * self._colGap)
+        x = max(0, spare // 2)
+        top = self._headH
+        num_top = top + self._barH + 8
+        for name in self._names:
+            tx = QtCore.QRectF(x, top, self._barW, self._barH)
+            rx = QtCore.QRectF(x + self._barW + self._gap, top, self._barW, self._barH)
+            yield (name, tx, rx,
+                   QtCore.QRectF(tx.left(), num_top, self._barW, self._numH),
+                   QtCore.QRectF(rx.left(), num_top, self._barW, self._numH))
+            x += pair_w + self._colGap
+
+    def _draw_static(self, p, _w):
+        head = QtGui.QFont(self.font()); head.setWeight(QtGui.QFont.Weight.DemiBold)
+        p.setFont(head)
+        for name, tx, rx, txn, rxn in self._columns():
+            p.setPen(QtGui.QColor("#555"))
+            p.drawText(QtCore.QRectF(tx.left(), 0, rx.right() - tx.left(), self._headH),
+                       QtCore.Qt.AlignmentFlag.AlignCenter, name)
+            p.setPen(QtGui.QPen(QtGui.QColor("#ccc"), 1))
+            p.setBrush(QtGui.QColor("#eee"))
+            for bar in (tx, rx):
+                p.drawRoundedRect(bar.adjusted(0.5, 0.5, -0.5, -0.5), 3, 3)
+            p.setPen(QtCore.Qt.PenStyle.NoPen)
+            p.setBrush(QtGui.QColor("#f2f2f2"))
+            for cell in (txn, rxn):
+                p.drawRoundedRect(cell, 6, 6)
+
+    @profiled("paint MotorPanel")
+    def paintEvent(self, ev):
+        p = QtGui.QPainter(self)
+        self._static.paint(p, self)
+        p.setFont(self._numFont)
+        for name, tx, rx, txn, rxn in self._columns():
+            for bar, cell, v in ((tx, txn, self._tx[name]), (rx, rxn, self._rx[name])):
+                h = (bar.height() - 2) * max(0, min(self._max, v)) / self._max   # the number stays raw
+                if h > 0:
+                    p.fillRect(QtCore.QRectF(bar.left() + 1, bar.bottom() - 1 - h, bar.width() - 2, h), self._fill)
+                p.setPen(QtGui.QColor("#333"))
+                p.drawText(cell, QtCore.Qt.AlignmentFlag.AlignCenter, str(v))
+        p.end()
+
+class LatencyView(QtWidgets.QWidget, ScheduledUpdates):
+    """Live log-scale histogram of a latency.LatencyHistogram with p50/p99/p99.9."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hist = None
+        self._count = -1
+        self.setMinimumSize(320, 140)
+
+    def set_histogram(self, hist):
+        self._hist = hist
+        self.schedule_update()
 
-    def setTX(self, v: int):
-        self.tx.setValue(max(0, min(self.tx.maximum(), int(v))))
+    def refresh(self):
+        if self._hist is not None and self._hist.count != self._count:
+            self._count = self._hist.count
+            self.schedule_update()
 
-    def setRX(self, v: int):
-        self.rx.setValue(max(0, min(self.rx.maximum(), int(v))))
+    @profiled("paint LatencyView")
+    def paintEvent(self, ev):
+        p = QtGui.QPainter(self)
+        p.fillRect(self.rect(), QtGui.QColor("#ffffff"))
+        h = self._hist
+        if h is None or not h.count:
+            p.setPen(QtGui.QColor("#999"))
+            p.drawText(self.rect(), QtCore.Qt.AlignmentFlag.AlignCenter, "no echoes yet")
+            p.end()
+            return
+        s = h.summary()
+        plot = QtCore.QRectF(self.rect().adjusted(6, 22, -6, -18))
+        # x: log10(us) from 100 us to 1 s
+        lo, hi = 2.0, 6.0
+        buckets = h.buckets()
+        peak = max(c for _, _, c in buckets)
+        p.setPen(QtCore.Qt.PenStyle.NoPen)
+        p.setBrush(QtGui.QColor("#2e8b57"))
+        for b_lo, b_hi, c in buckets:
+            x0 = (math.log10(max(b_lo, 1)) - lo) / (hi - lo)
+            x1 = (math.log10(b_hi) - lo) / (hi - lo)
+            x0, x1 = max(0.0, x0), min(1.0, x1)
+            if x1 <= x0:
+                continue
+            bh = plot.height() * c / peak
+            p.drawRect(QtCore.QRectF(plot.left() + x0*plot.width(), plot.bottom() - bh,
+                                     max(1.0, (x1 - x0)*plot.width()), bh))
+        p.setPen(QtGui.QColor("#999"))
+        for dec, lab in ((2, "100us"), (3, "1ms"), (4, "10ms"), (5, "100ms"), (6, "1s")):
+            x = plot.left() + (dec - lo) / (hi - lo) * plot.width()
+            p.drawLine(QtCore.QPointF(x, plot.bottom()), QtCore.QPointF(x, plot.bottom() + 3))
+            lx = max(plot.left(), min(x - 30, plot.right() - 60))
+            p.drawText(QtCore.QRectF(lx, plot.bottom() + 2, 60, 14), QtCore.Qt.AlignmentFlag.AlignCenter, lab)
+        p.setPen(QtGui.QColor("#333"))
+        p.drawText(self.rect().adjusted(6, 4, -6, -4), QtCore.Qt.AlignmentFlag.AlignTop | QtCore.Qt.AlignmentFlag.AlignLeft,
+                   f"n={s['count']}  p50 {s['p50_us']/1000:.1f} ms  p99 {s['p99_us']/1000:.1f} ms  "
+                   f"p99.9 {s['p99.9_us']/1000:.1f} ms")
+        p.end()
 
 def triangle_widget(apex: QtWidgets.QWidget, base_left: QtWidgets.QWidget,
                     base_center: QtWidgets.QWidget, base_right: QtWidgets.QWidget) -> QtWidgets.QWidget:
@@ -163,7 +320,85 @@ def triangle_widget(apex: QtWidgets.QWidget, base_left: QtWidgets.QWidget,
     for r in range(2): g.setRowStretch(r, 1)
     return w
 
-class BatteryIndicator(QtWidgets.QWidget):
+class SpectrumView(QtWidgets.QWidget, ScheduledUpdates):
+    """Log-scale PSD of three axes (accel or gyro) with the strongest peak of each."""
+    MARGIN_L, MARGIN_R, MARGIN_T, MARGIN_B = 44, 8, 16, 18
+    COLORS = ("#d62728", "#2ca02c", "#1f77b4")
+
+    def __init__(self, spectrum: WelchSpectrum, parent=None):
+        super().__init__(parent)
+        self.spectrum = spectrum
+        self.group = 0                 # 0: accel axes, 3: gyro axes
+        self._decades = (-5, 0)
+        self._static = StaticLayer(self._draw_static)
+        self._pens = [QtGui.QPen(QtGui.QColor(c), 1.2) for c in self.COLORS]
+        self.setMinimumHeight(140)
+
+    def set_group(self, first_axis: int):
+        self.group = first_axis
+        self._static.invalidate()
+        self.schedule_update()
+
+    def refresh(self):
+        self.schedule_update()
+
+    def _plot_rect(self) -> QtCore.QRectF:
+        return QtCore.QRectF(self.rect()).adjusted(self.MARGIN_L, self.MARGIN_T, -self.MARGIN_R, -self.MARGIN_B)
+
+    def _draw_static(self, p, _w):
+        r = self._plot_rect()
+        p.fillRect(self.rect(), QtGui.QColor("#ffffff"))
+        font = p.font(); font.setPointSizeF(max(6.0, font.pointSizeF() * 0.8)); p.setFont(font)
+        lo, hi = self._decades
+        for d in range(lo, hi + 1):
+            y = r.bottom() - r.height() * (d - lo) / (hi - lo)
+            p.setPen(QtGui.QPen(QtGui.QColor("#e4e4e4"), 1))
+            p.drawLine(QtCore.QPointF(r.left(), y), QtCore.QPointF(r.right(), y))
+            p.setPen(QtGui.QColor("#666"))
+            p.drawText(QtCore.QRectF(0, y - 8, self.MARGIN_L - 4, 16),
+                       QtCore.Qt.AlignmentFlag.AlignRight | QtCore.Qt.AlignmentFlag.AlignVCenter, f"1e{d}")
+        nyq = self.spectrum.fs / 2
+        step = 10 if nyq > 20 else 5
+        for hz in range(0, int(nyq) + 1, step):
+            x = r.left() + r.width() * hz / nyq
+            p.drawText(QtCore.QRectF(x - 15, r.bottom() + 2, 30, 14), QtCore.Qt.AlignmentFlag.AlignHCenter, f"{hz}")
+        p.setPen(QtGui.QPen(QtGui.QColor("#aaa"), 1))
+        p.drawRect(r)
+        unit = UNITS[self.group]
+        p.setPen(QtGui.QColor("#666"))
+        p.drawText(QtCore.QPointF(r.left(), self.MARGIN_T - 4), f"PSD [{unit}²/Hz] vs Hz")
+
+    @profiled("paint SpectrumView")
+    def paintEvent(self, ev):
+        sp = self.spectrum
+        r = self._plot_rect()
+        psd = sp.psd[:, self.group:self.group + 3]
+        if sp.windows:
+            # decade range only moves in whole steps so the cached grid stays valid
+            top = math.ceil(math.log10(max(float(psd[1:].max()), 1e-12)))
+            if top != self._decades[1]:
+                self._decades = (top - 5, top)
+                self._static.invalidate()
+        p = QtGui.QPainter(self)
+        self._static.paint(p, self)
+        if sp.windows:
+            lo, hi = self._decades
+            x = r.left() + r.width() * sp.freqs / (sp.fs / 2)
+            y = r.bottom() - r.height() * (np.log10(np.maximum(psd, 10.0 ** lo)) - lo) / (hi - lo)
+            p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+            label_x = r.right() - 4
+            for j in range(3):
+                p.setPen(self._pens[j])
+                p.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(a, b) for a, b in zip(x.tolist(), y[:, j].tolist())]))
+                peak = sp.peaks(self.group + j, 1)
+                if peak:
+                    text = f"{AXES[self.group + j]} {peak[0][0]:.1f} Hz"
+                    p.drawText(QtCore.QRectF(label_x - 120, r.top() + 2 + 14 * j, 120, 14),
+                               QtCore.Qt.AlignmentFlag.AlignRight, text)
+        p.end()
+
+
+class BatteryIndicator(QtWidgets.QWidget, ScheduledUpdates):
     """
     Battery symbol with percentage and voltage.
     Call set_voltage(volts, cells=3) to update (percent auto-calculated).
@@ -175,6 +410,8 @@ class BatteryIndicator(QtWidgets.QWidget):
         self._percent = 0.0
         self._ema = None   # simple smoothing
         self._ema_alpha = 0.15
+        self._remaining = None
+        self._outline = StaticLayer(self._draw_outline)
         self.setFixedSize(500, 120)
         self.setToolTip("Battery")
 
@@ -186,32 +423,19 @@ class BatteryIndicator(QtWidgets.QWidget):
         self._ema = v if self._ema is None else (1-self._ema_alpha)*self._ema + self._ema_alpha*v
         self._volts = self._ema
         self._percent = self._estimate_soc_percent(self._volts / max(1, self._cells))
-        self.update()
+        self.schedule_update()
 
-    def set_percent(self, percent: float, volts: float | None = None):
+    def set_percent(self, percent: float, volts: float | None = None, remaining_s: float | None = None):
         self._percent = max(0.0, min(100.0, float(percent)))
         if volts is not None:
             self._volts = float(volts)
-        self.update()
+        self._remaining = remaining_s
+        self.schedule_update()
 
-    # --- LiPo OCV table (rough, per-cell, at rest) & interpolation ---
     def _estimate_soc_percent(self, vpc: float) -> float:
-        table = [
-            (4.20, 100), (4.15, 95), (4.10, 90), (4.05, 85),
-            (4.00, 78), (3.95, 70), (3.90, 62), (3.85, 56),
-            (3.80, 45), (3.75, 35), (3.70, 25), (3.65, 18),
-            (3.60, 12), (3.55,  9), (3.50,  7), (3.45,  4),
-            (3.40,  2), (3.30,  0),
-        ]
-        if vpc >= table[0][0]: return 100.0
-        if vpc <= table[-1][0]: return 0.0
-        for i in range(len(table)-1):
-            v1, p1 = table[i]
-            v2, p2 = table[i+1]
-            if v2 <= vpc <= v1:
-                t = (vpc - v2) / (v1 - v2)
-                return p2 + t*(p1 - p2)
-        return 0.0
+        lut = battery.soc_lut(self._cells)
+        code = round(vpc * self._cells / battery.VBAT_RATIO * battery.ADC_MAX)
+        return float(lut[max(0, min(battery.ADC_MAX, code))])
 
     def _fill_color(self):
         p = self._percent
@@ -220,24 +444,30 @@ class BatteryIndicator(QtWidgets.QWidget):
         return QtGui.QColor("#d32f2f")              # red
 
     # --- painting ---
-    def paintEvent(self, ev):
-        p = QtGui.QPainter(self); p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+    def _body(self):
         rect = self.rect().adjusted(8, 8, -8, -8)
+        return QtCore.QRectF(rect.left(), rect.top(), rect.width()-18, rect.height())
 
+    def _draw_outline(self, p, _w):
         # battery body + cap geometry
-        body = QtCore.QRectF(rect.left(), rect.top(), rect.width()-18, rect.height())
+        body = self._body()
         cap_w = 10
         cap_h = body.height() * 0.45
         cap = QtCore.QRectF(body.right()+2, body.center().y()-cap_h/2, cap_w, cap_h)
 
-        # outline
         p.setPen(QtGui.QPen(QtGui.QColor("#666"), 2))
         p.setBrush(QtCore.Qt.BrushStyle.NoBrush)
         p.drawRoundedRect(body, 6, 6)
         p.drawRoundedRect(cap, 3, 3)
 
+    @profiled("paint BatteryIndicator")
+    def paintEvent(self, ev):
+        p = QtGui.QPainter(self)
+        self._outline.paint(p, self)
+        p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+
         # fill
-        inner = body.adjusted(4, 4, -4, -4)
+        inner = self._body().adjusted(4, 4, -4, -4)
         pct = max(0.0, min(1.0, self._percent/100.0))
         fill_w = inner.width() * pct
         fill_rect = QtCore.QRectF(inner.left(), inner.top(), fill_w, inner.height())
@@ -248,10 +478,59 @@ class BatteryIndicator(QtWidgets.QWidget):
         # text (volts + percent)
         p.setPen(QtGui.QPen(QtGui.QColor("#333")))
         txt = f"{self._volts:4.2f} V  ({self._percent:3.0f}%)"
+        if self._remaining is not None:
+            txt += f"  ~{self._remaining / 60:.0f} min"
         p.drawText(self.rect().adjusted(0, 0, -6, -6),
                    QtCore.Qt.AlignmentFlag.AlignRight | QtCore.Qt.AlignmentFlag.AlignBottom, txt)
         p.end()
 
+class ProfilerOverlay(QtWidgets.QWidget):
+    """Per-stage timings from profiler.PROFILER over the last second, drawn over the window."""
+    COLUMNS = f"{'stage':<26}{'/s':>6}{'mean':>9}{'max':>9}{'busy':>7}"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(QtCore.Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self._lines = []
+        self._font = QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.SystemFont.FixedFont)
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.setInterval(250)
+        self.hide()
+
+    def set_active(self, on: bool):
+        self.setVisible(on)
+        if on:
+            self.timer.start()
+            self.refresh()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        self._lines = [self.COLUMNS] + [
+            f"{name[:25]:<26}{st['count']:>6}{st['mean_us'] / 1000:>7.2f}ms{st['max_us'] / 1000:>7.2f}ms"
+            f"{st['busy_pct']:>6.1f}%" for name, st in PROFILER.stats(1.0).items()]
+        fm = QtGui.QFontMetrics(self._font)
+        w = fm.horizontalAdvance(self.COLUMNS) + 16
+        h = fm.lineSpacing() * len(self._lines) + 12
+        parent = self.parentWidget()
+        self.setGeometry(parent.width() - w - 8, 8, w, h)
+        self.raise_()
+        self.update()
+
+    def paintEvent(self, ev):
+        p = QtGui.QPainter(self)
+        p.fillRect(self.rect(), QtGui.QColor(0, 0, 0, 180))
+        p.setFont(self._font)
+        p.setPen(QtGui.QColor("#e0e0e0"))
+        fm = p.fontMetrics()
+        y = 6 + fm.ascent()
+        for line in self._lines:
+            p.drawText(8, y, line)
+            y += fm.lineSpacing()
+        p.end()
+
+
 class drone_UI(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -262,9 +541,9 @@ class drone_UI(QtWidgets.QMainWindow):
               'BackLeft':0,
               'BackRight':0}
 
-        self.step = 1
-
         self.fullPower = 180
+        # keyboard flying: held keys integrated over time, mixed into MotorPowers
+        self.input = InputEngine(self.fullPower)
 
         self.pressed = set()
 
@@ -302,6 +581,25 @@ class drone_UI(QtWidgets.QMainWindow):
         leftLayout.addWidget(self.btnStopMotors)
         leftLayout.addWidget(self.btnFlyPS4)
         leftLayout.addWidget(self.btnFlyKeyboard)
+        # closed-loop roll/pitch hold on the host; W/A/S/D then set target angles
+        self.chkLevel = QtWidgets.QCheckBox("Hold level (host stabilizer)")
+        leftLayout.addWidget(self.chkLevel)
+
+        # vibration spectrum of the IMU axes (motor balance, damaged props)
+        self.spectrum = self.spectrumView = None
+        if np is not None:
+            specBox = QtWidgets.QGroupBox("Vibration spectrum")
+            specLay = QtWidgets.QVBoxLayout(specBox)
+            self.spectrumAxes = QtWidgets.QComboBox()
+            self.spectrumAxes.addItem("Accel ax ay az", 0)
+            self.spectrumAxes.addItem("Gyro gx gy gz", 3)
+            self.spectrum = WelchSpectrum()
+            self.spectrumView = SpectrumView(self.spectrum)
+            self.spectrumAxes.currentIndexChanged.connect(
+                lambda _i: self.spectrumView.set_group(self.spectrumAxes.currentData()))
+            specLay.addWidget(self.spectrumAxes, 0, QtCore.Qt.AlignmentFlag.AlignRight)
+            specLay.addWidget(self.spectrumView, 1)
+            leftLayout.addWidget(specBox, 2)
         leftLayout.addStretch(1)
         self.battery = BatteryIndicator(cells=3)  # 3S LiPo
         leftLayout.addWidget(self.battery, 0,
@@ -369,6 +667,7 @@ class drone_UI(QtWidgets.QMainWindow):
         self.btnStartMotors.clicked.connect(self.on_start_clicked)
         self.btnStopMotors.clicked.connect(self.on_stop_clicked)
         self.btnFlyKeyboard.clicked.connect(self.on_fly_keyboard_clicked)
+        self.chkLevel.toggled.connect(self.on_hold_level_toggled)
 
 
         self.stopToggle = False
@@ -380,68 +679,97 @@ class drone_UI(QtWidgets.QMainWindow):
         self.btnStopMotors.setEnabled(False) 
         self.btnFlyPS4.setEnabled(False) 
         self.btnFlyKeyboard.setEnabled(False) 
+        self.chkLevel.setEnabled(False)
+        self.stabilizer = None
 
-        # RIGHT: placeholder area (put plot/canvas/telemetry here later)
+        # RIGHT: latency + tilt, strip charts, motor I/O
         right = QtWidgets.QFrame()
         right.setFrameShape(QtWidgets.QFrame.Shape.StyledPanel)
         rightLayout = QtWidgets.QVBoxLayout(right)
         rightLayout.setContentsMargins(16, 16, 16, 16)
-        rightLayout.addStretch(1)
 
         self.tiltBall = TiltBall(diameter=500)
 
-        # make sure it sits in the top-right corner
-        rightLayout.addWidget(self.tiltBall, 0, QtCore.Qt.AlignmentFlag.AlignTop | QtCore.Qt.AlignmentFlag.AlignRight)
+        # command -> echo round trip, next to the tilt ball
+        latBox = QtWidgets.QGroupBox("Command → echo latency")
+        latLay = QtWidgets.QVBoxLayout(latBox)
+        self.latencyView = LatencyView()
+        btnExportLatency = QtWidgets.QPushButton("Export…")
+        btnExportLatency.clicked.connect(self.on_export_latency_clicked)
+        btnExportLink = QtWidgets.QPushButton("Link report…")
+        btnExportLink.clicked.connect(self.on_export_link_clicked)
+        latLay.addWidget(self.latencyView, 1)
+        exportRow = QtWidgets.QHBoxLayout()
+        exportRow.addStretch(1)
+        exportRow.addWidget(btnExportLink)
+        exportRow.addWidget(btnExportLatency)
+        latLay.addLayout(exportRow)
+
+        # tilt source: raw accelerometer, or the gyro+accel estimator (steadier under vibration)
+        self.tiltSource = QtWidgets.QComboBox()
+        self.tiltSource.addItem("Accelerometer", "accel")
+        self.tiltSource.addItem("Fused gyro + accel", "fused")
+        self.tiltSource.setCurrentIndex(1)
+        self.attitudeLabel = QtWidgets.QLabel("")
+        tiltCol = QtWidgets.QVBoxLayout()
+        tiltCol.addWidget(self.tiltBall)
+        tiltRow = QtWidgets.QHBoxLayout()
+        tiltRow.addWidget(self.tiltSource)
+        tiltRow.addWidget(self.attitudeLabel, 1)
+        tiltCol.addLayout(tiltRow)
+
+        # make sure the ball sits in the top-right corner
+        topRow = QtWidgets.QHBoxLayout()
+        topRow.addWidget(latBox, 1, QtCore.Qt.AlignmentFlag.AlignTop)
+        topRow.addLayout(tiltCol, 0)
+        rightLayout.addLayout(topRow)
+
+        # scrolling telemetry; bounded ring buffers, min/max per pixel column
+        self.charts = []
+        if np is not None:
+            from stripchart import StripChart
+            chartBox = QtWidgets.QGroupBox("Telemetry")
+            chartLay = QtWidgets.QVBoxLayout(chartBox)
+            self.chartSpan = QtWidgets.QComboBox()
+            for label, secs in (("10 s", 10), ("1 min", 60), ("10 min", 600)):
+                self.chartSpan.addItem(label, secs)
+            self.chartSpan.setCurrentIndex(2)
+            self.chartSpan.currentIndexChanged.connect(
+                lambda _i: [c.set_span(self.chartSpan.currentData()) for c in self.charts])
+            chartLay.addWidget(self.chartSpan, 0, QtCore.Qt.AlignmentFlag.AlignRight)
+            self.accelChart = StripChart("Accel", unit="g")
+            self.gyroChart = StripChart("Gyro", unit="°/s")
+            self.batteryChart = StripChart("Battery", unit="V")
+            self.motorChart = StripChart("Motors TX / RX", unit="deg", y_range=(0, 180))
+            for name, color in zip(("ax", "ay", "az"), ("#d62728", "#2ca02c", "#1f77b4")):
+                self.accelChart.add_series(name, color)
+            for name, color in zip(("gx", "gy", "gz"), ("#d62728", "#2ca02c", "#1f77b4")):
+                self.gyroChart.add_series(name, color)
+            self.batteryChart.add_series("pack", "#ff7f0e")
+            motorColors = ("#1f77b4", "#ff7f0e", "#2ca02c", "#9467bd")
+            for name, color in zip(("FL", "FR", "BL", "BR"), motorColors):
+                self.motorChart.add_series(f"{name} rx", color)
+            for name, color in zip(("FL", "FR", "BL", "BR"), motorColors):
+                self.motorChart.add_series(f"{name} tx", QtGui.QColor(color).lighter(150).name())
+            self.charts = [self.accelChart, self.gyroChart, self.batteryChart, self.motorChart]
+            for c in self.charts:
+                chartLay.addWidget(c, 1)
+            rightLayout.addWidget(chartBox, 2)
+            self.chartBox = chartBox
 
 
         self.order = ('FrontLeft','FrontRight','BackLeft','BackRight')
 
-        # bars row (TX|RX pair per motor)
-        self.barPairs, self.txLabels, self.rxLabels = {}, {}, {}
+        # TX|RX bars + numbers for every motor, painted by one widget
         CELL_W, BAR_H = 120,400
 
         ioBox = QtWidgets.QGroupBox("Motor I/O")
         ioBox.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding,
                             QtWidgets.QSizePolicy.Policy.Expanding)
-        ioGrid = QtWidgets.QGridLayout(ioBox)
-        ioGrid.setContentsMargins(0,10,10,10)
-        ioGrid.setHorizontalSpacing(18)
-        ioGrid.setVerticalSpacing(8)
-
-        # header row
-        ioGrid.addWidget(QtWidgets.QLabel(""), 0, 0)
-        for c, name in enumerate(self.order, start=1):
-            lab = QtWidgets.QLabel(name)
-            lab.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-            lab.setStyleSheet("color:#555; font-weight:600;")
-            ioGrid.addWidget(lab, 0, c)
-
-        # helper to make numeric "bubble"
-        def _mkCell():
-            lbl = QtWidgets.QLabel("0")
-            lbl.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-            lbl.setFixedWidth(CELL_W)  # <- match bar width
-            lbl.setStyleSheet("font-family: Consolas, monospace; font-size:14px; "
-                            "background:#f2f2f2; border-radius:6px; padding:4px 6px;")
-            return lbl
-
-        # one column per motor: bars (TX|RX) on top, numbers (TX RX) on one line below
-        for c, name in enumerate(self.order, start=1):
-            col = QtWidgets.QWidget()
-            v = QtWidgets.QVBoxLayout(col)
-            v.setContentsMargins(0,0,0,0); v.setSpacing(6)
-
-            bp = BarPair(self.fullPower, bar_w=CELL_W, bar_h=BAR_H)
-            self.barPairs[name] = bp
-            v.addWidget(bp, alignment=QtCore.Qt.AlignmentFlag.AlignHCenter)
-
-            rowNums = QtWidgets.QHBoxLayout(); rowNums.setSpacing(8)
-            tx = _mkCell(); rx = _mkCell()
-            self.txLabels[name] = tx; self.rxLabels[name] = rx
-            rowNums.addWidget(tx); rowNums.addWidget(rx)
-            v.addLayout(rowNums)
-
-            ioGrid.addWidget(col, 1, c, alignment=QtCore.Qt.AlignmentFlag.AlignHCenter)
+        ioLay = QtWidgets.QVBoxLayout(ioBox)
+        ioLay.setContentsMargins(0,10,10,10)
+        self.motorPanel = MotorPanel(self.order, self.fullPower, bar_w=CELL_W, bar_h=BAR_H)
+        ioLay.addWidget(self.motorPanel)
 
         # Put it at the bottom of the right column
         rightLayout.addWidget(ioBox, 1)
@@ -453,12 +781,45 @@ class drone_UI(QtWidgets.QMainWindow):
         # Status bar
         self.statusBar().showMessage("Ready")
 
-        # hold-to-ramp state + timer
-        self.hold_up = False
-        self.hold_down = False
-        self.holdTimer = QtCore.QTimer(self)
-        self.holdTimer.setInterval(30)  # ~33 Hz; tweak to taste
-        self.holdTimer.timeout.connect(self._tick_hold)
+        # while keys are held the ramp is brought up to date once per send period; how
+        # late this fires only changes step size, the rate comes from elapsed time
+        self.inputTimer = QtCore.QTimer(self)
+        self.inputTimer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.inputTimer.setInterval(int(1000 / SEND_HZ))
+        self.inputTimer.timeout.connect(self._tick_input)
+
+        # telemetry comes from the ingest thread; its latest snapshot is pulled once
+        # per render tick (a timer at the display's refresh rate) and widgets
+        # repaint at most once per tick
+        self.host, self.port = HOST_DEFAULT, PORT_DEFAULT
+        self.transport = TRANSPORT_DEFAULT
+        self.link = None
+        self.commands = None
+        self.recorder = None
+        self.replay = None
+        self.logCharts = []
+        self.shm_name = None      # publish decoded telemetry to this shared-memory ring (shm.py)
+        self.ring = None
+        self.txLabel = QtWidgets.QLabel("")
+        self.recLabel = QtWidgets.QLabel("")
+        self.rxLabel = QtWidgets.QLabel("")
+        self.linkLabel = QtWidgets.QLabel("")
+        self._linkLevel = OK
+        self.statusBar().addPermanentWidget(self.linkLabel)
+        self.statusBar().addPermanentWidget(self.rxLabel)
+        self.statusBar().addPermanentWidget(self.txLabel)
+        self.statusBar().addPermanentWidget(self.recLabel)
+        self.render = RenderScheduler(RENDER_HZ, self)
+        self.render.frame.connect(self._poll_ingest)
+        for w in (self.tiltBall, self.battery, self.motorPanel, self.latencyView, *self.charts,
+                  *([self.spectrumView] if self.spectrumView else [])):
+            w.scheduler = self.render
+        self.render.start()
+
+        # F12: hot-path profiler on/off with its overlay; Shift+F12: save the last seconds as a trace
+        self.profOverlay = ProfilerOverlay(central)
+        QtGui.QShortcut(QtGui.QKeySequence("F12"), self, activated=self.toggle_profiler)
+        QtGui.QShortcut(QtGui.QKeySequence("Shift+F12"), self, activated=self.on_export_trace)
 
     # ----- Handlers (stubs) -----
 
@@ -466,26 +827,113 @@ class drone_UI(QtWidgets.QMainWindow):
         self.btnConnect.setEnabled(False)
         self.btnConnect.setText("Connecting...")
         self.btnConnect.setStyleSheet("QPushButton { background-color: orange; color: white; }")
-        self.s = QTcpSocket(self)
-        self.rxbuf = bytearray()
-        self.s.readyRead.connect(self._on_ready_read)
-        self.s.connected.connect(lambda: (
-            self.btnConnect.setText("Connected!"),
-            self.btnConnect.setStyleSheet("QPushButton { background: green; color: white; }"),
-            self.btnConnect.setEnabled(False),
-            self.btnDisconnect.setEnabled(True),
-            self.btnStartMotors.setEnabled(True),
-            self.btnStopMotors.setEnabled(True), 
-            self.btnFlyPS4.setEnabled(True),
-            self.btnFlyKeyboard.setEnabled(True)
-        ))
-        self.s.errorOccurred.connect(lambda e: (
-            self.btnConnect.setText("Connection failed, try again?"),
-            self.btnConnect.setStyleSheet("QPushButton { background: red; color: white; }"),
-            self.btnConnect.setEnabled(True)
-            
-        ))
-        self.s.connectToHost("192.168.4.1", 2323)
+        # link reads + decoding live on the ingest thread; we just poll its snapshot
+        # every session is recorded (raw frames + motor commands) to logs/
+        os.makedirs(LOG_DIR, exist_ok=True)
+        if self.recorder is not None:
+            self.recorder.close()
+        self.recorder = Recorder(os.path.join(LOG_DIR, time.strftime("flight_%Y%m%d_%H%M%S.dlog")))
+        self._start_link(IngestWorker(make_transport(self.transport, self.host, self.port),
+                                      recorder=self.recorder, ring=self._ring()))
+
+    def start_replay(self, path: str, speed: float = 1.0):
+        """Fly a recorded log through the same ingest/snapshot path as a live link."""
+        self.replay = ReplaySocket(path, speed)
+        self.btnConnect.setEnabled(False)
+        self.btnConnect.setText(f"Replay {os.path.basename(path)} @ {speed:g}x" if speed > 0
+                                else f"Replay {os.path.basename(path)} (max speed)")
+        log = self.replay.log
+        self.replaySlider = QtWidgets.QSlider(QtCore.Qt.Orientation.Horizontal)
+        self.replaySlider.setRange(0, max(0, (log.t_end - log.t_start) // 1_000_000))
+        self.replaySlider.setMinimumWidth(300)
+        self.replaySlider.sliderReleased.connect(
+            lambda: self.replay.seek(log.t_start + self.replaySlider.value() * 1_000_000))
+        self.statusBar().addPermanentWidget(self.replaySlider)
+        if self.charts:
+            self._add_log_charts(path)
+        self._start_link(IngestWorker(self.replay, ring=self._ring()))
+
+    def _add_log_charts(self, path: str):
+        """Whole-flight view of the replayed log over the live charts, drawn from its
+        min/max pyramid (built and saved on first open). Click to seek, wheel to zoom."""
+        from pyramid import Pyramid
+        from stripchart import LogChart
+        pyr = Pyramid.open(path)
+        if not pyr.frames:
+            return
+        sync = lambda view: [c.set_view(*view) for c in self.logCharts]
+        accel = LogChart(pyr, "Flight accel", unit="g", on_seek=self.replay.seek, on_view=sync)
+        for name, color in zip(("ax", "ay", "az"), ("#d62728", "#2ca02c", "#1f77b4")):
+            accel.add_series(name, color, convert=lambda v: v / A_SENS)
+        motors = LogChart(pyr, "Flight motors", unit="deg", y_range=(0, 180), on_seek=self.replay.seek, on_view=sync)
+        for name, ch, color in zip(("FL", "FR", "BL", "BR"), ("m_fl", "m_fr", "m_bl", "m_br"),
+                                   ("#1f77b4", "#ff7f0e", "#2ca02c", "#9467bd")):
+            motors.add_series(name, color, ch)
+        self.logCharts = [accel, motors]
+        lay = self.chartBox.layout()
+        for i, c in enumerate(self.logCharts):
+            c.scheduler = self.render
+            lay.insertWidget(1 + i, c, 1)
+
+    def _ring(self):
+        if self.ring is None and self.shm_name:
+            from shm import ShmRingWriter
+            try:
+                self.ring = ShmRingWriter(self.shm_name)
+            except FileExistsError as e:
+                self.shm_name = None            # fly without publishing; don't ask again
+                QtWidgets.QMessageBox.warning(self, "Shared memory", f"Not publishing telemetry: {e}")
+        return self.ring
+
+    def _start_link(self, worker):
+        self.chkLevel.setChecked(False)
+        if self.commands is not None:
+            self.commands.stop()
+        self.link = worker
+        # motor packets leave at SEND_HZ from their own thread, newest setpoint wins
+        self.commands = CommandScheduler(self._send_packet, SEND_HZ, KEEPALIVE_S).start()
+        self.latencyView.set_histogram(worker.echo.hist)
+        if self.spectrum is not None:
+            self.spectrum.reset()
+        self._linkState = None
+        self._linkLevel = OK
+        self._lastSeq = 0
+        self.link.start()
+
+    def on_export_latency_clicked(self):
+        if self.link is None:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export latency histogram", "latency.json", "JSON (*.json)")
+        if path:
+            self.link.echo.hist.export(path)
+            self.statusBar().showMessage(f"Latency histogram saved to {path}")
+
+    def toggle_profiler(self, on: bool | None = None):
+        on = not PROFILER.enabled if on is None else on
+        PROFILER.enable(on)
+        if on:
+            PROFILER.clear()
+        self.profOverlay.set_active(on)
+        self.statusBar().showMessage("Profiler on (Shift+F12 saves a trace)" if on else "Profiler off", 3000)
+
+    def on_export_trace(self):
+        if not PROFILER.enabled:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export trace (chrome://tracing, ui.perfetto.dev)", "trace.json", "JSON (*.json)")
+        if path:
+            n = PROFILER.export_chrome(path)
+            self.statusBar().showMessage(f"{n} spans from the last {PROFILER.seconds:g} s saved to {path}")
+
+    def on_export_link_clicked(self):
+        if self.link is None:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export link report", "link.json", "JSON (*.json)")
+        if path:
+            self.link.linkmon.export(path)
+            self.statusBar().showMessage(f"Link report saved to {path}")
 
     def on_disconnect_clicked(self):
         pass 
@@ -551,32 +999,62 @@ class drone_UI(QtWidgets.QMainWindow):
                         self.btnStartMotors.setEnabled(False)
                         self.btnStartMotors.setStyleSheet("QPushButton { background: red; color: white; }")
         
-    def send_powers(self):
-        if not self.s or self.s.state() != QAbstractSocket.SocketState.ConnectedState:
+    def send_powers(self, urgent: bool = False, input_t_ns: int | None = None):
+        # only updates the setpoint; CommandScheduler puts it on the wire at SEND_HZ
+        if self.link is None or self.link.state != LinkState.connected:
             return
         data = bytes([self.MotorPowers[m] for m in self.MotorPowers])  # 4 bytes
-        self.s.write(data)
+        if input_t_ns is not None and data != self.commands.setpoint:
+            self.input.mark_input(input_t_ns)
+        self.commands.set(data, urgent)
         for name, val in zip(self.order, data):
-            self.txLabels[name].setText(str(val))
-            self.barPairs[name].setTX(val)
+            self.motorPanel.set_tx(name, val)
 
     def on_stop_clicked(self):
         self.stopToggle = not self.stopToggle
         if self.stopToggle:
             self.btnStopMotors.setText("Motors stoped, press to enable")
             self.btnStopMotors.setStyleSheet("QPushButton { background: red; color: white; }")
+            if self.stabilizer is not None:
+                # first: its next tick would overwrite the stop with its old throttle
+                self.stabilizer.stop()
+                self.stabilizer = None
             for m in self.MotorPowers:
                 self.MotorPowers[m] = 0
-            self.send_powers()
+            self.input.reset()
+            self.inputTimer.stop()
+            self.send_powers(urgent=True)   # don't wait for the next tick
             self.btnFlyKeyboard.setEnabled(False)
             self.btnFlyPS4.setEnabled(False)
             if self.flyKeyboardToggle:
                 self.on_fly_keyboard_clicked()
+            self.chkLevel.setChecked(False)
+            self.chkLevel.setEnabled(False)
         else:
             self.btnStopMotors.setText("Motors enabled, press to stop")
             self.btnStopMotors.setStyleSheet("QPushButton { background: green; color: white; }")
             self.btnFlyKeyboard.setEnabled(True)
             self.btnFlyPS4.setEnabled(True)         
+            self.chkLevel.setEnabled(True)
+
+    def on_hold_level_toggled(self, on: bool):
+        if self.stabilizer is not None:
+            self.stabilizer.stop()
+            self.stabilizer = None
+        if on:
+            if self.link is None or self.link.state != LinkState.connected or self.stopToggle:
+                self.chkLevel.setChecked(False)
+                return
+            if not self.flyKeyboardToggle:
+                # hold at whatever the motors are at now
+                self.input.reset(sum(self.MotorPowers.values()) / len(self.MotorPowers))
+            link = self.link
+            self.stabilizer = Stabilizer(lambda: link.latest, self._stab_send, STAB_HZ, self.fullPower)
+            self._apply_input()
+            self.stabilizer.start()
+            self.statusBar().showMessage(f"Level hold on ({STAB_HZ} Hz)", 3000)
+        else:
+            self._apply_input()
 
     def on_fly_ps4_clicked(self):
         pass
@@ -588,6 +1066,8 @@ class drone_UI(QtWidgets.QMainWindow):
             self.btnFlyKeyboard.setStyleSheet("QPushButton { background: green; color: white; }")
             self.btnFlyPS4.setEnabled(False)
             self.kbOverlay.setVisible(True)
+            # pick up from whatever the motors are at now
+            self.input.reset(sum(self.MotorPowers.values()) / len(self.MotorPowers))
         else:
             self.btnFlyKeyboard.setText("Flying Keyboard OFF")
             self.btnFlyKeyboard.setStyleSheet("QPushButton { background: orange; color: white; }")
@@ -607,106 +1087,221 @@ class drone_UI(QtWidgets.QMainWindow):
             pill.setPressed(down)
 
     def eventFilter(self, obj, ev):
-        if ev.type() == QtCore.QEvent.Type.KeyPress and not ev.isAutoRepeat():
-            key = ev.key()
-            # start holding
-            if key == QtCore.Qt.Key.Key_Up:
-                self.hold_up = True
-                if not self.holdTimer.isActive():
-                    self.holdTimer.start()
-            elif key == QtCore.Qt.Key.Key_Down:
-                self.hold_down = True
-                if not self.holdTimer.isActive():
-                    self.holdTimer.start()
-            self._set_key(key, True)
-            return False
-
-        elif ev.type() == QtCore.QEvent.Type.KeyRelease and not ev.isAutoRepeat():
+        kind = ev.type()
+        if kind in (QtCore.QEvent.Type.KeyPress, QtCore.QEvent.Type.KeyRelease) and not ev.isAutoRepeat():
+            t = time.monotonic_ns()           # the input stamp key-to-wire latency is measured from
+            down = kind == QtCore.QEvent.Type.KeyPress
             key = ev.key()
-            # stop holding
-            if key == QtCore.Qt.Key.Key_Up:
-                self.hold_up = False
-            elif key == QtCore.Qt.Key.Key_Down:
-                self.hold_down = False
-            # stop timer if nothing held
-            if not self.hold_up and not self.hold_down and self.holdTimer.isActive():
-                self.holdTimer.stop()
-            # (your existing pill highlight)
-            self._set_key(key, False)
-            return False
-
+            if self.kbOverlay.isVisible() and not self.stopToggle:
+                binding = KEY_BINDINGS.get(key)
+                if binding is not None:
+                    (self.input.press if down else self.input.release)(*binding, t)
+                elif key == QtCore.Qt.Key.Key_Shift:
+                    self.input.set_boost(down, t)
+                if binding is not None or key == QtCore.Qt.Key.Key_Shift:
+                    self._apply_input(t, urgent=down)
+                    if self.input.active and not self.inputTimer.isActive():
+                        self.inputTimer.start()
+            self._set_key(key, down)
         return False
 
-    def _tick_hold(self):
+    def _tick_input(self):
         # only act when keyboard overlay is visible and motors enabled
-        if not self.kbOverlay.isVisible() or self.stopToggle:
+        if not self.kbOverlay.isVisible() or self.stopToggle or not self.input.active:
+            self.inputTimer.stop()
             return
-        mods = QtWidgets.QApplication.keyboardModifiers()
-        step_size = self.step*4 if (mods & QtCore.Qt.KeyboardModifier.ShiftModifier) else self.step
-        delta = ((1 if self.hold_up else 0) - (1 if self.hold_down else 0)) * step_size
-        if delta != 0:
-            self._bump_all(delta)
-        else:
-            # nothing held anymore; stop timer
-            self.holdTimer.stop()
-
-    def _bump_all(self, delta: int):
-        for m in self.MotorPowers:
-            pwr = self.MotorPowers[m] + delta
-            if pwr > self.fullPower:
-                self.MotorPowers[m] = self.fullPower 
-            elif pwr < 0: 
-               self.MotorPowers[m] = 0
-            else: 
-                self.MotorPowers[m] = pwr
-        self.send_powers()
-
-    def _on_ready_read(self):
-        # accumulate bytes
-        self.rxbuf.extend(self.s.readAll().data())
-        # process whole frames
-        while len(self.rxbuf) >= PACKET_LEN:
-            frame = bytes(self.rxbuf[:PACKET_LEN])
-            del self.rxbuf[:PACKET_LEN]
-            self._handle_frame(frame)
-
-
-    def _handle_frame(self, frame: bytes):
-        # 0..3: motor bytes, 4..17: IMU payload (14 bytes)
-        bat_adc = (frame[0] << 8) | frame[1]
-        batV = (bat_adc / 4095) * VBAT_RATIO
-        if hasattr(self, "battery"):
-            self.battery.set_voltage(batV, cells=3)
-
-        
+        self.input.advance(time.monotonic_ns())
+        self._apply_input()
+
+    def _apply_input(self, input_t_ns: int | None = None, urgent: bool = False):
+        stab = self.stabilizer
+        if stab is not None:
+            # the stabilizer sends; input only moves its targets
+            inp = self.input
+            stab.set_target(inp.throttle, inp.axes['roll'] * MAX_TILT, -inp.axes['pitch'] * MAX_TILT,
+                            inp.axes['yaw'] * inp.authority)
+            if input_t_ns is not None:
+                inp.mark_input(input_t_ns)
+            return
+        self.MotorPowers.update(self.input.motors())
+        self.send_powers(urgent, input_t_ns)
+
+    def _stab_send(self, data: bytes) -> bool:
+        # stabilizer thread: only replaces the setpoint. The command thread still
+        # puts the newest one on the wire at SEND_HZ, so the link rate doesn't
+        # change with level hold on; each packet sent is at most 1/STAB_HZ old.
+        # True means handed over, not sent.
+        commands = self.commands
+        if commands is None:
+            return False
+        commands.set(data)
+        return True
 
-        m0, m1, m2, m3 = frame[2], frame[3], frame[4], frame[5]
-        # Update RX numbers + bars
-        try:
-            order = self.order  # ('FrontLeft','FrontRight','BackLeft','BackRight')
-        except AttributeError:
-            order = ('FrontLeft','FrontRight','BackLeft','BackRight')
-        for name, val in zip(order, (m0, m1, m2, m3)):
-            if hasattr(self, "rxLabels"):   self.rxLabels[name].setText(str(val))
-            if hasattr(self, "barPairs"):   self.barPairs[name].setRX(val)
-
-        imu = frame[6:20]  # 14 bytes
-        # 7 big-endian int16: ax, ay, az, gx, gy, gz, temp(or spare)
-        try:
-            ax, ay, az, gx, gy, gz, _ = struct.unpack(">7h", imu)
-        except struct.error:
+    def _send_packet(self, data: bytes) -> bool:
+        # command thread: the packet is on the wire once send() returns
+        link = self.link
+        if link is None or not link.send(data):
+            return False
+        self.input.take_input(time.monotonic_ns())
+        return True
+
+    def closeEvent(self, ev):
+        if self.stabilizer is not None:
+            self.stabilizer.stop()
+        if self.commands is not None:
+            self.commands.stop()
+        if self.link is not None:
+            self.link.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.ring is not None:
+            if self.link is not None:
+                self.link.join(1.0)       # stops within its 0.2 s read timeout
+            self.ring.close()
+        super().closeEvent(ev)
+
+    def _poll_ingest(self):
+        with span("poll"):
+            self._poll_link()
+
+    def _poll_link(self):
+        if self.link is None:
             return
-        ax_g, ay_g, az_g = ax / A_SENS, ay / A_SENS, az / A_SENS
-        # normalize to unit vector and update ball
-        gmag = math.sqrt(ax_g*ax_g + ay_g*ay_g + az_g*az_g) or 1.0
-        x = ax_g / gmag
-        y = ay_g / gmag
-        if hasattr(self, "tiltBall"):
-            self.tiltBall.set_xy(x, y)
-
-def main(secondMonitor:bool = False):
+        state = self.link.state
+        if state != self._linkState:
+            self._linkState = state
+            if state == LinkState.connected:
+                self._on_connected()
+            elif state in (LinkState.failed, LinkState.closed):
+                self._on_link_lost()
+
+        if state == LinkState.connected and self.replay is None:
+            self._check_link()
+
+        batches = self.link.drain_history()
+        if self.charts:
+            with span("charts"):
+                self._feed_charts(batches)
+
+        snap = self.link.latest
+        if snap is not None and snap.seq != self._lastSeq:
+            self._lastSeq = snap.seq
+            with span("snapshot"):
+                self._apply_snapshot(snap)
+
+    def _check_link(self):
+        # runs every render frame, data or not, so a silent link shows up as stalled
+        mon = self.link.linkmon
+        level, reasons = mon.check(time.monotonic_ns())
+        if level != self._linkLevel:
+            self._linkLevel = level
+            with span("restyle"):
+                self.linkLabel.setStyleSheet("" if level == OK else
+                                             f"color: {'red' if level == STALLED else 'darkorange'};")
+            if level != OK:
+                self.statusBar().showMessage(f"Link {level}: {'; '.join(reasons)}", 5000)
+                QtWidgets.QApplication.beep()
+        self.render.set_text(self.linkLabel, f"LINK {level}  {mon.summary()}")
+
+    def _on_connected(self):
+        self.btnConnect.setText("Connected!")
+        self.btnConnect.setStyleSheet("QPushButton { background: green; color: white; }")
+        self.btnConnect.setEnabled(False)
+        self.btnDisconnect.setEnabled(True)
+        self.btnStartMotors.setEnabled(True)
+        self.btnStopMotors.setEnabled(True)
+        self.btnFlyPS4.setEnabled(True)
+        self.btnFlyKeyboard.setEnabled(True)
+        self.chkLevel.setEnabled(not self.stopToggle)
+
+    def _on_link_lost(self):
+        self.btnConnect.setText("Connection failed, try again?")
+        self.btnConnect.setStyleSheet("QPushButton { background: red; color: white; }")
+        self.btnConnect.setEnabled(True)
+        self.chkLevel.setChecked(False)
+        self.chkLevel.setEnabled(False)
+        if self.link.error:
+            self.statusBar().showMessage(self.link.error)
+
+    def _feed_charts(self, batches):
+        # one append per series and one spectrum feed per tick, however many batches came in
+        if not batches:
+            return
+        if len(batches) == 1:
+            _t, frames, att = batches[0]
+            t = att.t
+        else:
+            frames = np.concatenate([b[1] for b in batches])
+            t = np.concatenate([b[2].t for b in batches])
+        for i, f in enumerate(('ax', 'ay', 'az')):
+            self.accelChart.append(i, t, frames[f] / A_SENS)
+        for i, f in enumerate(('gx', 'gy', 'gz')):
+            self.gyroChart.append(i, t, frames[f] / G_SENS)
+        self.batteryChart.append(0, t, battery.adc_to_volts(frames['bat_adc']))
+        motors = frames['motors']
+        for i in range(4):
+            self.motorChart.append(i, t, motors[:, i])
+            # setpoint as it stands now
+            self.motorChart.append(4 + i, t[-1:], [self.MotorPowers[self.order[i]]])
+        windows = self.spectrum.windows
+        self.spectrum.feed_frames(frames)
+        if self.spectrum.windows != windows:
+            self.spectrumView.refresh()
+
+    def _apply_snapshot(self, snap):
+        self.battery.set_percent(snap.bat_percent, snap.bat_volts, snap.bat_remaining_s)
+        # motor echoes -> RX numbers + bars
+        for name, val in zip(self.order, snap.motors):
+            self.motorPanel.set_rx(name, val)
+        fused = self.tiltSource.currentData() == "fused"
+        self.tiltBall.set_xy(*(snap.tilt_fused if fused else snap.tilt))
+        roll, pitch, yaw = (math.degrees(a) for a in snap.attitude)
+        self.render.set_text(self.attitudeLabel, f"roll {roll:+5.1f}°  pitch {pitch:+5.1f}°  yaw {yaw:+6.1f}°")
+        self.latencyView.refresh()
+        if self.replay is not None:
+            log = self.replay.log
+            if not self.replaySlider.isSliderDown():
+                self.replaySlider.setValue((self.replay.position_ns - log.t_start) // 1_000_000)
+            for c in self.logCharts:
+                c.set_position(self.replay.position_ns)
+            self.render.set_text(self.recLabel, f"REPLAY {self.replay.frames_out}/{len(log)}"
+                                 f"  {self.replay.rate:,.0f} frames/s")
+        if self.recorder is not None:
+            rec = self.recorder
+            self.render.set_text(self.recLabel, f"REC {rec.committed} rec  buf {rec.fill_level:4.0%}"
+                                 + (f"  dropped {rec.dropped}" if rec.dropped else ""))
+        dec = self.link.decoder
+        if dec.protocol == 2:
+            self.render.set_text(self.rxLabel, f"RX v2  {dec.resyncs} resync  {dec.crc_errors} crc  "
+                                 f"{dec.seq_lost} lost")
+        stab = self.stabilizer
+        if stab is not None:
+            self.MotorPowers.update(stab.output)
+            for name in self.order:
+                self.motorPanel.set_tx(name, self.MotorPowers[name])
+        if self.commands is not None:
+            st = self.commands.stats()
+            keys = self.input.latency
+            self.render.set_text(self.txLabel, f"TX {st['sent']} sent  {st['deduped']} dedup  "
+                                 f"{st['overwritten']} coalesced  late max {st['late_max_us']/1000:.1f} ms"
+                                 + (f"  key→wire p50 {keys.percentile(50) / 1000:.1f} ms"
+                                    f" p99 {keys.percentile(99) / 1000:.1f} ms" if keys.count else "")
+                                 + (f"  hold jitter p99 {stab.jitter.percentile(99) / 1000:.1f} ms"
+                                    f" {stab.overruns} overruns" if stab is not None else ""))
+
+def main(secondMonitor:bool = False, render_hz: float = RENDER_HZ,
+         replay: str | None = None, speed: float = 1.0,
+         host: str = HOST_DEFAULT, port: int = PORT_DEFAULT, transport: str = TRANSPORT_DEFAULT,
+         shm: str | None = None, profile: bool = False):
     app = QtWidgets.QApplication(sys.argv)
     win = drone_UI()
+    if profile:
+        win.toggle_profiler(True)
+    win.host, win.port, win.transport = host, port, transport
+    win.shm_name = shm
+    win.render.set_max_hz(render_hz)
+    if replay:
+        win.start_replay(replay, speed)
     if secondMonitor:
         screens = QGuiApplication.screens()
         if len(screens) > 1:
@@ -728,8 +1323,22 @@ def main(secondMonitor:bool = False):
             win.showMaximized()
     else:
         win.show()
+    win.render.set_screen(win.screen())
 
     sys.exit(app.exec())
 
 if __name__ == "__main__":
-    main(secondMonitor=True)
\ No newline at end of file
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--replay", help="flight log to re-fly instead of connecting")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    ap.add_argument("--render-hz", type=float, default=RENDER_HZ)
+    ap.add_argument("--host", default=HOST_DEFAULT, help="e.g. 127.0.0.1 for sim_server.py")
+    ap.add_argument("--port", type=int, default=PORT_DEFAULT)
+    ap.add_argument("--transport", choices=("tcp", "udp"), default=TRANSPORT_DEFAULT, help=TRANSPORT_HELP)
+    ap.add_argument("--shm", nargs="?", const="drone-telemetry", metavar="NAME",
+                    help="publish telemetry to a shared-memory ring for other processes (shm.py)")
+    ap.add_argument("--profile", action="store_true", help="start with the hot-path profiler on (F12 toggles it)")
+    args = ap.parse_args()
+    main(secondMonitor=True, render_hz=args.render_hz, replay=args.replay, speed=args.speed,
+         host=args.host, port=args.port, transport=args.transport, shm=args.shm, profile=args.profile)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import argparse, math
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ADC_MAX = 4095
+VBAT_RATIO = 13.21 # voltage max for battery should be 12.6V dont go below 10.5V absolute minimum 9V will fuck it 
+
+# --- LiPo OCV table (rough, per-cell, at rest) ---
+OCV_TABLE = [
+    (4.20, 100), (4.15, 95), (4.10, 90), (4.05, 85),
+    (4.00, 78), (3.95, 70), (3.90, 62), (3.85, 56),
+    (3.80, 45), (3.75, 35), (3.70, 25), (3.65, 18),
+    (3.60, 12), (3.55,  9), (3.50,  7), (3.45,  4),
+    (3.40,  2), (3.30,  0),
+]
+
+
+def adc_to_volts(adc):
+    """Pack voltage from the 12-bit ADC reading (scalar, NumPy array or list)."""
+    if isinstance(adc, list):
+        return [(a / ADC_MAX) * VBAT_RATIO for a in adc]
+    return (adc / ADC_MAX) * VBAT_RATIO
+
+
+MOTOR_FULL = 180   # echo value at full throttle
+
+
+def soc_percent(vpc: float) -> float:
+    """State of charge (0..100) from rested per-cell voltage, linear between table points."""
+    table = OCV_TABLE
+    if vpc >= table[0][0]: return 100.0
+    if vpc <= table[-1][0]: return 0.0
+    for i in range(len(table)-1):
+        v1, p1 = table[i]
+        v2, p2 = table[i+1]
+        if v2 <= vpc <= v1:
+            t = (vpc - v2) / (v1 - v2)
+            return p2 + t*(p1 - p2)
+    return 0.0
+
+
+def ema_batch(values, prev, alpha: float) -> float:
+    """Final value of an EMA run over `values` starting from `prev` (None = seed with first)."""
+    if prev is None:
+        prev = float(values[0])
+    if np is not None and len(values) >= 8:
+        v = np.asarray(values, dtype=np.float64)
+        n = len(v)
+        # ema_n = (1-a)^n * prev + sum_k a*(1-a)^(n-1-k) * v_k
+        w = alpha * (1.0 - alpha) ** np.arange(n - 1, -1, -1)
+        return float((1.0 - alpha) ** n * prev + w @ v)
+    for v in values:
+        prev = (1 - alpha) * prev + alpha * float(v)
+    return prev
+
+
+@lru_cache(maxsize=None)
+def soc_lut(cells: int = 3, ratio: float = VBAT_RATIO):
+    """SOC (0..100) for every ADC code 0..ADC_MAX, as if the pack were at rest."""
+    if np is None:
+        return [soc_percent(c / ADC_MAX * ratio / cells) for c in range(ADC_MAX + 1)]
+    vpc = np.arange(ADC_MAX + 1) / ADC_MAX * ratio / cells
+    v, p = zip(*reversed(OCV_TABLE))
+    return np.interp(vpc, v, p).astype(np.float32)
+
+
+def load_fraction(motors):
+    """Electrical load per frame, 0..1: mean of (echo / full)^2 over the four motors
+    (current goes roughly with thrust, thrust with speed squared)."""
+    if np is not None and not isinstance(motors, list):
+        m = np.asarray(motors, dtype=np.float64) / MOTOR_FULL
+        return (m * m).mean(axis=-1)
+    return [sum((x / MOTOR_FULL) ** 2 for x in row) / 4 for row in motors]
+
+
+class BatteryModel:
+    """
+    Load-compensated pack state. The loaded voltage is V = V_rest - sag * load,
+    with `load` from the motor echoes; `sag` (volts at full throttle, i.e.
+    R_int * I_full) is an exponentially weighted least-squares slope of V on
+    load over the last ~tau_sag seconds, so it follows the pack as it warms and
+    ages. The rested-equivalent voltage V + sag * load indexes the ADC->SOC
+    table, and the time left is the rested SOC over its recent rate of fall.
+    update() takes whole batches (arrays or lists) and per-sample times.
+    """
+    MIN_LOAD_SPREAD = 0.03      # load std-dev needed before the slope is trusted
+    SMALL_BATCH = 8
+    DRAIN_STEP = 0.25
+
+    def __init__(self, cells: int = 3, ratio: float = VBAT_RATIO, ema_alpha: float = 0.15,
+                 tau_sag: float = 30.0, tau_soc: float = 120.0):
+        self.cells = cells
+        self.ratio = ratio
+        self.lut = soc_lut(cells, ratio)
+        self.ema_alpha = ema_alpha
+        self.tau_sag = tau_sag
+        self.tau_soc = tau_soc
+        self.sag = 0.0              # volts lost at full load
+        self.volts = None           # smoothed loaded pack voltage
+        self.rested_volts = None    # smoothed, load-compensated
+        self.soc = None             # % from rested_volts
+        self.drain = 0.0            # %/s, rested SOC fall rate
+        self._t0 = None             # time origin for the regressions
+        self._t_last = self._t_drain = None
+        self._sag_sums = [0.0] * 5  # decayed sums: w, x, y, xx, xy (x = load, y = volts)
+        self._soc_sums = [0.0] * 5  # same with x = t, y = rested SOC
+
+    @property
+    def remaining_s(self):
+        """Seconds until empty at the recent drain rate, or None if not draining."""
+        if self.soc is None or self.drain <= 1e-4:
+            return None
+        return self.soc / self.drain
+
+    @staticmethod
+    def _decayed(sums, x, y, w, g):
+        """sums * g + the weighted batch (lists or arrays)."""
+        if np is not None and not isinstance(x, list):
+            return [sums[0] * g + float(w.sum()), sums[1] * g + float(w @ x), sums[2] * g + float(w @ y),
+                    sums[3] * g + float(w @ (x * x)), sums[4] * g + float(w @ (x * y))]
+        add = [sum(w), sum(a * b for a, b in zip(w, x)), sum(a * b for a, b in zip(w, y)),
+               sum(a * b * b for a, b in zip(w, x)), sum(a * b * c for a, b, c in zip(w, x, y))]
+        return [s * g + a for s, a in zip(sums, add)]
+
+    @staticmethod
+    def _slope(sums, min_spread: float):
+        w, sx, sy, sxx, sxy = sums
+        if w <= 0:
+            return None
+        var = sxx / w - (sx / w) ** 2
+        if var < min_spread * min_spread:
+            return None
+        return (sxy / w - sx * sy / (w * w)) / var
+
+    def _soc(self, volts):
+        code = round(volts / self.ratio * ADC_MAX)
+        return float(self.lut[max(0, min(ADC_MAX, code))])
+
+    def update(self, adc, motors, t):
+        """adc: bat_adc per frame; motors: (n, 4) echoes; t: per-sample times (s), or
+        the batch's arrival time for all of them. Returns the rested SOC (%)."""
+        n = len(adc)
+        vec = np is not None and not isinstance(adc, list) and n >= self.SMALL_BATCH
+        if vec:
+            volts = adc_to_volts(np.asarray(adc, dtype=np.float64))
+            t = np.broadcast_to(np.asarray(t, dtype=np.float64), (n,))
+        else:       # plain floats: below SMALL_BATCH NumPy's per-call overhead dominates
+            adc = adc if isinstance(adc, list) else adc.tolist()
+            motors = motors if isinstance(motors, list) else motors.tolist()
+            volts = adc_to_volts(adc)
+            t = t.tolist() if hasattr(t, 'tolist') and getattr(t, 'ndim', 0) else (
+                list(t) if isinstance(t, (list, tuple)) else [float(t)] * n)
+        load = load_fraction(motors)
+        if self._t0 is None:
+            self._t0 = self._t_last = float(t[0])
+            self._t_drain = self._t0 - self.DRAIN_STEP
+        t_end = float(t[-1])
+
+        # sag: volts vs load, weighted towards the last tau_sag seconds
+        if vec:
+            w = np.exp((t - t_end) / self.tau_sag)
+        else:
+            w = [math.exp((x - t_end) / self.tau_sag) for x in t]
+        g = math.exp((self._t_last - t_end) / self.tau_sag)
+        self._sag_sums = self._decayed(self._sag_sums, load, volts, w, g)
+        slope = self._slope(self._sag_sums, self.MIN_LOAD_SPREAD)
+        if slope is not None:
+            self.sag = max(0.0, -slope)
+
+        if vec:
+            rested = volts + self.sag * load
+        else:
+            rested = [v + self.sag * x for v, x in zip(volts, load)]
+        self.volts = ema_batch(volts, self.volts, self.ema_alpha)
+        self.rested_volts = ema_batch(rested, self.rested_volts, self.ema_alpha)
+        self.soc = self._soc(self.rested_volts)
+
+        # drain: slope of rested SOC over time, one point every DRAIN_STEP seconds
+        if t_end - self._t_drain >= self.DRAIN_STEP:
+            g = math.exp((self._t_drain - t_end) / self.tau_soc)
+            self._soc_sums = self._decayed(self._soc_sums, [t_end - self._t0], [self.soc], [1.0], g)
+            slope = self._slope(self._soc_sums, 5.0)      # needs ~20 s of history
+            self.drain = max(0.0, -slope) if slope is not None else 0.0
+            self._t_drain = t_end
+        self._t_last = t_end
+        return self.soc
+
+    def soc_series(self, adc, motors):
+        """Rested SOC per sample with the current sag estimate (whole logs)."""
+        volts = adc_to_volts(np.asarray(adc, dtype=np.float64))
+        code = np.rint((volts + self.sag * load_fraction(motors)) / self.ratio * ADC_MAX)
+        return self.lut[np.clip(code, 0, ADC_MAX).astype(np.intp)]
+
+
+def main():
+    from protocol import FRAME_DTYPE
+    from recorder import KIND_FRAME, LogReader
+    ap = argparse.ArgumentParser(description="Load-compensated battery estimate over a flight log.")
+    ap.add_argument("log")
+    ap.add_argument("--cells", type=int, default=3)
+    args = ap.parse_args()
+
+    log = LogReader(args.log)
+    model = BatteryModel(args.cells)
+    first = None
+    for start in range(0, len(log), 1 << 14):
+        recs = log.records(start, start + (1 << 14))
+        recs = recs[recs['kind'] == KIND_FRAME]
+        if not len(recs):
+            continue
+        frames = recs['payload'].reshape(-1).view(FRAME_DTYPE)
+        model.update(frames['bat_adc'], frames['motors'], recs['t_ns'] / 1e9)
+        first = model.soc if first is None else first
+    if first is None:
+        raise SystemExit("no telemetry in log")
+    left = model.remaining_s
+    print(f"SOC {first:.1f}% -> {model.soc:.1f}%  rested {model.rested_volts:.2f} V  "
+          f"sag {model.sag:.2f} V at full load  drain {model.drain * 60:.2f} %/min  "
+          f"left {'-' if left is None else f'{left / 60:.1f} min'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,767 @@
+import argparse, json, os, platform, socket, sys, tempfile, time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from protocol import FRAME_DTYPE, PACKET_LEN, V2_HELLO, FrameDecoder, encode_v2
+from sim_server import TEMP_RAW, DroneModel, Faults, SimServer
+from transport import TcpTransport, make_transport
+
+# Host-side benchmark suite. Runs headless against a local sim_server:
+#   python bench.py --out bench.json
+#   python bench.py --compare bench.json        # exit 1 on regressions
+# Each benchmark returns {metric: (value, unit, higher_is_better)}.
+
+BENCHES = {}
+
+
+def bench(fn):
+    BENCHES[fn.__name__.removeprefix("bench_")] = fn
+    return fn
+
+
+def _frames(n: int, seed: int = 1) -> bytes:
+    model = DroneModel(seed=seed)
+    model.set_motors((90, 90, 90, 90))
+    out = bytearray()
+    for _ in range(n):
+        model.step(0.01)
+        out += model.frame()
+    return bytes(out)
+
+
+def _timeit(fn, min_time: float = 0.3) -> float:
+    """Seconds per call of fn(), repeated for at least min_time."""
+    n, t0 = 0, time.perf_counter()
+    while True:
+        fn(); n += 1
+        dt = time.perf_counter() - t0
+        if dt >= min_time:
+            return dt / n
+
+
+_app = None
+
+
+def _qapp():
+    global _app
+    from PyQt6 import QtWidgets
+    _app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    return _app
+
+
+# --- decode ---
+@bench
+def bench_decode(quick: bool):
+    from ingest import TelemetryModel
+    raw = _frames(2000 if quick else 20000)
+    n = len(raw) // PACKET_LEN
+    chunk = 100 * PACKET_LEN    # a 1 s backlog after a Wi-Fi stall
+    res = {}
+    variants = [("numpy", True), ("python", False)] if np is not None else [("python", False)]
+    for name, use_np in variants:
+        def run():
+            dec = FrameDecoder(use_numpy=use_np)
+            for i in range(0, len(raw), chunk):
+                dec.feed(raw[i:i + chunk])
+        res[f"decode_{name}_frames_per_s"] = (n / _timeit(run), "frames/s", True)
+
+    # v2: sync search + CRC over the same backlog chunks
+    raw2 = V2_HELLO + b"".join(encode_v2(raw[i:i + PACKET_LEN], i // PACKET_LEN, i)
+                               for i in range(0, len(raw), PACKET_LEN))
+    chunk2 = 100 * 32
+    for name, use_np in variants:
+        def run_v2():
+            dec = FrameDecoder(use_numpy=use_np)
+            for i in range(0, len(raw2), chunk2):
+                dec.feed(raw2[i:i + chunk2])
+        res[f"decode_v2_{name}_frames_per_s"] = (n / _timeit(run_v2), "frames/s", True)
+
+    # decode + model update: what the ingest thread does per recv
+    def run_model():
+        dec, model = FrameDecoder(), TelemetryModel()
+        for i in range(0, len(raw), chunk):
+            model.update(dec.feed(raw[i:i + chunk]), 0.0)
+    res["ingest_frames_per_s"] = (n / _timeit(run_model), "frames/s", True)
+
+    # one frame per recv (the steady 100 Hz case)
+    def run_single():
+        dec, model = FrameDecoder(), TelemetryModel()
+        for i in range(0, 2000 * PACKET_LEN, PACKET_LEN):
+            model.update(dec.feed(raw[i:i + PACKET_LEN]), 0.0)
+    res["ingest_single_frame_us"] = (_timeit(run_single) / 2000 * 1e6, "us", False)
+    return res
+
+
+@bench
+def bench_playaround_sample(quick: bool):
+    try:
+        import playaround
+    except ImportError as e:
+        return {"skipped": str(e)}
+    from protocol import LatestFrameReader
+    srv = SimServer(port=0, rate_hz=100).start()
+    try:
+        with socket.create_connection(srv.address, timeout=5) as s:
+            reader = LatestFrameReader(s)
+            time.sleep(0.2)
+            n = 20 if quick else 100
+            t0 = time.perf_counter()
+            for _ in range(n):
+                playaround.sample_xy(reader)
+            dt = time.perf_counter() - t0
+    finally:
+        srv.stop()
+    res = {"playaround_sample_xy_per_s": (n / dt, "calls/s", True)}
+
+    # the read itself against a deep backlog: drain + keep newest, no allocation
+    raw = _frames(2000 if quick else 20000)
+    a, b = socket.socketpair()
+    with a, b:
+        reader = LatestFrameReader(b)
+        def run():
+            a.sendall(raw[:100 * PACKET_LEN])     # 1 s of telemetry queued up
+            reader.read()
+        res["latest_frame_read_us"] = (_timeit(run) * 1e6, "us", False)
+    return res
+
+
+# --- attitude estimator: throughput and error vs the sim's true attitude ---
+@bench
+def bench_estimator(quick: bool):
+    import math
+    from estimator import AttitudeEstimator
+    n = 2000 if quick else 20000
+    model = DroneModel(seed=3)
+    raw, truth = bytearray(), []
+    for i in range(n):
+        # rock the drone around so both filters have something to track
+        s = math.sin(i / 150)
+        model.set_motors((100 + 40 * s, 100 - 40 * s, 100 + 20 * s, 100 - 20 * s))
+        model.step(0.01)
+        raw += model.frame()
+        truth.append(model.roll)
+    frames = FrameDecoder().feed(bytes(raw))
+    res = {}
+    for batch in (1, 10, 100):
+        def run():
+            est = AttitudeEstimator()
+            for i in range(0, n, batch):
+                est.update(frames[i:i + batch], 0.0)
+        res[f"estimator_batch{batch}_samples_per_s"] = (n / _timeit(run, 0.2), "samples/s", True)
+
+    att = AttitudeEstimator().update(frames, 0.0)
+    acc_roll = np.arctan2(frames['ay'].astype(float), frames['az'].astype(float))
+    truth = np.array(truth)
+    rms = lambda e: float(np.degrees(np.sqrt(np.mean(e[100:] ** 2))))   # skip the settling second
+    res["roll_rms_err_accel_deg"] = (rms(acc_roll - truth), "deg", False)
+    res["roll_rms_err_fused_deg"] = (rms(att.roll - truth), "deg", False)
+    return res
+
+
+# --- battery: sag (internal resistance) estimate and rested SOC vs the sim's truth ---
+@bench
+def bench_battery(quick: bool):
+    import math
+    from battery import BatteryModel
+    model = DroneModel(seed=2, capacity_mah=2000)
+    bat = BatteryModel()
+    dec = FrameDecoder()
+    t, errs, errs_loaded = 0.0, [], []
+    for sec in range(60 if quick else 240):
+        raw = bytearray()
+        for _ in range(100):
+            model.set_motors((90 + 60 * math.sin(t / 3),) * 4)      # throttle pumping
+            model.step(0.01)
+            t += 0.01
+            raw += model.frame()
+        frames = dec.feed(bytes(raw))
+        bat.update(frames['bat_adc'], frames['motors'], t - 0.01 * np.arange(99, -1, -1))
+        if sec >= 30:
+            errs.append(bat.soc - model.soc * 100)
+            errs_loaded.append(bat._soc(bat.volts) - model.soc * 100)    # what the plain EMA showed
+    sag_true = model.r_int * model.i_max
+    adc, motors = np.tile(frames['bat_adc'], 100), np.tile(frames['motors'], (100, 1))
+    ts = np.arange(len(adc)) * 0.01
+    per = _timeit(lambda: BatteryModel().update(adc, motors, ts)) / len(adc)
+    return {
+        "battery_sag_err_pct": (100 * abs(bat.sag - sag_true) / sag_true, "%", False),
+        "battery_soc_rms_err_pct": (math.sqrt(sum(e * e for e in errs) / len(errs)), "% SOC", False),
+        "battery_soc_rms_err_loaded_pct": (math.sqrt(sum(e * e for e in errs_loaded) / len(errs_loaded)), "% SOC", False),
+        "battery_batch_us_per_sample": (per * 1e6, "us", False),
+    }
+
+
+# --- vibration spectrum: cost per sample fed live (small batches) and offline ---
+@bench
+def bench_spectrum(quick: bool):
+    if np is None:
+        return {"skipped": "needs NumPy"}
+    from spectrum import WelchSpectrum
+    frames = np.frombuffer(_frames(2000 if quick else 20000), dtype=FRAME_DTYPE)
+    res = {}
+    for name, chunk, averages in (("live", 2, 16), ("offline", len(frames), None)):
+        sp = WelchSpectrum(averages=averages)
+        def run():
+            for i in range(0, len(frames), chunk):
+                sp.feed_frames(frames[i:i + chunk])
+        res[f"spectrum_{name}_us_per_sample"] = (_timeit(run) / len(frames) * 1e6, "us", False)
+    return res
+
+
+# --- paint ---
+@bench
+def bench_paint(quick: bool):
+    app = _qapp()
+    from UI import BatteryIndicator, MotorPanel, TiltBall
+    order = ('FrontLeft', 'FrontRight', 'BackLeft', 'BackRight')
+    widgets = {
+        "tiltball": (TiltBall(diameter=500), lambda w, i: w.set_xy((i % 100) / 100, 0.3)),
+        "battery": (BatteryIndicator(cells=3), lambda w, i: w.set_percent(i % 100, 11.1)),
+        "motorpanel": (MotorPanel(order, 180, bar_w=120, bar_h=400),
+                       lambda w, i: [w.set_rx(m, i % 180) for m in order]),
+    }
+    if np is not None:
+        # ten minutes of 200 Hz history already in the ring; each change adds 10 ms more
+        from stripchart import StripChart
+        chart = StripChart("bench", span_s=600, unit="g")
+        chart.resize(800, 160)
+        for i in range(3):
+            chart.add_series(f"s{i}", "#1f77b4")
+        t0 = time.monotonic() - 600
+        hist = np.linspace(t0, t0 + 600, 120000)
+        for i in range(3):
+            chart.append(i, hist, np.sin(hist * (i + 1)))
+
+        def chart_change(w, i):
+            t = np.full(2, time.monotonic())
+            for k in range(3):
+                w.append(k, t, np.sin(t))
+        widgets["stripchart_10min"] = (chart, chart_change)
+    res = {}
+    for name, (w, change) in widgets.items():
+        w.show()
+        app.processEvents()
+        counter = iter(range(1 << 30))
+
+        def run():
+            change(w, next(counter))
+            w.repaint()
+        res[f"paint_{name}_us"] = (_timeit(run, 0.2 if quick else 0.5) * 1e6, "us", False)
+        w.close()
+    return res
+
+
+# --- key press -> bytes on the wire ---
+@bench
+def bench_key_latency(quick: bool):
+    app = _qapp()
+    from PyQt6 import QtCore, QtGui
+    import UI
+    from ingest import LinkState
+
+    UI.LOG_DIR = tempfile.mkdtemp(prefix="drone-bench-")   # keep bench sessions out of logs/
+    srv = SimServer(port=0, rate_hz=100).start()
+    win = UI.drone_UI()
+    win.host, win.port = srv.address
+    win.show()
+    try:
+        win.on_connect_clicked()
+        deadline = time.monotonic() + 5
+        while (win.link is None or win.link.state != LinkState.connected) and time.monotonic() < deadline:
+            app.processEvents(); time.sleep(0.001)
+        app.processEvents()
+        win.stopToggle = False
+        win.kbOverlay.setVisible(True)
+
+        samples = []
+        for _ in range(10 if quick else 40):
+            before = srv.packets_in
+            t0 = time.monotonic()
+            app.sendEvent(win, QtGui.QKeyEvent(QtCore.QEvent.Type.KeyPress, QtCore.Qt.Key.Key_Up,
+                                               QtCore.Qt.KeyboardModifier.NoModifier))
+            while srv.packets_in == before and time.monotonic() - t0 < 1.0:
+                app.processEvents(); time.sleep(0.0002)
+            if srv.packets_in != before:
+                samples.append(srv.last_packet_t - t0)
+            app.sendEvent(win, QtGui.QKeyEvent(QtCore.QEvent.Type.KeyRelease, QtCore.Qt.Key.Key_Up,
+                                               QtCore.Qt.KeyboardModifier.NoModifier))
+            for m in win.MotorPowers:
+                win.MotorPowers[m] = 0
+            win.send_powers()
+            t_idle = time.monotonic()
+            while time.monotonic() - t_idle < 0.05:
+                app.processEvents(); time.sleep(0.001)
+    finally:
+        win.close()
+        srv.stop()
+    if not samples:
+        return {"skipped": "no motor packets reached the sim server"}
+    samples.sort()
+    return {
+        "key_to_wire_p50_ms": (samples[len(samples) // 2] * 1e3, "ms", False),
+        "key_to_wire_max_ms": (samples[-1] * 1e3, "ms", False),
+        "key_to_wire_ui_p50_ms": (win.input.latency.percentile(50) / 1000, "ms", False),   # as the UI reports it
+    }
+
+
+# --- throttle ramp rate while the GUI thread is busy ---
+@bench
+def bench_ramp(quick: bool):
+    app = _qapp()
+    from PyQt6 import QtCore, QtGui
+    import UI
+    from ingest import LinkState
+
+    UI.LOG_DIR = tempfile.mkdtemp(prefix="drone-bench-")
+    srv = SimServer(port=0, rate_hz=100).start()
+    win = UI.drone_UI()
+    win.host, win.port = srv.address
+    win.show()
+    # something else hogging the event loop: 15 ms of work every 10 ms
+    hog = QtCore.QTimer()
+    hog.timeout.connect(lambda: time.sleep(0.015))
+    res = {}
+    try:
+        win.on_connect_clicked()
+        deadline = time.monotonic() + 5
+        while (win.link is None or win.link.state != LinkState.connected) and time.monotonic() < deadline:
+            app.processEvents(); time.sleep(0.001)
+        win.stopToggle = False
+        win.on_fly_keyboard_clicked()
+        for loaded in (False, True):
+            if loaded:
+                hog.start(10)
+            win.input.reset()
+            hold = 1.0 if quick else 3.0
+            t0 = time.monotonic()
+            app.sendEvent(win, QtGui.QKeyEvent(QtCore.QEvent.Type.KeyPress, QtCore.Qt.Key.Key_Up,
+                                               QtCore.Qt.KeyboardModifier.NoModifier))
+            while time.monotonic() - t0 < hold:
+                app.processEvents(); time.sleep(0.001)
+            t1 = time.monotonic()
+            app.sendEvent(win, QtGui.QKeyEvent(QtCore.QEvent.Type.KeyRelease, QtCore.Qt.Key.Key_Up,
+                                               QtCore.Qt.KeyboardModifier.NoModifier))
+            hog.stop()
+            expected = win.input.tap + win.input.ramp_per_s * (t1 - t0)
+            err = 100 * abs(win.input.throttle - expected) / expected
+            res[f"ramp_error_{'loaded' if loaded else 'idle'}_pct"] = (err, "%", False)
+    finally:
+        hog.stop()
+        win.close()
+        srv.stop()
+    return res
+
+
+# --- TCP vs UDP: echo round trip and frame arrival jitter against the sim ---
+@bench
+def bench_transport(quick: bool):
+    from ingest import IngestWorker, LinkState
+    rate = 200
+    res = {}
+    for kind in ("tcp", "udp"):
+        srv = SimServer(port=0, rate_hz=rate, transport=kind).start()
+        w = IngestWorker(make_transport(kind, *srv.address))
+        w.start()
+        deadline = time.monotonic() + 5
+        while w.latest is None and time.monotonic() < deadline:
+            time.sleep(0.005)
+        if w.state != LinkState.connected:
+            w.stop(); w.join(); srv.stop()
+            return {"skipped": f"{kind}: {w.error or 'no telemetry from the sim'}"}
+        w.drain_history()
+        arrivals = []
+        for i in range(25 if quick else 100):
+            w.send(bytes([i % 2 * 10 + 40] * 4))     # alternate so every packet echoes
+            t_end = time.monotonic() + 0.04
+            while time.monotonic() < t_end:
+                for t, frames, _ in w.drain_history():
+                    arrivals += [t] * len(frames)
+                time.sleep(0.001)
+        w.stop(); w.join(); srv.stop()
+        period = 1.0 / rate
+        dev = sorted(abs((b - a) - period) for a, b in zip(arrivals, arrivals[1:]))
+        summ = w.echo.hist.summary()
+        res[f"{kind}_echo_p50_ms"] = (summ["p50_us"] / 1000, "ms", False)
+        res[f"{kind}_echo_p99_ms"] = (summ["p99_us"] / 1000, "ms", False)
+        if dev:
+            res[f"{kind}_arrival_jitter_p99_ms"] = (dev[int(len(dev) * 0.99)] * 1e3, "ms", False)
+    return res
+
+
+# --- many drones on one event loop ---
+@bench
+def bench_multidrone(quick: bool):
+    from multidrone import DroneManager
+    n = 8 if quick else 20
+    sims = [SimServer(port=0, rate_hz=100, seed=i).start() for i in range(n)]
+    m = DroneManager().start()
+    for i, srv in enumerate(sims):
+        m.add(f"d{i}", *srv.address)
+    time.sleep(1.0)
+    connected = m.stats()["connected"]
+    f0, c0, t0 = m.stats()["frames"], m.cpu_s, time.monotonic()
+    for i, s in enumerate(m.sessions.values()):
+        s.set_setpoint(bytes([i % 180, 10, 20, 30]))
+    time.sleep(1.0 if quick else 3.0)
+    st, dt = m.stats(), time.monotonic() - t0
+    applied = sum(srv.model.cmd == [i % 180, 10, 20, 30] for i, srv in enumerate(sims))
+    m.stop()
+    for srv in sims:
+        srv.stop()
+    if connected < n:
+        return {"skipped": f"only {connected}/{n} sims connected"}
+    cpu = 100 * (st["cpu_s"] - c0) / dt
+    return {
+        "multidrone_frames_per_s": ((st["frames"] - f0) / dt, "frames/s", True),
+        "multidrone_loop_cpu_pct_per_drone": (cpu / n, "%", False),
+        "multidrone_commands_applied_pct": (100 * applied / n, "%", True),
+    }
+
+
+# --- fan-out hub: many subscribers on one drone link ---
+@bench
+def bench_hub(quick: bool):
+    import selectors
+    from hub import TelemetryHub
+    rate, n = 1000, (16 if quick else 48)
+    srv = SimServer(port=0, rate_hz=rate).start()
+    hub = TelemetryHub(TcpTransport(*srv.address)).start()
+    addr = hub.listen("127.0.0.1", 0)
+    subs = [socket.create_connection(addr) for _ in range(n)]
+    stalled = socket.socket()              # never reads: must not hold anyone else up
+    stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stalled.connect(addr)
+    sel = selectors.DefaultSelector()
+    for s in subs:
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ)
+    got = dict.fromkeys(subs, 0)
+
+    def pump(until):
+        while time.monotonic() < until:
+            for key, _ in sel.select(0.05):
+                try:
+                    got[key.fileobj] += len(key.fileobj.recv(1 << 16))
+                except BlockingIOError:
+                    pass
+    pump(time.monotonic() + 0.5)
+    f0, c0, t0 = hub.frames_in, hub.cpu_s, time.monotonic()
+    got = dict.fromkeys(subs, 0)
+    pump(t0 + (1.0 if quick else 3.0))
+    pump(time.monotonic() + 0.2)           # let the last writes land
+    st, dt = hub.stats(), time.monotonic() - t0
+    frames = st["frames_in"] - f0
+    print(f"  stalled subscriber: {st['dropped']} frames dropped", file=sys.stderr)
+    # link loss from whole-session totals once the sim has stopped and the hub has
+    # drained: comparing counters read at different moments counts in-flight frames as lost
+    srv.stop()
+    time.sleep(0.3)
+    kept = hub.frames_in / max(1, srv.frames_sent)
+    hub.stop()
+    for s in subs + [stalled]:
+        s.close()
+    return {
+        "hub_link_kept_pct": (100 * kept, "%", True),
+        "hub_min_delivery_pct": (100 * min(got.values()) / PACKET_LEN / max(1, frames), "%", True),
+        "hub_loop_cpu_pct": (100 * (st["cpu_s"] - c0) / dt, "%", False),
+    }
+
+
+# --- corrupted stream: bytes dropped and inserted on the wire ---
+@bench
+def bench_fuzz(quick: bool):
+    from ingest import IngestWorker
+    res = {}
+    faults = Faults(drop_byte=0.02, insert_byte=0.02)
+    for proto in (1, 2):
+        srv = SimServer(port=0, rate_hz=1000, faults=faults, seed=7, protocol=proto).start()
+        w = IngestWorker(TcpTransport(*srv.address))
+        w.start()
+        time.sleep(1.0 if quick else 3.0)
+        w.stop(); w.join(); srv.stop()
+        good = bad = 0
+        for _, frames, _ in w.drain_history():
+            # nothing commands the motors, so a real frame echoes zeros and the sim's temp
+            for i in range(len(frames)):
+                ok = (frames['temp'][i] == TEMP_RAW and frames['bat_adc'][i] <= 4095
+                      and not any(frames['motors'][i]))
+                good += ok
+                bad += not ok
+        total = max(1, good + bad)
+        res[f"fuzz_v{proto}_corrupt_pct"] = (100 * bad / total, "%", False)
+        res[f"fuzz_v{proto}_recovered_pct"] = (100 * good / max(1, srv.frames_sent), "%", True)
+        if proto == 2:
+            st = w.decoder.stats()
+            print(f"  v2 decoder: {st}", file=sys.stderr)
+    return res
+
+
+# --- shared-memory ring: writer cost with readers in other processes ---
+_SHM_READER = """
+import sys, time
+sys.path.insert(0, sys.argv[2])
+from shm import ShmRingReader
+r = ShmRingReader(sys.argv[1])
+while True:
+    view, start = r.latest(1000)
+    float(view['ax'].mean())
+    r.valid(start)
+    time.sleep(0.001)
+"""
+
+
+@bench
+def bench_shm(quick: bool):
+    if np is None:
+        return {"skipped": "needs NumPy"}
+    import subprocess
+    from shm import ShmRingReader, ShmRingWriter
+    batch = np.frombuffer(_frames(10), FRAME_DTYPE)
+    w = ShmRingWriter(f"drone-bench-{os.getpid()}")
+    for _ in range(200):
+        w.write(batch, 0)
+    res = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for readers in (0, 8):
+        procs = [subprocess.Popen([sys.executable, "-c", _SHM_READER, w.name, here]) for _ in range(readers)]
+        if procs:
+            time.sleep(1.0)
+        # CPU time, not wall: on a small machine the readers also compete for cores
+        c0 = time.thread_time()
+        for _ in range(20000):
+            w.write(batch, 0)
+        cpu = (time.thread_time() - c0) / 20000
+        res[f"shm_write_10_frames_{readers}_readers_us"] = (cpu * 1e6, "us", False)
+        for p in procs:
+            p.kill()
+            p.wait()
+    r = ShmRingReader(w.name)
+    res["shm_latest_1000_us"] = (_timeit(lambda: r.latest(1000)) * 1e6, "us", False)
+    r.close()
+    w.close()
+    return res
+
+
+
+# --- link monitor: per-read cost (what it detects is checked in tests/test_linkmon.py) ---
+@bench
+def bench_linkmon(quick: bool):
+    from linkmon import LinkMonitor
+    m = LinkMonitor()
+    t = [0]
+
+    def chunk():
+        t[0] += 10_000_000
+        m.on_chunk(t[0], 20, 1, 0, 0)
+    return {"linkmon_on_chunk_us": (_timeit(chunk) * 1e6, "us", False)}
+
+
+# --- profiler: what a span costs on the hot path, off and on ---
+@bench
+def bench_profiler(quick: bool):
+    from profiler import Profiler
+    prof = Profiler()
+    res = {}
+    for on in (False, True):
+        prof.enable(on)
+
+        def one():
+            with prof.span("decode"):
+                pass
+        res[f"profiler_span_{'on' if on else 'off'}_us"] = (_timeit(one) * 1e6, "us", False)
+        prof.clear()
+    return res
+
+
+# --- host level hold: closed loop against the sim with a roll imbalance ---
+@bench
+def bench_stabilizer(quick: bool):
+    import math
+    from ingest import IngestWorker, LinkState
+    from stabilizer import Stabilizer
+    res = {}
+    for hz in (100, 500):
+        model = DroneModel(imbalance=3.0, seed=1)    # rolls onto the stand's 60 deg stop open loop
+        # v1 frames carry no timestamps and the estimator assumes 100 Hz, so 500 Hz runs v2
+        srv = SimServer(port=0, rate_hz=hz, model=model, protocol=1 if hz == 100 else 2).start()
+        w = IngestWorker(TcpTransport(*srv.address))
+        w.start()
+        while w.state in (LinkState.idle, LinkState.connecting):
+            time.sleep(0.01)
+        stab = Stabilizer(lambda: w.latest, w.send, hz)
+        stab.set_target(90, pitch=math.radians(5))
+        stab.start()
+        time.sleep(2.0)                              # settle, integrator wound in
+        roll, pitch = [], []
+        t_end = time.monotonic() + (2.0 if quick else 5.0)
+        while time.monotonic() < t_end:
+            roll.append(model.roll)
+            pitch.append(model.pitch - math.radians(5))
+            time.sleep(0.005)
+        stab.stop()
+        w.stop(); w.join(); srv.stop()
+        rms = lambda v: math.degrees(math.sqrt(sum(x * x for x in v) / len(v)))
+        res[f"stab_{hz}hz_roll_rms_deg"] = (rms(roll), "deg", False)
+        res[f"stab_{hz}hz_pitch_err_rms_deg"] = (rms(pitch), "deg", False)
+        res[f"stab_{hz}hz_jitter_p99_us"] = (stab.jitter.percentile(99), "us", False)
+        res[f"stab_{hz}hz_overrun_pct"] = (100 * stab.overruns / max(1, stab.ticks), "%", False)
+        print(f"  {hz} Hz: {stab.stats()}", file=sys.stderr)
+    return res
+
+# --- flight log pyramid: open and zoom over an hour of telemetry ---
+@bench
+def bench_pyramid(quick: bool):
+    if np is None:
+        return {"skipped": "needs NumPy"}
+    from pyramid import Pyramid
+    from recorder import Recorder
+    seconds = 600 if quick else 3600
+    raw = _frames(1000)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "bench.dlog")
+        rec = Recorder(path, max_pending=1 << 16)
+        t0 = time.perf_counter()
+        for s in range(seconds):          # 100 Hz, 10-frame batches, a command per second
+            for k in range(10):
+                off = (s * 10 + k) % 100 * 10 * PACKET_LEN
+                rec.record_frames(raw[off:off + 10 * PACKET_LEN], s * 10**9 + k * 10**8)
+            rec.record_command(b"\x5a\x5a\x5a\x5a", s * 10**9 + 5)
+            while rec.fill_level > 0.5:
+                time.sleep(0.001)
+        rec.close()
+        record_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        pyr = Pyramid.open(path)
+        open_s = time.perf_counter() - t0
+        full = _timeit(lambda: pyr.query('ax', pyr.t_start, pyr.t_end, 1000))
+        mid = pyr.t_start + (pyr.t_end - pyr.t_start) // 2
+        zoom = _timeit(lambda: pyr.query('ax', mid, mid + 60 * 10**9, 1000))
+        os.remove(path + ".pyr")
+        t0 = time.perf_counter()
+        Pyramid.open(path, save=False)
+        rebuild_s = time.perf_counter() - t0
+        pyr.log.close()
+    return {
+        "pyramid_record_frames_per_s": (seconds * 100 / record_s, "frames/s", True),
+        "pyramid_open_ms": (open_s * 1e3, "ms", False),
+        "pyramid_rebuild_ms": (rebuild_s * 1e3, "ms", False),
+        "pyramid_query_full_us": (full * 1e6, "us", False),
+        "pyramid_query_1min_us": (zoom * 1e6, "us", False),
+    }
+
+
+# --- sustained telemetry rate ---
+@bench
+def bench_sustained_rate(quick: bool):
+    from ingest import IngestWorker
+    rates = (100, 500, 1000, 2000, 5000) if quick else (100, 500, 1000, 2000, 5000, 10000, 20000)
+    best = 0
+    for rate in rates:
+        srv = SimServer(port=0, rate_hz=rate).start()
+        w = IngestWorker(TcpTransport(*srv.address))
+        w.start()
+        time.sleep(0.2)
+        lags = []
+        for _ in range(4):
+            time.sleep(0.25)
+            lags.append(srv.frames_sent - w.decoder.frames_total)
+        w.stop(); w.join(); srv.stop()
+        # receive side keeps up if the backlog isn't growing (allow ~20 ms of slack)
+        if lags[-1] - lags[0] > max(2, rate * 0.02) or srv.frames_sent < rate * 0.8:
+            break
+        best = rate
+    return {"sustained_rate_hz": (best, "frames/s", True)}
+
+
+# --- driver ---
+def run(names, quick: bool) -> dict:
+    results = {}
+    for name in names:
+        t0 = time.perf_counter()
+        out = BENCHES[name](quick)
+        print(f"[{name}] {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        for metric, val in out.items():
+            if metric == "skipped":
+                print(f"  skipped: {val}", file=sys.stderr)
+                continue
+            value, unit, higher = val
+            results[metric] = {"value": value, "unit": unit, "higher_is_better": higher, "bench": name}
+            print(f"  {metric:32s} {value:14,.2f} {unit}", file=sys.stderr)
+    return results
+
+
+COMPARABLE = ("quick", "numpy")     # meta fields that change what the metrics measure
+
+
+def compare(doc: dict, baseline: dict, tolerance: float, ran) -> tuple:
+    """
+    (regressions, missing): metrics that got worse than baseline by more than
+    `tolerance` (fraction), and baseline metrics of the benches in `ran` that
+    this run didn't produce. ValueError if a COMPARABLE meta field differs.
+    """
+    meta, base_meta = doc["meta"], baseline.get("meta", {})
+    differ = [f"{k} {base_meta.get(k)} -> {meta[k]}" for k in COMPARABLE if base_meta.get(k) != meta[k]]
+    if differ:
+        raise ValueError("baseline is a different kind of run (" + ", ".join(differ) + ")")
+    results = doc["results"]
+    bad, missing = [], []
+    for metric, base in baseline.get("results", {}).items():
+        cur = results.get(metric)
+        if cur is None:
+            if base.get("bench", "") in ran or "bench" not in base:
+                missing.append(metric)
+            continue
+        if not base["value"]:
+            continue
+        change = (cur["value"] - base["value"]) / abs(base["value"])
+        worse = -change if base["higher_is_better"] else change
+        if worse > tolerance:
+            bad.append((metric, base["value"], cur["value"], worse))
+    return bad, missing
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks for the host-side telemetry/control pipeline.")
+    ap.add_argument("--only", nargs="*", choices=sorted(BENCHES), help="run a subset")
+    ap.add_argument("--quick", action="store_true", help="smaller inputs, for a smoke run")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", metavar="BASELINE", help="flag regressions against this results JSON")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, fraction (default 0.2)")
+    args = ap.parse_args()
+
+    names = args.only or list(BENCHES)
+    results = run(names, args.quick)
+    doc = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "machine": platform.machine(), "numpy": np is not None, "quick": args.quick},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+    else:
+        json.dump(doc, sys.stdout, indent=2); print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        try:
+            bad, missing = compare(doc, baseline, args.tolerance, names)
+        except ValueError as e:
+            sys.exit(f"--compare {args.compare}: {e}")
+        for metric, old, new, worse in bad:
+            print(f"REGRESSION {metric}: {old:,.2f} -> {new:,.2f} ({worse:+.0%})", file=sys.stderr)
+        for metric in missing:
+            print(f"MISSING {metric}: in the baseline, not produced by this run", file=sys.stderr)
+        if bad or missing:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import threading, time
+
+from profiler import span
+
+
+class CommandScheduler:
+    """
+    Fixed-rate, latest-value-wins motor command sender.
+
+    Inputs only overwrite the pending setpoint with set(); every tick the newest
+    setpoint is sent if it differs from the last packet on the wire, or re-sent as
+    a keep-alive once keepalive_s has passed. poll() holds that decision and is
+    clock-agnostic, so the same logic can be driven by start() (own thread,
+    absolute deadlines) or by an event loop.
+    """
+    def __init__(self, send, rate_hz: float = 30.0, keepalive_s: float = 0.5):
+        self._send = send                 # fn(bytes) -> bool
+        self.rate_hz = float(rate_hz)
+        self.keepalive_ns = int(keepalive_s * 1e9)
+        self._setpoint = None             # bytes; replaced wholesale, never mutated
+        self._since_tick = 0
+        self._last = None
+        self._last_t = 0
+        self._wake = threading.Event()
+        self._halt = threading.Event()
+        self._thread = None
+
+        # stats
+        self.submitted = 0      # set() calls
+        self.overwritten = 0    # setpoints replaced before a tick could send them
+        self.sent = 0
+        self.deduped = 0        # ticks skipped because nothing changed
+        self.keepalives = 0
+        self.failed = 0
+        self.ticks = 0
+        self.scheduled = 0      # ticks on the regular schedule (ticks also counts urgent ones)
+        self.late_max_ns = 0    # worst tick lateness vs its deadline
+        self._late_sum = 0
+
+    # --- producer side ---
+    def set(self, packet: bytes, urgent: bool = False):
+        """New setpoint. urgent=True sends it right away instead of at the next tick."""
+        self.submitted += 1
+        self._since_tick += 1
+        self._setpoint = bytes(packet)
+        if urgent:
+            self._wake.set()
+
+    @property
+    def setpoint(self):
+        return self._setpoint
+
+    # --- decision ---
+    def poll(self, now_ns: int):
+        """Packet to put on the wire at now_ns, or None."""
+        self.ticks += 1
+        if self._since_tick > 1:
+            self.overwritten += self._since_tick - 1
+        self._since_tick = 0
+        pkt = self._setpoint
+        if pkt is None:
+            return None
+        if pkt == self._last:
+            if now_ns - self._last_t < self.keepalive_ns:
+                self.deduped += 1
+                return None
+            self.keepalives += 1
+        self._last, self._last_t = pkt, now_ns
+        return pkt
+
+    def tick(self, now_ns: int | None = None):
+        pkt = self.poll(time.monotonic_ns() if now_ns is None else now_ns)
+        if pkt is not None:
+            with span("send"):
+                ok = self._send(pkt)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self._last = None     # retry next tick
+
+    # --- own thread ---
+    def start(self):
+        self._halt.clear()
+        self._thread = threading.Thread(target=self._run, name="commands", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._halt.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        period = int(1e9 / self.rate_hz)
+        deadline = time.monotonic_ns()
+        while not self._halt.is_set():
+            urgent = self._wake.wait(max(0, deadline - time.monotonic_ns()) / 1e9)
+            if self._halt.is_set():
+                return
+            now = time.monotonic_ns()
+            if urgent:
+                self._wake.clear()
+                self.tick(now)
+                continue      # out-of-band send; the regular schedule is unchanged
+            late = now - deadline
+            self.scheduled += 1
+            self.late_max_ns = max(self.late_max_ns, late)
+            self._late_sum += late
+            self.tick(now)
+            deadline += period
+            if deadline < now:          # fell behind (suspend, debugger): skip, don't burst
+                deadline = now + period
+
+    def stats(self) -> dict:
+        regular = max(1, self.scheduled)
+        return {
+            "rate_hz": self.rate_hz,
+            "submitted": self.submitted,
+            "overwritten": self.overwritten,
+            "sent": self.sent,
+            "deduped": self.deduped,
+            "keepalives": self.keepalives,
+            "failed": self.failed,
+            "late_mean_us": self._late_sum / regular / 1000,
+            "late_max_us": self.late_max_ns / 1000,
+        }
@@ -0,0 +1,154 @@
+import math
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from protocol import A_SENS, G_SENS
+
+# Complementary attitude filter, run over a whole decoded batch at once.
+#
+# Per sample k, for roll and pitch:
+#     angle_k = alpha_k * (angle_{k-1} + rate_k * dt_k) + (1 - alpha_k) * accel_angle_k
+#     alpha_k = tau / (tau + w_k * dt_k)
+# where w_k in [0, 1] trusts the accelerometer less the further |a| is from 1 g
+# (vibration, manoeuvres). That is a first-order linear recurrence
+# x_k = a_k * x_{k-1} + b_k, solved for the batch with a cumulative-product scan:
+#     x_k = A_k * (x_0 + sum_{j<=k} b_j / A_j),   A_k = a_1 * ... * a_k
+# done in blocks so A_k stays far from underflow. Yaw has no absolute reference
+# and is the wrapped running sum of gz * dt.
+
+DEG = math.pi / 180
+GYRO_RAD = DEG / G_SENS         # raw gyro LSB -> rad/s
+SCAN_BLOCK = 64                 # A_k stays above ~1e-130 even for a_k ~ 0.01
+SMALL_BATCH = 8                 # below this the scalar loop beats NumPy's per-call overhead
+
+
+@dataclass(frozen=True)
+class Attitude:
+    """Per-sample estimator output for one batch (arrays, or lists without NumPy)."""
+    t: object        # host monotonic seconds, per sample
+    roll: object     # rad
+    pitch: object    # rad
+    yaw: object      # rad, relative to where the estimator started
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def latest(self):
+        """(roll, pitch, yaw) of the newest sample."""
+        return float(self.roll[-1]), float(self.pitch[-1]), float(self.yaw[-1])
+
+    @property
+    def tilt(self):
+        """Newest attitude as the normalized (x, y) the tilt ball plots: what ax/|g|,
+        ay/|g| would read with no vibration."""
+        roll, pitch, _ = self.latest
+        return -math.sin(pitch), math.sin(roll) * math.cos(pitch)
+
+
+def _scan(a, b, x0: float):
+    """x_k = a_k * x_{k-1} + b_k for the whole array; returns x."""
+    out = np.empty_like(b)
+    for i in range(0, len(b), SCAN_BLOCK):
+        A = np.cumprod(a[i:i + SCAN_BLOCK])
+        x = A * (x0 + np.cumsum(b[i:i + SCAN_BLOCK] / A))
+        out[i:i + SCAN_BLOCK] = x
+        x0 = x[-1]
+    return out
+
+
+class AttitudeEstimator:
+    """
+    Roll/pitch/yaw from gyro + accelerometer frames. tau is the crossover time
+    constant (s): shorter trusts the accelerometer more. sample_period is the IMU
+    rate used when frames carry no device timestamps (v1: 100 Hz).
+    """
+    def __init__(self, tau: float = 0.5, sample_period: float = 0.01, accel_reject: float = 0.3,
+                 use_numpy: bool = True):
+        self.tau = tau
+        self.sample_period = sample_period
+        self.accel_reject = accel_reject      # |a| this far from 1 g -> accel ignored
+        self.use_numpy = use_numpy and np is not None   # needs NumPy-decoded frames
+        self.roll = self.pitch = self.yaw = None
+        self._last_t_us = None
+        self.samples = 0
+
+    def reset(self):
+        self.roll = self.pitch = self.yaw = None
+        self._last_t_us = None
+
+    def _dt(self, n: int, t_us, vectorized: bool):
+        """Per-sample dt: from device timestamps when given, else the nominal period."""
+        period = self.sample_period
+        if t_us is None:
+            self._last_t_us = None
+            return np.full(n, period) if vectorized else [period] * n
+        first = int(t_us[0])
+        prev = self._last_t_us if self._last_t_us is not None else first - round(period * 1e6)
+        self._last_t_us = int(t_us[-1])
+        if vectorized:
+            us = np.asarray(t_us, dtype=np.int64)
+            dt = ((us - np.concatenate(([prev], us[:-1]))) & 0xFFFFFFFF) / 1e6   # micros() wraps
+            return np.where((dt > 0) & (dt < 1.0), dt, period)
+        dt = []
+        for v in t_us:
+            d = ((int(v) - prev) & 0xFFFFFFFF) / 1e6
+            dt.append(d if 0 < d < 1.0 else period)
+            prev = int(v)
+        return dt
+
+    def update(self, frames, t: float, t_us=None) -> Attitude:
+        """Run one decoded batch. t is when it arrived; t_us the device timestamps (v2)."""
+        n = len(frames)
+        if self.use_numpy and n >= SMALL_BATCH:
+            return self._update_numpy(frames, t, self._dt(n, t_us, True))
+        dt = self._dt(n, t_us, False)
+        if self.use_numpy:
+            cols = {f: frames[f].tolist() for f in ('ax', 'ay', 'az', 'gx', 'gy', 'gz')}
+            att = self._update_python(cols, t, dt)
+            return Attitude(*(np.asarray(v) for v in (att.t, att.roll, att.pitch, att.yaw)))
+        return self._update_python(frames, t, dt)
+
+    def _update_numpy(self, frames, t, dt):
+        ax, ay, az = (frames[f].astype(np.float64) / A_SENS for f in ('ax', 'ay', 'az'))
+        gx, gy, gz = (frames[f].astype(np.float64) * GYRO_RAD for f in ('gx', 'gy', 'gz'))
+        acc_roll = np.arctan2(ay, az)
+        acc_pitch = np.arctan2(-ax, np.hypot(ay, az))
+        if self.roll is None:
+            self.roll, self.pitch, self.yaw = float(acc_roll[0]), float(acc_pitch[0]), 0.0
+
+        w = np.clip(1 - np.abs(np.sqrt(ax*ax + ay*ay + az*az) - 1) / self.accel_reject, 0, 1)
+        a = self.tau / (self.tau + w * dt)
+        roll = _scan(a, a * gx * dt + (1 - a) * acc_roll, self.roll)
+        pitch = _scan(a, a * gy * dt + (1 - a) * acc_pitch, self.pitch)
+        yaw = (self.yaw + np.cumsum(gz * dt) + math.pi) % (2 * math.pi) - math.pi
+
+        self.roll, self.pitch, self.yaw = float(roll[-1]), float(pitch[-1]), float(yaw[-1])
+        self.samples += len(dt)
+        ts = t - np.cumsum(dt[::-1])[::-1] + dt
+        return Attitude(ts, roll, pitch, yaw)
+
+    def _update_python(self, frames, t, dt):
+        roll_out, pitch_out, yaw_out = [], [], []
+        for i in range(len(dt)):
+            ax, ay, az = (frames[f][i] / A_SENS for f in ('ax', 'ay', 'az'))
+            acc_roll = math.atan2(ay, az)
+            acc_pitch = math.atan2(-ax, math.hypot(ay, az))
+            if self.roll is None:
+                self.roll, self.pitch, self.yaw = acc_roll, acc_pitch, 0.0
+            w = min(1.0, max(0.0, 1 - abs(math.sqrt(ax*ax + ay*ay + az*az) - 1) / self.accel_reject))
+            a = self.tau / (self.tau + w * dt[i])
+            self.roll = a * (self.roll + frames['gx'][i] * GYRO_RAD * dt[i]) + (1 - a) * acc_roll
+            self.pitch = a * (self.pitch + frames['gy'][i] * GYRO_RAD * dt[i]) + (1 - a) * acc_pitch
+            self.yaw = (self.yaw + frames['gz'][i] * GYRO_RAD * dt[i] + math.pi) % (2 * math.pi) - math.pi
+            roll_out.append(self.roll); pitch_out.append(self.pitch); yaw_out.append(self.yaw)
+        self.samples += len(dt)
+        ts, acc = [], t
+        for d in reversed(dt):
+            ts.append(acc)
+            acc -= d
+        return Attitude(ts[::-1], roll_out, pitch_out, yaw_out)
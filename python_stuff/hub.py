@@ -0,0 +1,541 @@
+import argparse, asyncio, os, socket, sys, threading, time
+from collections import deque
+from enum import Enum
+
+from ingest import LinkState
+from protocol import PACKET_LEN, FrameDecoder
+from transport import TRANSPORT_HELP, Transport, make_transport
+
+# Telemetry fan-out hub. The firmware serves one client, so the hub is that
+# client and re-serves the stream locally to any number of subscribers:
+#   python hub.py --host 192.168.4.1            # listens on 127.0.0.1:2324
+#   python UI.py --host 127.0.0.1 --port 2324
+#   DRONE_HOST=127.0.0.1 DRONE_PORT=2324 python playaround.py
+# Subscribers speak the firmware's protocol (v1 frames out, 4-byte motor packets
+# in), so every existing client works unchanged. A v2 drone is checked and
+# unwrapped at the hub.
+#
+# One thread reads the drone and hands decoded batches to an asyncio loop that
+# does the fan-out, coalescing whatever arrived while it was busy into one write
+# per subscriber. The reader never waits on a subscriber: one that can't keep up
+# gets a bounded backlog with a DropPolicy. Only one subscriber controls the
+# motors at a time (see TelemetryHub).
+
+LISTEN_DEFAULT = ("127.0.0.1", 2324)
+WRITE_HIGH = 4096          # asyncio buffer per subscriber; beyond it frames wait in the Backlog
+SNDBUF = 32 * 1024
+
+
+class DropPolicy(Enum):
+    oldest = "oldest"            # keep the newest frames (live views)
+    newest = "newest"            # keep what is queued, refuse new frames until there is room
+    disconnect = "disconnect"    # never skip silently: drop the subscriber (loggers)
+
+
+class Backlog:
+    """Bounded queue of whole frames for one subscriber that is behind."""
+    def __init__(self, max_frames: int, policy: DropPolicy):
+        self.max_frames = max(1, int(max_frames))
+        self.policy = policy
+        self.chunks = deque()
+        self.frames = 0
+        self.dropped = 0
+
+    def push(self, data: bytes) -> bool:
+        """Queue frames; False if the policy says the subscriber has to go."""
+        n = len(data) // PACKET_LEN
+        over = self.frames + n - self.max_frames
+        if over > 0:
+            if self.policy is DropPolicy.disconnect:
+                return False
+            self.dropped += over
+            if self.policy is DropPolicy.newest:
+                n -= over
+                if n <= 0:
+                    return True
+                data = data[:n * PACKET_LEN]
+            else:
+                while over and self.chunks:
+                    k = len(self.chunks[0]) // PACKET_LEN
+                    if k <= over:
+                        self.chunks.popleft()
+                        self.frames -= k
+                        over -= k
+                    else:
+                        self.chunks[0] = self.chunks[0][over * PACKET_LEN:]
+                        self.frames -= over
+                        over = 0
+                if over:
+                    data = data[over * PACKET_LEN:]
+                    n -= over
+        self.chunks.append(data)
+        self.frames += n
+        return True
+
+    def take(self, max_frames: int | None = None) -> bytes:
+        """Oldest frames first, up to max_frames (all by default)."""
+        if max_frames is None or max_frames >= self.frames:
+            out = b"".join(self.chunks)
+            self.chunks.clear()
+            self.frames = 0
+            return out
+        parts, need = [], max_frames
+        while need:
+            c = self.chunks[0]
+            k = len(c) // PACKET_LEN
+            if k <= need:
+                parts.append(self.chunks.popleft())
+                need -= k
+            else:
+                parts.append(c[:need * PACKET_LEN])
+                self.chunks[0] = c[need * PACKET_LEN:]
+                need = 0
+        self.frames -= max_frames
+        return b"".join(parts)
+
+
+class _Subscriber:
+    """What the hub keeps per subscriber, whatever carries its bytes."""
+    def __init__(self, hub, policy: DropPolicy, max_frames: int, name: str):
+        self.hub = hub
+        self.name = name
+        self.backlog = Backlog(max_frames, policy)
+        self.frames_out = 0
+        self.commands = 0
+        self.denied = 0          # motor packets refused because someone else had control
+        self.last_packet = None
+        self._rx = bytearray()
+
+    def _commands_in(self, data):
+        """Split received bytes into 4-byte motor packets for the hub (loop thread)."""
+        self._rx += data
+        whole = len(self._rx) // 4 * 4
+        for i in range(0, whole, 4):
+            self.hub._command(self, bytes(self._rx[i:i + 4]))
+        del self._rx[:whole]
+
+    def stats(self) -> dict:
+        return {"name": self.name, "policy": self.backlog.policy.value, "frames_out": self.frames_out,
+                "queued": self.backlog.frames, "dropped": self.backlog.dropped,
+                "commands": self.commands, "denied": self.denied}
+
+
+class _TcpSubscriber(asyncio.Protocol, _Subscriber):
+    def __init__(self, hub, policy: DropPolicy, max_frames: int):
+        _Subscriber.__init__(self, hub, policy, max_frames, "tcp")
+        self.transport = None
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        host, port = transport.get_extra_info("peername")[:2]
+        self.name = f"tcp://{host}:{port}"
+        sock = transport.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SNDBUF)   # backlog lives where the policy sees it
+        transport.set_write_buffer_limits(high=WRITE_HIGH)
+        self.hub._attach(self)
+
+    def push(self, data: bytes):
+        if self.paused or self.backlog.frames:
+            if not self.backlog.push(data):
+                self.hub._detach(self, "fell behind")
+                self.transport.abort()
+            return
+        self.transport.write(data)
+        self.frames_out += len(data) // PACKET_LEN
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        if self.backlog.frames:
+            n = self.backlog.frames
+            self.transport.write(self.backlog.take())
+            self.frames_out += n
+
+    def data_received(self, data):
+        self._commands_in(data)
+
+    def connection_lost(self, exc):
+        self.hub._detach(self, "disconnected")
+
+    def close(self):
+        self.transport.abort()
+
+
+class HubTransport(Transport, _Subscriber):
+    """
+    In-process subscriber with the Transport API, for consumers living in the
+    hub's process: IngestWorker(hub.subscribe()) works like a drone connection.
+    recv_into hands back whole frames only.
+    """
+    def __init__(self, hub, policy: DropPolicy = DropPolicy.oldest, max_frames: int = 1024,
+                 name: str = "local"):
+        _Subscriber.__init__(self, hub, policy, max_frames, name)
+        self._cond = threading.Condition()
+        self._timeout = None
+        self._closed = False
+
+    def open(self):
+        self._closed = False
+        self.hub._call(self.hub._attach, self)
+        return self
+
+    def push(self, data: bytes):          # loop thread
+        with self._cond:
+            if not self.backlog.push(data):
+                self._closed = True
+                self.hub._detach(self, "fell behind")
+            self._cond.notify()
+
+    def settimeout(self, t):
+        self._timeout = t
+
+    def recv_into(self, buf) -> int:
+        room = len(buf) // PACKET_LEN
+        if not room:
+            raise ValueError(f"buffer smaller than one {PACKET_LEN}-byte frame")
+        with self._cond:
+            if not self.backlog.frames and not self._closed:
+                if not self._cond.wait(self._timeout):
+                    raise socket.timeout()
+            if not self.backlog.frames:
+                return 0
+            n = min(room, self.backlog.frames)
+            data = self.backlog.take(n)
+            self.frames_out += n
+        memoryview(buf)[:len(data)] = data
+        return len(data)
+
+    def sendall(self, data: bytes):
+        if self._closed:
+            raise BrokenPipeError("hub subscription closed")
+        self.hub._call(self._commands_in, bytes(data))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.hub._call(self.hub._detach, self, "closed")
+
+
+class TelemetryHub:
+    """
+    Owns the one drone connection (any transport.Transport; reconnected every
+    reconnect_s) and fans decoded frames out to subscribers: TCP listeners from
+    listen(), in-process ones from subscribe().
+
+    Motor control is arbitrated: the first subscriber to send a packet gets
+    control, and others' packets are refused (counted as `denied`) until its lease
+    lapses, i.e. it has sent nothing for lease_s (clients keep it with their
+    keep-alives), or it goes away. Either way the hub then sends a stop, as the
+    firmware does when its client disconnects. A stop (a subscriber's packets going
+    to all zeros) from anyone is forwarded, but leaves control where it is; a
+    stop repeated as a keep-alive by an idle client is refused like any other
+    packet, so it cannot keep cutting the pilot's motors.
+    """
+    def __init__(self, drone: Transport, lease_s: float = 1.5, reconnect_s: float = 2.0, recorder=None,
+                 ring=None):
+        self.drone = drone
+        self.lease_s = lease_s
+        self.reconnect_s = reconnect_s
+        self.recorder = recorder      # optional recorder.Recorder: the complete log, nothing dropped
+        self.ring = ring              # optional shm.ShmRingWriter for same-machine readers
+        self.decoder = FrameDecoder()
+        self.state = LinkState.idle
+        self.error = ""
+        self.loop = asyncio.new_event_loop()
+        self.subscribers = ()         # loop thread only; replaced wholesale
+        self.controller = None
+        self.events = deque(maxlen=256)   # (time.monotonic(), text): connects, control changes
+        self._ctl_heard = 0.0
+        self._sock = None
+        self._inbox = deque()
+        self._flush_pending = False
+        self._servers = []
+        self._halt = threading.Event()
+        self._reader = self._thread = None
+        # stats
+        self.connects = 0
+        self.frames_in = 0
+        self.commands_out = 0
+        self.denied = 0
+        self.stops = 0           # stops forwarded from subscribers without control
+        self.handovers = 0
+        self.kicked = 0           # subscribers dropped by DropPolicy.disconnect
+        self.cpu_s = 0.0          # CPU time of the loop thread
+
+    # --- any thread ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="hub-loop", daemon=True)
+        self._thread.start()
+        self._reader = threading.Thread(target=self._read_drone, name=f"hub-{self.drone.name}", daemon=True)
+        self._reader.start()
+        return self
+
+    def stop(self):
+        self._halt.set()
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+        if self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(2.0)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self._thread = None
+        self.loop.close()
+
+    def listen(self, host: str, port: int, policy: DropPolicy = DropPolicy.oldest, max_frames: int = 256):
+        """Serve subscribers on host:port (port 0 picks one); returns the bound address."""
+        async def serve():
+            return await self.loop.create_server(lambda: _TcpSubscriber(self, policy, max_frames), host, port)
+        server = asyncio.run_coroutine_threadsafe(serve(), self.loop).result()
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[:2]
+
+    def subscribe(self, policy: DropPolicy = DropPolicy.oldest, max_frames: int = 1024,
+                  name: str = "local") -> HubTransport:
+        """In-process subscriber; it attaches when opened (IngestWorker does that)."""
+        return HubTransport(self, policy, max_frames, name)
+
+    def _call(self, fn, *args):
+        if self._thread is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    # --- drone reader thread ---
+    def _read_drone(self):
+        buf = bytearray(64 * 1024)
+        view = memoryview(buf)
+        while not self._halt.is_set():
+            self.state = LinkState.connecting
+            try:
+                sock = self.drone.open()
+                sock.settimeout(0.2)
+            except OSError as e:
+                self.error = str(e)
+                self.state = LinkState.failed
+                self._halt.wait(self.reconnect_s)
+                continue
+            self.decoder.reset()
+            self._sock = sock
+            self.connects += 1
+            self.state = LinkState.connected
+            self._call(self._note, f"drone connected ({self.drone.name})")
+            try:
+                while not self._halt.is_set():
+                    try:
+                        n = sock.recv_into(buf)
+                    except socket.timeout:
+                        continue
+                    if n == 0:
+                        break
+                    frames = self.decoder.feed(view[:n])
+                    if len(frames):
+                        t_ns = time.monotonic_ns()
+                        if self.ring is not None:
+                            self.ring.write(frames, t_ns)
+                        self._publish(frames.tobytes(), t_ns)
+                self.state = LinkState.closed
+            except OSError as e:
+                self.error = str(e)
+                self.state = LinkState.failed
+            finally:
+                self._sock = None
+                sock.close()
+            if not self._halt.is_set():
+                self._call(self._note, f"drone link lost {self.error}".rstrip())
+                self._halt.wait(self.reconnect_s)
+
+    def _publish(self, data: bytes, t_ns: int):
+        self.frames_in += len(data) // PACKET_LEN
+        if self.recorder is not None:
+            self.recorder.record_frames(data, t_ns)
+        self._inbox.append(data)
+        if not self._flush_pending:
+            # one wake-up per loop pass: batches that arrive meanwhile ride along
+            self._flush_pending = True
+            self._call(self._flush)
+
+    # --- loop thread ---
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._watch())
+        self.loop.run_forever()
+
+    async def _shutdown(self):
+        for server in self._servers:
+            server.close()
+        for s in self.subscribers:
+            s.close()
+        tasks = [t for t in asyncio.all_tasks(self.loop) if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _note(self, text: str):
+        self.events.append((time.monotonic(), text))
+
+    def _flush(self):
+        self._flush_pending = False
+        inbox = self._inbox
+        parts = []
+        try:
+            while True:
+                parts.append(inbox.popleft())
+        except IndexError:
+            pass
+        if not parts:
+            return
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        for s in self.subscribers:
+            s.push(data)
+
+    def _attach(self, s):
+        self.subscribers = self.subscribers + (s,)
+        self._note(f"{s.name} subscribed ({s.backlog.policy.value}, {s.backlog.max_frames} frames)")
+
+    def _detach(self, s, why: str):
+        if s not in self.subscribers:
+            return
+        self.subscribers = tuple(x for x in self.subscribers if x is not s)
+        if why == "fell behind":
+            self.kicked += 1
+        self._note(f"{s.name} {why}")
+        if self.controller is s:
+            self._release(f"{s.name} {why}")
+
+    def _command(self, s, packet: bytes):
+        s.commands += 1
+        now = time.monotonic()
+        prev, s.last_packet = s.last_packet, packet
+        if self.controller is not s:
+            held = self.controller is not None and now - self._ctl_heard < self.lease_s
+            if held:
+                if not any(packet) and (prev is None or any(prev)):
+                    self.stops += 1
+                    self._note(f"stop from {s.name} (control stays with {self.controller.name})")
+                    self._to_drone(packet)
+                    return
+                s.denied += 1
+                self.denied += 1
+                return
+            self.controller = s
+            self.handovers += 1
+            self._note(f"control -> {s.name}")
+        self._ctl_heard = now
+        self._to_drone(packet)
+
+    def _release(self, why: str):
+        self.controller = None
+        self._to_drone(bytes(4))
+        self._note(f"control released ({why}): motors stopped")
+
+    def _to_drone(self, packet: bytes) -> bool:
+        sock = self._sock
+        if sock is None or self.state != LinkState.connected:
+            return False
+        try:
+            sock.sendall(packet)
+        except OSError as e:
+            self.error = str(e)
+            return False
+        self.commands_out += 1
+        if self.recorder is not None:
+            self.recorder.record_command(packet)
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.lease_s / 4)
+            self.cpu_s = time.thread_time()
+            if self.controller is not None and time.monotonic() - self._ctl_heard > self.lease_s:
+                self._release(f"{self.controller.name} lease expired")
+
+    def stats(self) -> dict:
+        subs = self.subscribers
+        return {
+            "state": self.state.name,
+            "connects": self.connects,
+            "frames_in": self.frames_in,
+            "subscribers": len(subs),
+            "controller": self.controller.name if self.controller is not None else None,
+            "commands_out": self.commands_out,
+            "denied": self.denied,
+            "stops": self.stops,
+            "handovers": self.handovers,
+            "dropped": sum(s.backlog.dropped for s in subs),
+            "kicked": self.kicked,
+            "cpu_s": self.cpu_s,
+        }
+
+
+def parse_listen(spec: str):
+    """[host:]port[/policy] -> (host, port, DropPolicy)"""
+    addr, _, policy = spec.partition("/")
+    host, _, port = addr.rpartition(":")
+    return host or LISTEN_DEFAULT[0], int(port), DropPolicy(policy or "oldest")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Share one drone connection with many local clients.")
+    ap.add_argument("--host", default="192.168.4.1", help="the drone (127.0.0.1 for sim_server.py)")
+    ap.add_argument("--port", type=int, default=2323)
+    ap.add_argument("--transport", choices=("tcp", "udp"), default="tcp", help=TRANSPORT_HELP)
+    ap.add_argument("--listen", action="append", metavar="[HOST:]PORT[/POLICY]",
+                    help=f"serve subscribers here (repeatable); policy oldest, newest or disconnect. "
+                         f"Default {LISTEN_DEFAULT[0]}:{LISTEN_DEFAULT[1]}/oldest")
+    ap.add_argument("--queue-frames", type=int, default=256, help="per-subscriber backlog limit")
+    ap.add_argument("--lease", type=float, default=1.5, help="seconds of silence before control lapses")
+    ap.add_argument("--record", action="store_true", help="record the full stream to logs/")
+    ap.add_argument("--shm", nargs="?", const="drone-telemetry", metavar="NAME",
+                    help="also publish to a shared-memory ring (shm.py)")
+    args = ap.parse_args()
+
+    recorder = None
+    if args.record:
+        from recorder import Recorder
+        log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+        os.makedirs(log_dir, exist_ok=True)
+        recorder = Recorder(os.path.join(log_dir, time.strftime("flight_hub_%Y%m%d_%H%M%S.dlog")))
+    ring = None
+    if args.shm:
+        from shm import ShmRingWriter
+        try:
+            ring = ShmRingWriter(args.shm)
+        except FileExistsError as e:
+            sys.exit(f"--shm: {e}")
+    hub = TelemetryHub(make_transport(args.transport, args.host, args.port), args.lease,
+                       recorder=recorder, ring=ring).start()
+    for spec in args.listen or [f"{LISTEN_DEFAULT[0]}:{LISTEN_DEFAULT[1]}"]:
+        host, port, policy = parse_listen(spec)
+        host, port = hub.listen(host, port, policy, args.queue_frames)
+        print(f"serving {policy.value} subscribers on tcp://{host}:{port}", file=sys.stderr)
+    shown, last, f0 = 0.0, time.monotonic(), 0
+    try:
+        while True:
+            time.sleep(0.25)
+            for t, text in list(hub.events):
+                if t > shown:
+                    print(f"  {text}", file=sys.stderr)
+                    shown = t
+            now = time.monotonic()
+            if now - last >= 5.0:
+                st = hub.stats()
+                print(f"{st['state']}  {(st['frames_in'] - f0) / (now - last):6.1f} frames/s  "
+                      f"{st['subscribers']} subscribers  control: {st['controller'] or '-'}  "
+                      f"dropped {st['dropped']}  denied {st['denied']}", file=sys.stderr)
+                last, f0 = now, st['frames_in']
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+        if recorder is not None:
+            recorder.close()
+        if ring is not None:
+            ring.close()
+
+
+if __name__ == "__main__":
+    main()
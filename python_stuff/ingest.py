@@ -0,0 +1,193 @@
+import math, socket, struct, threading, time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+
+try:
+    import fcntl, termios
+except ImportError:        # no FIONREAD (Windows): the receive backlog goes unreported
+    fcntl = None
+
+import battery
+from estimator import GYRO_RAD, AttitudeEstimator
+from latency import EchoLatencyTracker
+from linkmon import LinkMonitor
+from profiler import span
+from protocol import A_SENS, FrameDecoder
+
+
+class LinkState(Enum):
+    idle = 0
+    connecting = 1
+    connected = 2
+    failed = 3
+    closed = 4
+
+
+@dataclass(frozen=True)
+class TelemetrySnapshot:
+    """Latest decoded state. Immutable, so the GUI can read it without locking."""
+    seq: int              # frames decoded so far
+    t: float              # host monotonic time the newest chunk arrived
+    bat_volts: float      # smoothed pack voltage, as measured (sags under load)
+    bat_percent: float    # state of charge from the load-compensated voltage
+    bat_rested_volts: float
+    bat_sag: float        # volts lost at full throttle (internal resistance estimate)
+    bat_remaining_s: float | None   # at the recent drain rate; None while not draining
+    motors: tuple         # echoed FL, FR, BL, BR
+    accel_g: tuple        # ax, ay, az in g
+    tilt: tuple           # normalized (x, y) for the tilt ball, raw accelerometer
+    attitude: tuple       # fused roll, pitch, yaw in rad
+    tilt_fused: tuple     # (x, y) for the tilt ball from the fused attitude
+    gyro: tuple           # newest roll, pitch, yaw rates in rad/s
+
+
+class TelemetryModel:
+    """Turns decoded frame batches into snapshots (battery, tilt, attitude). No Qt in here."""
+    def __init__(self, cells: int = 3, ema_alpha: float = 0.15, estimator: AttitudeEstimator | None = None):
+        self.cells = cells
+        self.battery = battery.BatteryModel(cells, ema_alpha=ema_alpha)
+        self.estimator = estimator or AttitudeEstimator()
+        self.attitude = None      # estimator.Attitude of the last batch, per sample
+        self.seq = 0
+
+    def update(self, frames, t: float, t_us=None) -> TelemetrySnapshot:
+        self.seq += len(frames)
+
+        ax_g = int(frames['ax'][-1]) / A_SENS
+        ay_g = int(frames['ay'][-1]) / A_SENS
+        az_g = int(frames['az'][-1]) / A_SENS
+        # normalize to unit vector
+        gmag = math.sqrt(ax_g*ax_g + ay_g*ay_g + az_g*az_g) or 1.0
+        with span("attitude"):
+            self.attitude = self.estimator.update(frames, t, t_us)
+        bat = self.battery
+        with span("battery"):
+            bat.update(frames['bat_adc'], frames['motors'], self.attitude.t)
+
+        return TelemetrySnapshot(
+            seq=self.seq, t=t,
+            bat_volts=bat.volts,
+            bat_percent=bat.soc,
+            bat_rested_volts=bat.rested_volts,
+            bat_sag=bat.sag,
+            bat_remaining_s=bat.remaining_s,
+            motors=tuple(int(m) for m in frames['motors'][-1]),
+            accel_g=(ax_g, ay_g, az_g),
+            tilt=(ax_g / gmag, ay_g / gmag),
+            attitude=self.attitude.latest,
+            tilt_fused=self.attitude.tilt,
+            gyro=tuple(int(frames[f][-1]) * GYRO_RAD for f in ('gx', 'gy', 'gz')),
+        )
+
+
+class TelemetryPipeline:
+    """
+    What happens to one link's bytes, whoever reads them: decode, record, match
+    motor echoes, update the model, publish. Handoff to the GUI is lock-free:
+    `latest` is replaced by a new immutable snapshot (a single reference store)
+    and decoded batches go into a bounded deque, whose append/popleft are
+    atomic. The GUI polls both and never waits on the link.
+    """
+    def __init__(self, model: TelemetryModel | None = None, history: int = 1024, recorder=None, ring=None):
+        self.model = model or TelemetryModel()
+        self.decoder = FrameDecoder()
+        self.recorder = recorder   # optional recorder.Recorder, fed raw frames
+        self.ring = ring           # optional shm.ShmRingWriter, fed decoded frames
+        self.echo = EchoLatencyTracker()   # command -> motor echo round trip
+        self.state = LinkState.idle
+        self.error = ""
+        self.latest: TelemetrySnapshot | None = None
+        self.history = deque(maxlen=history)   # (t, frames, attitude) batches
+        self.bytes_in = 0
+        self.linkmon = LinkMonitor()           # arrival-time link quality
+
+    def drain_history(self) -> list:
+        out = []
+        try:
+            while True:
+                out.append(self.history.popleft())
+        except IndexError:
+            return out
+
+    def _on_bytes(self, data, t_ns: int, backlog: int | None = None):
+        with span("ingest"):
+            t = t_ns / 1e9
+            self.bytes_in += len(data)
+            with span("decode"):
+                frames = self.decoder.feed(data)
+            self.linkmon.on_chunk(t_ns, len(data), len(frames), self.decoder.pending, backlog)
+            if len(frames):
+                if self.recorder is not None:
+                    self.recorder.record_frames(frames.tobytes(), t_ns)
+                if self.ring is not None:
+                    self.ring.write(frames, t_ns)
+                self.echo.on_frames(frames, t_ns)
+                with span("model"):
+                    self.latest = self.model.update(frames, t, self.decoder.batch_t_us)
+                self.history.append((t, frames, self.model.attitude))
+
+
+class IngestWorker(threading.Thread, TelemetryPipeline):
+    """Owns the drone transport on its own thread: reads, decodes and models telemetry."""
+    def __init__(self, transport, model: TelemetryModel | None = None,
+                 history: int = 1024, recorder=None, ring=None):
+        threading.Thread.__init__(self, name=f"ingest-{transport.name}", daemon=True)
+        TelemetryPipeline.__init__(self, model, history, recorder, ring)
+        self.transport = transport   # transport.Transport (TCP, UDP, loopback, replay)
+        self._sock = None
+        self._halt = threading.Event()
+
+    # --- GUI side ---
+    def send(self, data: bytes) -> bool:
+        sock = self._sock
+        if sock is None or self.state != LinkState.connected:
+            return False
+        self.echo.on_sent(data, time.monotonic_ns())
+        try:
+            sock.sendall(data)
+        except OSError as e:
+            self.error = str(e)
+            return False
+        if self.recorder is not None:
+            self.recorder.record_command(data)
+        return True
+
+    def stop(self):
+        self._halt.set()
+
+    # --- worker thread ---
+    def run(self):
+        self.state = LinkState.connecting
+        try:
+            self._sock = self.transport.open()
+            self._sock.settimeout(0.2)
+        except OSError as e:
+            self.error = str(e)
+            self.state = LinkState.failed
+            return
+        self.state = LinkState.connected
+
+        buf = bytearray(64 * 1024)
+        view = memoryview(buf)
+        fd = self._sock.fileno() if fcntl is not None and hasattr(self._sock, "fileno") else None
+        try:
+            while not self._halt.is_set():
+                try:
+                    n = self._sock.recv_into(buf)
+                except socket.timeout:
+                    continue
+                if n == 0:
+                    break
+                t_ns = time.monotonic_ns()
+                backlog = None
+                if fd is not None:
+                    # bytes that arrived meanwhile and wait for the next read
+                    backlog = struct.unpack("i", fcntl.ioctl(fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+                self._on_bytes(view[:n], t_ns, backlog)
+            self.state = LinkState.closed
+        except OSError as e:
+            self.error = str(e)
+            self.state = LinkState.failed
+        finally:
+            self._sock.close()
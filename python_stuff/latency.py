@@ -0,0 +1,158 @@
+import json, threading
+from collections import deque
+
+# HDR-style histogram: exact below 64 us, then 32 sub-buckets per power of two
+# (~3% resolution), up to ~67 s. Fixed 704 counters whatever the sample count.
+_SUB = 64
+_HALF = 32
+MAX_US = (1 << 26) - 1
+N_BUCKETS = _SUB + (MAX_US.bit_length() - 6) * _HALF
+
+
+def _index(v: int) -> int:
+    if v < _SUB:
+        return v
+    shift = v.bit_length() - 6           # v >> shift lands in [32, 64)
+    return _SUB + (shift - 1) * _HALF + ((v >> shift) - _HALF)
+
+
+def _bounds(i: int):
+    """[low, high) in us covered by bucket i."""
+    if i < _SUB:
+        return i, i + 1
+    j = i - _SUB
+    shift = j // _HALF + 1
+    low = (j % _HALF + _HALF) << shift
+    return low, low + (1 << shift)
+
+
+class LatencyHistogram:
+    """Fixed-memory latency histogram (microseconds) with percentile queries."""
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+        self.overflow = 0       # samples clamped to MAX_US
+
+    def record(self, us: float):
+        v = max(0, int(us))
+        if v > MAX_US:
+            v = MAX_US
+            self.overflow += 1
+        self.counts[_index(v)] += 1
+        self.count += 1
+        self.total_us += v
+        self.max_us = max(self.max_us, v)
+        self.min_us = v if self.min_us is None else min(self.min_us, v)
+
+    def reset(self):
+        self.__init__()
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total_us += other.total_us
+        self.overflow += other.overflow
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    @property
+    def mean_us(self) -> float:
+        return self.total_us / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Value (us) at percentile p (0..100): midpoint of the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                low, high = _bounds(i)
+                return min((low + high - 1) / 2, self.max_us)
+        return float(self.max_us)
+
+    def buckets(self):
+        """(low_us, high_us, count) for every non-empty bucket."""
+        return [(*_bounds(i), c) for i, c in enumerate(self.counts) if c]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "min_us": self.min_us or 0,
+            "mean_us": round(self.mean_us, 1),
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "p99.9_us": self.percentile(99.9),
+            "max_us": self.max_us,
+            "overflow": self.overflow,
+        }
+
+    def export(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(),
+                       "buckets": [{"low_us": lo, "high_us": hi, "count": c} for lo, hi, c in self.buckets()]},
+                      f, indent=2)
+
+
+class EchoLatencyTracker:
+    """
+    Command-to-actuation round trip. Every packet written by send_powers is stamped;
+    when telemetry first echoes those four motor values back (frame bytes 2..5) the
+    elapsed time goes into `hist`. A newer echo also retires any older packets that
+    were superseded before they were ever seen.
+    """
+    def __init__(self, max_pending: int = 64):
+        self.hist = LatencyHistogram()
+        self.unmatched = 0          # packets that were superseded or aged out
+        self._pending = deque()     # (motor tuple, t_ns sent)
+        self._max_pending = max_pending
+        self._last_echo = None
+        self._lock = threading.Lock()   # send (GUI thread) vs echo (ingest thread)
+
+    def on_sent(self, packet: bytes, t_ns: int):
+        key = tuple(packet)
+        with self._lock:
+            # already what the drone is applying -> there won't be a new echo to time
+            if not self._pending and key == self._last_echo:
+                return
+            if self._pending and self._pending[-1][0] == key:
+                return          # identical resend; keep the first stamp
+            self._pending.append((key, t_ns))
+            if len(self._pending) > self._max_pending:
+                self._pending.popleft()
+                self.unmatched += 1
+
+    def on_echo(self, motors, t_ns: int):
+        key = tuple(int(m) for m in motors)
+        with self._lock:
+            if key == self._last_echo:
+                return
+            self._last_echo = key
+            for i, (pkt, t_sent) in enumerate(self._pending):
+                if pkt == key:
+                    self.hist.record((t_ns - t_sent) / 1000)
+                    self.unmatched += i
+                    for _ in range(i + 1):
+                        self._pending.popleft()
+                    return
+
+    def on_frames(self, frames, t_ns: int):
+        """Feed a decoded batch; only rows where the echo changes are looked at."""
+        motors = frames['motors']
+        if hasattr(motors, 'shape'):
+            if len(motors) > 1:
+                changed = (motors[1:] != motors[:-1]).any(axis=1).nonzero()[0] + 1
+                rows = [motors[0], *motors[changed]]
+            else:
+                rows = [motors[0]]
+        else:
+            rows = [m for i, m in enumerate(motors) if i == 0 or m != motors[i - 1]]
+        for m in rows:
+            self.on_echo(m, t_ns)
@@ -0,0 +1,235 @@
+import argparse, json, sys, time
+
+from latency import LatencyHistogram
+
+# Link quality from the host's side. Every received chunk is stamped with
+# time.monotonic_ns() on arrival (by the ingest thread, before decoding), along
+# with how many whole frames it completed, the partial frame left over and, where
+# the transport can tell, how many bytes were still waiting in the socket. From
+# that, in constant memory whatever the session length:
+#   rate     frames/s over the last `window_s` seconds (one counter per second)
+#   jitter   |inter-arrival - frames * nominal period|, RFC 3550-style smoothed
+#            value plus a histogram for percentiles
+#   bursts   frames landing together (chunks less than burst_gap_ms apart):
+#            what a Wi-Fi retry looks like after the fact
+#   stalls   silences longer than stall_ms, and how long they lasted
+#   backlog  receive-buffer bytes left behind by a read, and split frames
+# check() turns that into ok / degraded / stalled against configured thresholds.
+
+BURST_MAX = 64             # burst sizes above this are counted together
+OK, DEGRADED, STALLED = "ok", "degraded", "stalled"
+
+
+class LinkMonitor:
+    def __init__(self, expected_hz: float = 100.0, window_s: int = 5, stall_ms: float = 50.0,
+                 burst_gap_ms: float = 1.0, min_rate_pct: float = 90.0, max_jitter_ms: float = 15.0):
+        self.expected_hz = expected_hz
+        self.period_ns = int(1e9 / expected_hz)
+        self.window_s = window_s
+        self.stall_ns = int(stall_ms * 1e6)
+        self.burst_gap_ns = int(burst_gap_ms * 1e6)
+        self.min_rate_pct = min_rate_pct
+        self.max_jitter_ms = max_jitter_ms
+        self.reset()
+
+    def reset(self):
+        self.chunks = 0
+        self.frames = 0
+        self.bytes = 0
+        self.t_first = self.t_last = None     # ns, any chunk
+        self._t_frames = None                  # ns, last chunk that completed a frame
+        self._sec = [0] * (self.window_s + 1)  # frames per whole second, ring
+        self._sec_id = None
+        self.jitter_us = 0.0
+        self.jitter = LatencyHistogram()
+        self.burst_counts = [0] * (BURST_MAX + 1)
+        self.bursts = 0                        # bursts of more than one frame
+        self.burst_max = 0
+        self._burst = 0
+        self.stalls = 0
+        self.stall_hist = LatencyHistogram()
+        self.last_stall = None                 # (ended at ns, lasted ns)
+        self.split_chunks = 0                  # chunks that ended mid-frame
+        self.backlog_max = 0
+        self.backlog_mean = 0.0
+        self._backlog_seen = False
+        self.level = OK
+
+    # --- ingest thread ---
+    def on_chunk(self, t_ns: int, nbytes: int, frames: int, pending: int, backlog: int | None = None):
+        """One read: arrival time, bytes, whole frames it completed, partial bytes left
+        in the decoder, and bytes still queued in the socket (None if unknown)."""
+        self.chunks += 1
+        self.bytes += nbytes
+        if self.t_first is None:
+            self.t_first = t_ns
+        elif t_ns - self.t_last > self.stall_ns:
+            self.stalls += 1
+            self.stall_hist.record((t_ns - self.t_last) / 1000)
+            self.last_stall = (t_ns, t_ns - self.t_last)
+        self.t_last = t_ns
+        if pending:
+            self.split_chunks += 1
+        if backlog is not None:
+            self._backlog_seen = True
+            self.backlog_max = max(self.backlog_max, backlog)
+            self.backlog_mean += (backlog - self.backlog_mean) / 16
+        if not frames:
+            return
+        self.frames += frames
+
+        sec = t_ns // 1_000_000_000
+        if self._sec_id is None or sec - self._sec_id > self.window_s:
+            self._sec = [0] * len(self._sec)
+        elif sec > self._sec_id:
+            for s in range(self._sec_id + 1, sec + 1):
+                self._sec[s % len(self._sec)] = 0
+        self._sec_id = sec
+        self._sec[sec % len(self._sec)] += frames
+
+        prev = self._t_frames
+        self._t_frames = t_ns
+        if prev is None:
+            self._burst = frames
+            return
+        gap = t_ns - prev
+        if gap < self.burst_gap_ns:
+            self._burst += frames
+        else:
+            self._end_burst()
+            self._burst = frames
+        # the chunk carries `frames` periods' worth of data since the last one
+        d = abs(gap - frames * self.period_ns) / 1000
+        self.jitter_us += (d - self.jitter_us) / 16
+        self.jitter.record(d)
+
+    def _end_burst(self):
+        n = self._burst
+        if n:
+            self.burst_counts[min(n, BURST_MAX)] += 1
+            if n > 1:
+                self.bursts += 1
+            self.burst_max = max(self.burst_max, n)
+
+    # --- any thread ---
+    def rate(self, now_ns: int) -> float:
+        """Frames/s over the last window_s whole seconds (the current one excluded)."""
+        if self._sec_id is None:
+            return 0.0
+        now_sec = now_ns // 1_000_000_000
+        first = max(now_sec - self.window_s, self.t_first // 1_000_000_000 + 1)   # skip the partial first second
+        if first >= now_sec:
+            return 0.0
+        n = len(self._sec)
+        return sum(self._sec[s % n] for s in range(first, min(now_sec, self._sec_id + 1))) / (now_sec - first)
+
+    def silence_ms(self, now_ns: int) -> float:
+        return 0.0 if self.t_last is None else (now_ns - self.t_last) / 1e6
+
+    def check(self, now_ns: int):
+        """(level, reasons). Rate is only judged once a full window has been seen."""
+        reasons = []
+        if self.t_last is not None and now_ns - self.t_last > self.stall_ns:
+            reasons.append(f"no data for {self.silence_ms(now_ns):.0f} ms")
+            self.level = STALLED
+            return self.level, reasons
+        if self.t_first is not None and now_ns - self.t_first >= (self.window_s + 1) * 1_000_000_000:
+            rate = self.rate(now_ns)
+            if rate < self.expected_hz * self.min_rate_pct / 100:
+                reasons.append(f"{rate:.0f} frames/s (< {self.min_rate_pct:g}% of {self.expected_hz:g})")
+        if self.jitter_us / 1000 > self.max_jitter_ms:
+            reasons.append(f"jitter {self.jitter_us / 1000:.1f} ms (> {self.max_jitter_ms:g})")
+        if self.last_stall is not None and now_ns - self.last_stall[0] < self.window_s * 1_000_000_000:
+            reasons.append(f"stalled {self.last_stall[1] / 1e6:.0f} ms "
+                           f"{(now_ns - self.last_stall[0]) / 1e9:.0f} s ago")
+        self.level = DEGRADED if reasons else OK
+        return self.level, reasons
+
+    def burst_percentile(self, p: float) -> int:
+        total = sum(self.burst_counts)
+        if not total:
+            return 0
+        rank, seen = max(1, -(-total * p // 100)), 0
+        for size, c in enumerate(self.burst_counts):
+            seen += c
+            if seen >= rank:
+                return size
+        return BURST_MAX
+
+    def summary(self, now_ns: int | None = None) -> str:
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        text = (f"{self.rate(now_ns):5.1f} fps  jitter {self.jitter_us / 1000:4.1f} ms  "
+                f"burst max {self.burst_max}  stalls {self.stalls}")
+        if self.stalls:
+            text += f" (max {self.stall_hist.max_us / 1000:.0f} ms)"
+        if self._backlog_seen:
+            text += f"  backlog max {self.backlog_max} B"
+        return text
+
+    def report(self, now_ns: int | None = None) -> dict:
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        level, reasons = self.check(now_ns)
+        span = ((self.t_last - self.t_first) / 1e9) if self.t_first is not None else 0.0
+        return {
+            "level": level,
+            "reasons": reasons,
+            "config": {"expected_hz": self.expected_hz, "window_s": self.window_s,
+                       "stall_ms": self.stall_ns / 1e6, "burst_gap_ms": self.burst_gap_ns / 1e6,
+                       "min_rate_pct": self.min_rate_pct, "max_jitter_ms": self.max_jitter_ms},
+            "duration_s": round(span, 3),
+            "chunks": self.chunks,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "rate_hz": round(self.rate(now_ns), 2),
+            "mean_rate_hz": round(self.frames / span, 2) if span > 0 else 0.0,
+            "jitter": {"smoothed_us": round(self.jitter_us, 1), **self.jitter.summary()},
+            "bursts": {"multi_frame": self.bursts, "max": self.burst_max,
+                       "p50": self.burst_percentile(50), "p99": self.burst_percentile(99),
+                       "sizes": {str(i): c for i, c in enumerate(self.burst_counts) if c}},
+            "stalls": {"count": self.stalls, **self.stall_hist.summary()},
+            "split_chunks": self.split_chunks,
+            "backlog_bytes": {"max": self.backlog_max, "mean": round(self.backlog_mean, 1)}
+            if self._backlog_seen else None,
+        }
+
+    def export(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def main():
+    from ingest import IngestWorker, LinkState
+    from transport import TRANSPORT_HELP, make_transport
+    ap = argparse.ArgumentParser(description="Watch a drone link's quality (rate, jitter, bursts, stalls).")
+    ap.add_argument("--host", default="192.168.4.1")
+    ap.add_argument("--port", type=int, default=2323)
+    ap.add_argument("--transport", choices=("tcp", "udp"), default="tcp", help=TRANSPORT_HELP)
+    ap.add_argument("--expected-hz", type=float, default=100.0)
+    ap.add_argument("--seconds", type=float, default=0.0, help="stop after this long (0 = until Ctrl-C)")
+    ap.add_argument("--report", help="write the JSON report here on exit")
+    args = ap.parse_args()
+
+    w = IngestWorker(make_transport(args.transport, args.host, args.port))
+    w.linkmon = LinkMonitor(args.expected_hz)
+    w.start()
+    t_end = time.monotonic() + args.seconds if args.seconds else None
+    try:
+        while w.state in (LinkState.idle, LinkState.connecting, LinkState.connected):
+            time.sleep(1.0)
+            level, reasons = w.linkmon.check(time.monotonic_ns())
+            print(f"[{level:8s}] {w.linkmon.summary()}" + (f"  ({'; '.join(reasons)})" if reasons else ""))
+            if t_end is not None and time.monotonic() >= t_end:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        w.stop()
+        w.join()
+    if w.error:
+        print(w.error, file=sys.stderr)
+    if args.report:
+        w.linkmon.export(args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+import argparse, asyncio, os, sys, threading, time
+
+from commands import CommandScheduler
+from ingest import LinkState, TelemetryPipeline
+from protocol import PACKET_LEN
+from recorder import Recorder
+from transport import UDP_HELLO, UDP_SEQ, seq_newer
+
+# Many drones from one process. Every link lives on a single asyncio loop in one
+# background thread: each session has its own decoder, model, recorder and
+# CommandScheduler (driven by the loop's fixed-rate tick through poll(), not by
+# a thread of its own), so a drone costs a socket and some objects, not threads.
+# Sessions expose the same surface as ingest.IngestWorker (state, latest,
+# drain_history, echo, decoder) and the dashboard reads them the same lock-free way.
+
+
+class _TcpProtocol(asyncio.Protocol):
+    def __init__(self, session):
+        self.session = session
+
+    def connection_made(self, transport):
+        self.session._connected(transport)
+
+    def data_received(self, data):
+        self.session._on_bytes(data, time.monotonic_ns())
+
+    def connection_lost(self, exc):
+        self.session._lost(exc)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    """transport.UdpTransport's datagram framing, on the event loop."""
+    def __init__(self, session):
+        self.session = session
+        self.transport = None
+        self._tx_seq = 0
+        self._rx_seq = None
+        self.stale = self.lost = self.malformed = 0
+        self.last_hello = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.hello()
+        self.session._connected(self)
+
+    def hello(self):
+        self.last_hello = time.monotonic()
+        self.transport.sendto(UDP_SEQ.pack(self._tx_seq) + UDP_HELLO)
+
+    def write(self, data: bytes):
+        self._tx_seq = (self._tx_seq + 1) & 0xFFFFFFFF
+        self.transport.sendto(UDP_SEQ.pack(self._tx_seq) + data)
+
+    def datagram_received(self, data, addr):
+        if len(data) != UDP_SEQ.size + PACKET_LEN:
+            self.malformed += 1
+            return
+        seq = UDP_SEQ.unpack_from(data)[0]
+        if self._rx_seq is not None:
+            if not seq_newer(seq, self._rx_seq):
+                self.stale += 1
+                return
+            self.lost += ((seq - self._rx_seq) & 0xFFFFFFFF) - 1
+        self._rx_seq = seq
+        self.session._on_bytes(memoryview(data)[UDP_SEQ.size:], time.monotonic_ns())
+
+    def error_received(self, exc):
+        pass      # ICMP port unreachable: nobody listening (yet); the hello retries
+
+    def connection_lost(self, exc):
+        self.session._lost(exc)
+
+    def close(self):
+        self.transport.close()
+
+
+class DroneSession(TelemetryPipeline):
+    """
+    One drone on a DroneManager's loop. GUI-side calls (set_setpoint, send) are
+    safe from any thread; the socket is only ever touched by the loop.
+    """
+    def __init__(self, name: str, host: str, port: int, kind: str = "tcp",
+                 send_hz: float = 30.0, keepalive_s: float = 0.5, recorder=None, model=None):
+        if kind not in ("tcp", "udp"):
+            raise ValueError(f"unknown transport {kind!r} (tcp or udp)")
+        super().__init__(model, recorder=recorder)
+        self.name, self.host, self.port, self.kind = name, host, port, kind
+        self.commands = CommandScheduler(self._write, send_hz, keepalive_s)
+        self.connects = 0
+        self.send_lost = 0        # send() packets queued but dropped: the link went first
+        self._link = None         # asyncio transport (TCP) or _UdpProtocol
+        self._loop = None
+        self._closing = False
+
+    # --- any thread ---
+    def set_setpoint(self, packet: bytes, urgent: bool = False):
+        """New motor setpoint; the manager's tick sends it (urgent: right away)."""
+        self.commands.set(packet)
+        if urgent and self._loop is not None:
+            self._loop.call_soon_threadsafe(self.commands.tick)
+
+    def send(self, data: bytes) -> bool:
+        """
+        Out-of-band packet (bypasses the scheduler). True means queued for the
+        loop, not written: if the link drops before the loop gets to it, the
+        packet is dropped and counted in send_lost. False if not connected.
+        """
+        if self.state != LinkState.connected or self._loop is None:
+            return False
+        self._loop.call_soon_threadsafe(self._send_queued, bytes(data))
+        return True
+
+    # --- loop side ---
+    def _send_queued(self, data: bytes):
+        if not self._write(data):
+            self.send_lost += 1
+
+    def _write(self, data: bytes) -> bool:
+        if self._link is None or self.state != LinkState.connected:
+            return False
+        self.echo.on_sent(data, time.monotonic_ns())
+        self._link.write(data)
+        if self.recorder is not None:
+            self.recorder.record_command(data)
+        return True
+
+    def _connected(self, link):
+        self._link = link
+        self.connects += 1
+        self.decoder.reset()
+        self.state = LinkState.connected
+
+    def _lost(self, exc):
+        self._link = None
+        if exc is not None:
+            self.error = str(exc)
+        self.state = LinkState.closed if self._closing or exc is None else LinkState.failed
+
+
+class DroneManager:
+    """
+    Owns the event loop thread and every session on it. Sessions that drop or
+    fail to connect are retried every reconnect_s until removed. With log_dir,
+    each session records to its own flight log there.
+    """
+    def __init__(self, send_hz: float = 30.0, keepalive_s: float = 0.5, reconnect_s: float = 2.0,
+                 log_dir: str | None = None):
+        self.send_hz = send_hz
+        self.keepalive_s = keepalive_s
+        self.reconnect_s = reconnect_s
+        self.log_dir = log_dir
+        self.sessions = {}        # name -> DroneSession; replaced wholesale, so GUI reads need no lock
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        # stats
+        self.ticks = 0
+        self.late_max_ns = 0
+        self.cpu_s = 0.0          # CPU time of the loop thread, refreshed every tick
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="drone-manager", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        for name in list(self.sessions):
+            self.remove(name)
+        if self._thread is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(2.0)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self._thread = None
+        self.loop.close()
+
+    def add(self, name: str, host: str, port: int, kind: str = "tcp") -> DroneSession:
+        if name in self.sessions:
+            raise ValueError(f"drone {name!r} already added")
+        recorder = None
+        if self.log_dir is not None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            recorder = Recorder(os.path.join(self.log_dir, time.strftime(f"flight_{name}_%Y%m%d_%H%M%S.dlog")))
+        s = DroneSession(name, host, port, kind, self.send_hz, self.keepalive_s, recorder)
+        s._loop = self.loop
+        self.sessions = {**self.sessions, name: s}
+        asyncio.run_coroutine_threadsafe(self._keep_connected(s), self.loop)
+        return s
+
+    def remove(self, name: str):
+        s = self.sessions.get(name)
+        if s is None:
+            return
+        self.sessions = {k: v for k, v in self.sessions.items() if k != name}
+        s._closing = True
+        done = threading.Event()
+
+        def close():
+            if s._link is not None:
+                s._link.close()
+            done.set()
+        if self._thread is not None and self._thread.is_alive():
+            self.loop.call_soon_threadsafe(close)
+            done.wait(1.0)
+        s.state = LinkState.closed
+        if s.recorder is not None:
+            s.recorder.close()
+
+    # --- loop thread ---
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._ticker())
+        self.loop.run_forever()
+
+    async def _shutdown(self):
+        tasks = [t for t in asyncio.all_tasks(self.loop) if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _keep_connected(self, s: DroneSession):
+        loop = self.loop
+        while not s._closing:
+            if s._link is None:
+                s.state = LinkState.connecting
+                try:
+                    if s.kind == "tcp":
+                        await asyncio.wait_for(
+                            loop.create_connection(lambda: _TcpProtocol(s), s.host, s.port), 5.0)
+                    else:
+                        await loop.create_datagram_endpoint(lambda: _UdpProtocol(s),
+                                                            remote_addr=(s.host, s.port))
+                except (OSError, asyncio.TimeoutError) as e:
+                    s.error = str(e) or type(e).__name__
+                    s.state = LinkState.failed
+            elif s.kind == "udp" and time.monotonic() - s._link.last_hello >= 0.5:
+                s._link.hello()      # re-register in case the drone restarted
+            await asyncio.sleep(0.5 if s._link is not None else self.reconnect_s)
+
+    async def _ticker(self):
+        period = int(1e9 / self.send_hz)
+        deadline = time.monotonic_ns()
+        while True:
+            now = time.monotonic_ns()
+            self.late_max_ns = max(self.late_max_ns, now - deadline)
+            for s in self.sessions.values():
+                if s.state == LinkState.connected:
+                    s.commands.tick(now)
+            self.ticks += 1
+            self.cpu_s = time.thread_time()
+            deadline += period
+            if deadline < now:          # fell behind: skip, don't burst
+                deadline = now + period
+            await asyncio.sleep((deadline - time.monotonic_ns()) / 1e9)
+
+    def stats(self) -> dict:
+        sessions = list(self.sessions.values())
+        return {
+            "sessions": len(sessions),
+            "connected": sum(s.state == LinkState.connected for s in sessions),
+            "frames": sum(s.decoder.frames_total for s in sessions),
+            "send_lost": sum(s.send_lost for s in sessions),
+            "ticks": self.ticks,
+            "late_max_us": self.late_max_ns / 1000,
+            "cpu_s": self.cpu_s,
+        }
+
+
+# --- dashboard ---
+def _dashboard(manager: DroneManager, render_hz: float):
+    from PyQt6 import QtCore, QtWidgets
+    from render import RenderScheduler
+    from stripchart import StripChart
+    from protocol import G_SENS
+    from UI import TiltBall
+
+    class DroneTile(QtWidgets.QFrame):
+        """Compact view of one session: state, battery, tilt, gyro trace, stop."""
+        def __init__(self, session: DroneSession, scheduler):
+            super().__init__()
+            self.session = session
+            self.scheduler = scheduler
+            self.setFrameShape(QtWidgets.QFrame.Shape.StyledPanel)
+            lay = QtWidgets.QGridLayout(self)
+            self.title = QtWidgets.QLabel(f"<b>{session.name}</b>")
+            self.status = QtWidgets.QLabel("")
+            self.tilt = TiltBall(diameter=140)
+            self.chart = StripChart("Gyro", span_s=10, unit="°/s", max_rate_hz=1000)
+            for name, color in zip(("gx", "gy", "gz"), ("#d62728", "#2ca02c", "#1f77b4")):
+                self.chart.add_series(name, color)
+            stop = QtWidgets.QPushButton("Stop")
+            stop.setStyleSheet("QPushButton { background: #d32f2f; color: white; }")
+            stop.clicked.connect(lambda: session.set_setpoint(bytes(4), urgent=True))
+            lay.addWidget(self.title, 0, 0)
+            lay.addWidget(stop, 0, 1, QtCore.Qt.AlignmentFlag.AlignRight)
+            lay.addWidget(self.status, 1, 0, 1, 2)
+            lay.addWidget(self.tilt, 2, 0)
+            lay.addWidget(self.chart, 2, 1)
+            lay.setColumnStretch(1, 1)
+            self.tilt.scheduler = self.chart.scheduler = scheduler
+            self._seq = -1
+
+        def poll(self):
+            s = self.session
+            for _t, frames, att in s.drain_history():
+                for i, f in enumerate(('gx', 'gy', 'gz')):
+                    self.chart.append(i, att.t, frames[f] / G_SENS)
+            snap = s.latest
+            if snap is not None and snap.seq != self._seq:
+                self._seq = snap.seq
+                self.tilt.set_xy(*snap.tilt_fused)
+                left = snap.bat_remaining_s
+                self.scheduler.set_text(self.status, f"{s.state.name}  {snap.bat_volts:5.2f} V {snap.bat_percent:3.0f}%"
+                                        + (f" ~{left / 60:.0f} min" if left is not None else "")
+                                        + f"  echo p50 {s.echo.hist.percentile(50) / 1000:.1f} ms")
+            elif snap is None:
+                self.scheduler.set_text(self.status, f"{s.state.name}  {s.error}")
+
+    class Dashboard(QtWidgets.QMainWindow):
+        def __init__(self):
+            super().__init__()
+            self.setWindowTitle(f"Drones ({len(manager.sessions)})")
+            self.render = RenderScheduler(render_hz, self)
+            central = QtWidgets.QWidget()
+            self.setCentralWidget(central)
+            root = QtWidgets.QVBoxLayout(central)
+            bar = QtWidgets.QHBoxLayout()
+            self.view = QtWidgets.QComboBox()
+            self.view.addItem("All (tiled)", None)
+            for name in manager.sessions:
+                self.view.addItem(name, name)
+            self.view.currentIndexChanged.connect(self._relayout)
+            stopAll = QtWidgets.QPushButton("STOP ALL")
+            stopAll.setStyleSheet("QPushButton { background: #d32f2f; color: white; font-weight: bold; }")
+            stopAll.clicked.connect(self.stop_all)
+            bar.addWidget(self.view)
+            bar.addStretch(1)
+            bar.addWidget(stopAll)
+            root.addLayout(bar)
+            scroll = QtWidgets.QScrollArea()
+            scroll.setWidgetResizable(True)
+            inner = QtWidgets.QWidget()
+            self.grid = QtWidgets.QGridLayout(inner)
+            scroll.setWidget(inner)
+            root.addWidget(scroll, 1)
+            self.tiles = [DroneTile(s, self.render) for s in manager.sessions.values()]
+            self._relayout()
+            self.statsLabel = QtWidgets.QLabel("")
+            self.statusBar().addPermanentWidget(self.statsLabel)
+            self._cpu = (time.monotonic(), manager.cpu_s)
+            self.render.frame.connect(self._poll)
+            self.render.start()
+
+        def _relayout(self, _i=None):
+            only = self.view.currentData()
+            shown = [t for t in self.tiles if only is None or t.session.name == only]
+            cols = max(1, round(len(shown) ** 0.5))
+            for t in self.tiles:
+                self.grid.removeWidget(t)
+                t.setVisible(t in shown)
+            for i, t in enumerate(shown):
+                self.grid.addWidget(t, i // cols, i % cols)
+
+        def stop_all(self):
+            for s in manager.sessions.values():
+                s.set_setpoint(bytes(4), urgent=True)
+
+        def _poll(self):
+            for t in self.tiles:
+                if t.isVisible():
+                    t.poll()
+                else:
+                    t.session.drain_history()
+            now = time.monotonic()
+            if now - self._cpu[0] >= 1.0:
+                st = manager.stats()
+                cpu = (st["cpu_s"] - self._cpu[1]) / (now - self._cpu[0])
+                self._cpu = (now, st["cpu_s"])
+                self.render.set_text(self.statsLabel, f"{st['connected']}/{st['sessions']} connected  "
+                                     f"{st['frames']} frames  loop CPU {cpu:4.0%}  "
+                                     f"tick late max {st['late_max_us'] / 1000:.1f} ms")
+
+        def closeEvent(self, ev):
+            self.stop_all()
+            super().closeEvent(ev)
+
+    return Dashboard()
+
+
+def parse_target(spec: str):
+    """name=host:port[/udp] -> (name, host, port, kind)"""
+    name, _, addr = spec.rpartition("=")
+    addr, _, kind = addr.partition("/")
+    host, _, port = addr.rpartition(":")
+    return name or addr, host or "127.0.0.1", int(port), kind or "tcp"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ground station for several drones on one event loop.")
+    ap.add_argument("drones", nargs="*", help="name=host:port or name=host:port/udp (udp: sim_server.py only, the firmware serves TCP)")
+    ap.add_argument("--sim", type=int, default=0, help="also start this many local sim_server drones")
+    ap.add_argument("--rate", type=float, default=100.0, help="telemetry rate of the simulated drones, Hz")
+    ap.add_argument("--record", action="store_true", help="record every drone to logs/")
+    ap.add_argument("--render-hz", type=float, default=30.0)
+    args = ap.parse_args()
+
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs") if args.record else None
+    manager = DroneManager(log_dir=log_dir).start()
+    sims = []
+    if args.sim:
+        from sim_server import SimServer
+        for i in range(args.sim):
+            srv = SimServer(port=0, rate_hz=args.rate, seed=i).start()
+            sims.append(srv)
+            manager.add(f"sim{i}", *srv.address)
+    for spec in args.drones:
+        name, host, port, kind = parse_target(spec)
+        manager.add(name, host, port, kind)
+    if not manager.sessions:
+        ap.error("no drones: give name=host:port targets or --sim N")
+
+    from PyQt6 import QtWidgets
+    app = QtWidgets.QApplication(sys.argv)
+    win = _dashboard(manager, args.render_hz)
+    win.resize(1400, 900)
+    win.show()
+    code = app.exec()
+    manager.stop()
+    for srv in sims:
+        srv.stop()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
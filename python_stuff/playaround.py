@@ -1,8 +1,16 @@
-import socket,struct,  math, time
+import os, math
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 
-HOST, PORT = "192.168.4.1", 2323
+from protocol import A_SENS, FRAME_STRUCT, LatestFrameReader
+from transport import make_transport
+
+# DRONE_HOST=127.0.0.1 to talk to sim_server.py instead of the ESP32
+HOST = os.environ.get("DRONE_HOST", "192.168.4.1")
+PORT = int(os.environ.get("DRONE_PORT", 2323))
+TRANSPORT = os.environ.get("DRONE_TRANSPORT", "tcp")     # or udp, sim_server.py only
+# DRONE_SHM=drone-telemetry to plot from UI.py/hub.py --shm while they hold the link
+SHM = os.environ.get("DRONE_SHM")
 
 MotorPowers = {'FrontLeft': 0,
               'FrontRight': 0,
@@ -16,49 +24,51 @@ def set_motors():
         MotorPowers[motor] = int(input("input" + motor + ": "))
 
 def send_powers():
-    with socket.create_connection((HOST, PORT)) as s:
+    s = make_transport(TRANSPORT, HOST, PORT).open()
+    try:
+        reader = LatestFrameReader(s, timeout=5)
         data  = bytes([MotorPowers[m] for m in MotorPowers])
         s.sendall(data)
-        echo = s.recv(4)
+        frame = reader.read()
+        echo = frame[2:6] if frame is not None else b""     # motor echo bytes
         print("sent:", list(data), " echo:", list(echo))
+    finally:
+        s.close()
 
 
-A_SENS = 16384.0
-
-def recv_exact(s, n):
-    buf = bytearray()
-    while len(buf) < n:
-        chunk = s.recv(n - len(buf))
-        if not chunk:
-            raise ConnectionError("socket closed")
-        buf.extend(chunk)
-    return bytes(buf)
-
-def latest14(s):
-    """Drop all queued complete frames except the newest, then read that newest 14-byte frame."""
-    # Peek at queued bytes without removing them
-    queued = len(s.recv(65535, socket.MSG_PEEK))
-    # How many full 14-byte frames are waiting?
-    frames = queued // 14
-    # Discard all but the last full frame (if any)
-    if frames > 1:
-        s.recv((frames - 1) * 14)
-    # Now read exactly the newest frame
-    return recv_exact(s, 14)
-
-def sample_xy(s):
-    raw = latest14(s)  
-    ax, ay, az, _, _, _, _ = struct.unpack(">7h", raw)  # big-endian signed shorts
+def sample_xy(reader):
+    """Tilt (x, y) from the newest frame; reader is a protocol.LatestFrameReader."""
+    raw = reader.read()
+    if raw is None:
+        raise TimeoutError("no telemetry")
+    _, _, _, _, _, ax, ay, az, _, _, _, _ = FRAME_STRUCT.unpack_from(raw)
     ax_g, ay_g, az_g = ax / A_SENS, ay / A_SENS, az / A_SENS
     g = math.sqrt(ax_g*ax_g + ay_g*ay_g + az_g*az_g) or 1.0
     x = ax_g / g
-    y = ay_g / g 
-    print(ax, ay, az) 
+    y = ay_g / g
     return x, y
 
 
+def sample_xy_shm(ring):
+    """Tilt (x, y) from the newest record of a shm.ShmRingReader."""
+    rec, _ = ring.latest(1)
+    if not len(rec):
+        raise TimeoutError("no telemetry")
+    ax_g, ay_g, az_g = (int(rec[f][0]) / A_SENS for f in ('ax', 'ay', 'az'))
+    g = math.sqrt(ax_g*ax_g + ay_g*ay_g + az_g*az_g) or 1.0
+    return ax_g / g, ay_g / g
+
+
 def ball_on_plot():
-    with socket.create_connection((HOST, PORT), timeout=5) as s:
+    if SHM:
+        from shm import ShmRingReader
+        ring = ShmRingReader(SHM)
+        sample, close = (lambda: sample_xy_shm(ring)), ring.close
+    else:
+        s = make_transport(TRANSPORT, HOST, PORT).open()
+        reader = LatestFrameReader(s)
+        sample, close = (lambda: sample_xy(reader)), s.close
+    try:
         # Matplotlib setup
         fig, ax = plt.subplots()
         ax.set_xlabel("X tilt (|ax|/|g|)")
@@ -68,6 +78,8 @@ def ball_on_plot():
         ax.set_aspect("equal", adjustable="box")
         ax.grid(True)
         dot, = ax.plot([1], [0], marker="o", markersize=12)
+        # readout lives inside the axes so blitting redraws it (a title would not be)
+        label = ax.text(0.02, 0.97, "", transform=ax.transAxes, va="top")
 
         # initial
         x_ema, y_ema = 0.0, 0.0
@@ -75,19 +87,22 @@ def ball_on_plot():
         def update(_frame):
             nonlocal x_ema, y_ema
             try:
-                x, y = sample_xy(s)
+                x, y = sample()
             except Exception:
-                return dot,
+                return dot, label
 
             dot.set_data([x], [y])
-            ax.set_title(f"x={x:.2f}, y={y:.2f}")
-            return dot,
+            label.set_text(f"x={x:.2f}, y={y:.2f}")
+            return dot, label
 
-        ani = FuncAnimation(fig, update, blit=True)
+        ani = FuncAnimation(fig, update, blit=True, cache_frame_data=False)
         plt.show()
+    finally:
+        close()
 
 
-for i in range(20):
-    set_motors()
-    send_powers()
+if __name__ == "__main__":
+    for i in range(20):
+        set_motors()
+        send_powers()
 
@@ -0,0 +1,131 @@
+import functools, json, os, sys, threading, time
+from collections import deque
+
+# Spans around the hot paths (ingest, decode, model, send, paint), cheap enough
+# to leave in the code:
+#   with span("decode"):
+#       ...
+#   @profiled("paint TiltBall")
+#   def paintEvent(self, ev): ...
+# Off (the default) span() hands back one shared do-nothing context manager, so
+# a span costs a method call and an attribute test. On, each span appends
+# (name, thread, start, duration) to a bounded deque; appends are atomic, so any
+# thread records without a lock, and nothing is aggregated on the hot path.
+# stats() summarizes the last second for the UI overlay; export_chrome() writes
+# the last N seconds as trace-event JSON for chrome://tracing or ui.perfetto.dev.
+# Nested spans are fine (the trace shows them stacked); stats() times are
+# inclusive. No Qt in here.
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_prof", "name", "t0")
+
+    def __init__(self, prof, name: str):
+        self._prof = prof
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter_ns()
+        prof = self._prof
+        tid = threading.get_ident()
+        if tid not in prof._threads:
+            prof._threads[tid] = threading.current_thread().name
+        prof._events.append((self.name, tid, self.t0, t1 - self.t0))
+        return False
+
+
+class Profiler:
+    def __init__(self, seconds: float = 10.0, max_events: int = 200_000):
+        self.seconds = seconds               # what export_chrome() keeps by default
+        self.enabled = False
+        self._events = deque(maxlen=max_events)
+        self._threads = {}                   # ident -> name, for the trace
+
+    def enable(self, on: bool = True):
+        self.enabled = on
+
+    def clear(self):
+        self._events.clear()
+
+    def span(self, name: str):
+        return _Span(self, name) if self.enabled else _NULL
+
+    def _recent(self, seconds: float):
+        cutoff = time.perf_counter_ns() - int(seconds * 1e9)
+        events = list(self._events)          # one C-level copy; other threads keep appending
+        i = len(events)
+        while i and events[i - 1][2] + events[i - 1][3] >= cutoff:   # appended in order of end time
+            i -= 1
+        return events[i:]
+
+    def stats(self, window_s: float = 1.0) -> dict:
+        """name -> count, mean_us, max_us, busy_pct (share of the window) over the last window_s."""
+        acc = {}
+        for name, _tid, _t0, dur in self._recent(window_s):
+            a = acc.get(name)
+            if a is None:
+                acc[name] = [1, dur, dur]
+            else:
+                a[0] += 1
+                a[1] += dur
+                if dur > a[2]:
+                    a[2] = dur
+        window_ns = window_s * 1e9
+        return {name: {"count": n, "mean_us": total / n / 1000, "max_us": mx / 1000,
+                       "busy_pct": 100 * total / window_ns}
+                for name, (n, total, mx) in sorted(acc.items(), key=lambda kv: -kv[1][1])}
+
+    def trace(self, seconds: float | None = None) -> dict:
+        """Chrome trace-event JSON (object form) of the last `seconds` (default self.seconds)."""
+        events = self._recent(self.seconds if seconds is None else seconds)
+        pid = os.getpid()
+        out = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": os.path.basename(sys.argv[0]) or "python"}}]
+        names = dict(self._threads)
+        for tid in sorted({e[1] for e in events}):
+            out.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                        "args": {"name": names.get(tid, str(tid))}})
+        for name, tid, t0, dur in events:
+            out.append({"name": name, "cat": name.split()[0], "ph": "X", "pid": pid, "tid": tid,
+                        "ts": t0 / 1000, "dur": dur / 1000})
+        return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: str, seconds: float | None = None) -> int:
+        """Write the trace to path; returns the number of spans written."""
+        trace = self.trace(seconds)
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        return sum(e["ph"] == "X" for e in trace["traceEvents"])
+
+
+PROFILER = Profiler()
+span = PROFILER.span
+
+
+def profiled(name: str):
+    """Decorator form of span(), for methods like paintEvent."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with _Span(PROFILER, name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
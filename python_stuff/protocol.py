@@ -0,0 +1,386 @@
+import binascii, select, socket, struct, time
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback below gives the same columns
+    np = None
+
+# 20-byte telemetry frame sent by src/main.cpp every 10 ms:
+#   0..1   battery ADC (12-bit, big-endian)
+#   2..5   motor echoes FL, FR, BL, BR
+#   6..19  MPU raw registers from ACCEL_XOUT_H: ax, ay, az, temp, gx, gy, gz (big-endian int16)
+PACKET_LEN = 20
+FRAME_STRUCT = struct.Struct(">H4B7h")
+IMU_FIELDS = ('ax', 'ay', 'az', 'temp', 'gx', 'gy', 'gz')
+FIELDS = ('bat_adc', 'motors') + IMU_FIELDS
+
+A_SENS = 16384.0  # MPU9250/MPU6050 accel LSB/g (adjust if different)
+G_SENS = 16.4     # gyro LSB per deg/s at +-2000 dps (GYRO_CONFIG 0x18)
+
+# Protocol v2 (TELEMETRY_V2 in src/main.cpp) wraps the same 20-byte payload:
+#   0..1   sync A5 5A
+#   2      version (2)
+#   3      flags (0)
+#   4..5   sequence number (u16, wraps)
+#   6..9   device timestamp, micros() (u32)
+#   10..29 v1 frame
+#   30..31 CRC-16/CCITT-FALSE over bytes 2..29
+# A v2 drone opens every connection with the 4-byte V2_HELLO. A v1 stream starts
+# with the battery ADC's high byte (<= 0x0F), so the two can't be confused and the
+# decoder picks the format from the first bytes it sees.
+V2_SYNC = b"\xa5\x5a"
+V2_VERSION = 2
+V2_HELLO = b"DRN\x02"
+V2_LEN = 32
+V2_HEADER = struct.Struct(">2sBBHI")
+V2_CRC = struct.Struct(">H")
+
+
+def crc16(data, crc: int = 0xFFFF) -> int:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as computed by the firmware."""
+    return binascii.crc_hqx(data, crc)
+
+
+def encode_v2(payload: bytes, seq: int, t_us: int) -> bytes:
+    body = V2_HEADER.pack(V2_SYNC, V2_VERSION, 0, seq & 0xFFFF, t_us & 0xFFFFFFFF) + payload
+    return body + V2_CRC.pack(crc16(body[2:]))
+
+if np is not None:
+    FRAME_DTYPE = np.dtype([('bat_adc', '>u2'), ('motors', 'u1', (4,))] +
+                           [(f, '>i2') for f in IMU_FIELDS])
+    assert FRAME_DTYPE.itemsize == PACKET_LEN
+
+    def _crc_table16():
+        # T[x] = register after shifting 16 message bits through it, for every
+        # register value x: lets the CRC eat a whole big-endian u16 per step
+        t = np.arange(1 << 16, dtype=np.uint32)
+        for _ in range(16):
+            t = np.where(t & 0x8000, (t << 1) ^ 0x1021, t << 1) & 0xFFFF
+        return t.astype(np.uint16)
+
+    _CRC_TABLE16 = _crc_table16()
+    _V2_BODY = np.arange(2, V2_LEN - 2)              # CRC'd bytes, relative to the sync
+    _V2_PAYLOAD = np.arange(V2_LEN - 2 - PACKET_LEN, V2_LEN - 2)
+
+    def crc16_rows(rows):
+        """CRC-16/CCITT-FALSE of every row of a (k, m) uint8 array (m even), two bytes per step."""
+        words = np.ascontiguousarray(rows).view(">u2").T.astype(np.uint16)   # (m/2, k), native order
+        crc = np.full(len(rows), 0xFFFF, dtype=np.uint16)
+        for w in words:
+            crc = _CRC_TABLE16[crc ^ w]
+        return crc
+else:
+    FRAME_DTYPE = None
+
+
+class FrameColumns(dict):
+    """Column-wise frames (field -> list) for when NumPy isn't installed.
+    Indexes like the structured array: frames['ax'], frames['motors'][i], len(frames)."""
+    def __init__(self, raw: bytes):
+        rows = list(FRAME_STRUCT.iter_unpack(raw))
+        cols = list(zip(*rows)) if rows else [()] * (5 + len(IMU_FIELDS))
+        super().__init__(bat_adc=list(cols[0]),
+                         motors=list(zip(*cols[1:5])),
+                         **{f: list(c) for f, c in zip(IMU_FIELDS, cols[5:])})
+        self._raw = raw
+        self._n = len(rows)
+
+    def __len__(self):
+        return self._n
+
+    def tobytes(self) -> bytes:
+        return self._raw
+
+
+def decode_frames(raw, use_numpy: bool = True):
+    """Decode a whole number of frames in one pass (structured array, or FrameColumns)."""
+    n = len(raw) // PACKET_LEN
+    if use_numpy and np is not None:
+        return np.frombuffer(raw, dtype=FRAME_DTYPE, count=n).copy()
+    return FrameColumns(bytes(raw[:n * PACKET_LEN]))
+
+
+def _first_fit(starts, length: int):
+    """Greedy non-overlapping subset of sorted frame starts."""
+    out, nxt = [], -1
+    for p in starts:
+        if p >= nxt:
+            out.append(p)
+            nxt = p + length
+    return out
+
+
+class FrameDecoder:
+    """
+    Accumulates stream bytes in a preallocated buffer and decodes every complete
+    frame per feed() call. Only the partial tail (< PACKET_LEN) is moved back to the
+    front afterwards, so a backlog of N frames costs one decode instead of N slices.
+
+    protocol=None picks v1 or v2 from the first bytes of the stream. v2 frames are
+    found by sync word and CRC over the whole buffer at once, so dropped or extra
+    bytes cost the frames they touch and nothing after; the output is the same v1
+    frame columns either way.
+    """
+    def __init__(self, capacity: int = 64 * 1024, use_numpy: bool = True, protocol: int | None = None):
+        self._buf = bytearray(max(capacity, V2_LEN))
+        self._view = memoryview(self._buf)
+        self._n = 0
+        self.use_numpy = use_numpy and np is not None
+        self._protocol = protocol
+        self.protocol = protocol
+        self.frames_total = 0
+        # v2 link health
+        self.resyncs = 0          # times good frames resumed after skipped bytes
+        self.crc_errors = 0       # sync found but checksum wrong
+        self.bytes_skipped = 0
+        self.seq_lost = 0         # gaps in the device sequence numbers
+        self.last_seq = None
+        self.last_t_us = None     # device clock of the newest frame
+        self.batch_t_us = None    # device timestamps of the last feed()'s frames (v2 only)
+        self._synced = False
+        self._skipping = False
+
+    @property
+    def pending(self) -> int:
+        """Bytes buffered that don't make up a complete frame yet."""
+        return self._n
+
+    def reset(self):
+        self._n = 0
+        self.protocol = self._protocol
+        self.last_seq = None
+        self._synced = self._skipping = False
+
+    def _reserve(self, extra: int):
+        need = self._n + extra
+        if need <= len(self._buf):
+            return
+        size = len(self._buf)
+        while size < need:
+            size *= 2
+        self._view.release()
+        self._buf.extend(bytes(size - len(self._buf)))
+        self._view = memoryview(self._buf)
+
+    def feed(self, data):
+        """Append received bytes, return all complete frames decoded (possibly empty)."""
+        k = len(data)
+        self._reserve(k)
+        self._view[self._n:self._n + k] = data
+        self._n += k
+
+        if self.protocol is None and not self._detect():
+            return decode_frames(b"", self.use_numpy)
+        if self.protocol == 2:
+            return self._feed_v2()
+
+        used = (self._n // PACKET_LEN) * PACKET_LEN
+        frames = decode_frames(self._view[:used], self.use_numpy)
+        rest = self._n - used
+        if rest and used:
+            self._buf[:rest] = self._view[used:self._n]
+        self._n = rest
+        self.frames_total += len(frames)
+        return frames
+
+    def _detect(self) -> bool:
+        if not self._n:
+            return False
+        first = self._buf[0]
+        if first == V2_SYNC[0]:
+            self.protocol = 2
+        elif first == V2_HELLO[0]:
+            if self._n < len(V2_HELLO):
+                return False
+            if self._buf[:len(V2_HELLO)] == V2_HELLO:
+                self.protocol = 2
+                self._consume(len(V2_HELLO))
+            else:
+                self.protocol = 1
+        else:
+            self.protocol = 1
+        return True
+
+    def _consume(self, k: int):
+        rest = self._n - k
+        if rest > 0:
+            self._buf[:rest] = self._view[k:self._n]
+        self._n = max(0, rest)
+
+    def _feed_v2(self):
+        n = self._n
+        last = n - V2_LEN                  # last offset a complete frame can start at
+        if last < 0:
+            return decode_frames(b"", self.use_numpy)
+        if self.use_numpy:
+            a = np.frombuffer(self._buf, np.uint8, n)
+            hits = np.flatnonzero((a[:last + 1] == V2_SYNC[0]) & (a[1:last + 2] == V2_SYNC[1]) &
+                                  (a[2:last + 3] == V2_VERSION))
+            ok = crc16_rows(a[hits[:, None] + _V2_BODY]) == ((a[hits + 30].astype(np.uint16) << 8) | a[hits + 31])
+            good = hits[ok]
+            if len(good) > 1 and (np.diff(good) < V2_LEN).any():
+                good = np.array(_first_fit(good.tolist(), V2_LEN), dtype=np.intp)
+            bad = hits[~ok]
+            if len(bad) and len(good):       # a sync lookalike inside a good frame isn't an error
+                i = np.searchsorted(good, bad, "right") - 1
+                bad = bad[(i < 0) | (bad >= good[np.maximum(i, 0)] + V2_LEN)]
+            self.crc_errors += len(bad)
+            gaps = good - np.concatenate(([0], good[:-1] + V2_LEN))
+            seq = (a[good + 4].astype(np.int64) << 8) | a[good + 5]
+            frames = a[good[:, None] + _V2_PAYLOAD].view(FRAME_DTYPE).reshape(-1)
+            self.batch_t_us = np.ascontiguousarray(a[good[:, None] + np.arange(6, 10)]).view(">u4").reshape(-1)
+            if len(good):
+                self.last_t_us = int(self.batch_t_us[-1])
+                jumped = gaps != 0
+                jumped[0] = (jumped[0] or self._skipping) and self._synced
+                self.resyncs += int(jumped.sum())
+                self.bytes_skipped += int(gaps.sum())
+                if self.last_seq is not None:
+                    seq = np.concatenate(([self.last_seq], seq))
+                self.seq_lost += int(((np.diff(seq) - 1) & 0xFFFF).sum())
+                self.last_seq = int(seq[-1])
+                self._synced, self._skipping = True, False
+            good = good.tolist()
+            del a, hits, ok               # release the buffer export before compacting
+        else:
+            buf, hits, pos = self._buf, [], 0
+            marker = V2_SYNC + bytes([V2_VERSION])
+            while True:
+                p = buf.find(marker, pos, last + 3)
+                if p < 0 or p > last:
+                    break
+                hits.append(p)
+                pos = p + 1
+            good, bad = [], []
+            for p in hits:
+                (good if crc16(self._view[p + 2:p + 30]) == V2_CRC.unpack_from(buf, p + 30)[0] else bad).append(p)
+            good = _first_fit(good, V2_LEN)
+            self.crc_errors += sum(1 for b in bad if not any(g <= b < g + V2_LEN for g in good))
+            frames = FrameColumns(b"".join(buf[p + 10:p + 30] for p in good))
+            self.batch_t_us = []
+            prev_end = 0
+            for p in good:
+                _, _, _, seq, self.last_t_us = V2_HEADER.unpack_from(buf, p)
+                self.batch_t_us.append(self.last_t_us)
+                if (p > prev_end or (p == prev_end == 0 and self._skipping)) and self._synced:
+                    self.resyncs += 1
+                self.bytes_skipped += p - prev_end
+                if self.last_seq is not None:
+                    self.seq_lost += (seq - self.last_seq - 1) & 0xFFFF
+                self.last_seq, self._synced, self._skipping = seq, True, False
+                prev_end = p + V2_LEN
+
+        end = good[-1] + V2_LEN if good else 0
+        keep = max(end, last + 1)          # anything before this was looked at and isn't a frame
+        if keep > end:
+            self._skipping = True
+            self.bytes_skipped += keep - end
+        self._consume(keep)
+        self.frames_total += len(frames)
+        return frames
+
+    def stats(self) -> dict:
+        return {"protocol": self.protocol, "frames": self.frames_total, "resyncs": self.resyncs,
+                "crc_errors": self.crc_errors, "bytes_skipped": self.bytes_skipped, "seq_lost": self.seq_lost}
+
+
+class LatestFrameReader:
+    """
+    Newest-complete-frame reader for polling views (matplotlib, REPL). Each read()
+    drains everything queued on the socket into one preallocated buffer with
+    recv_into and keeps only the last whole frame, so a slow consumer never falls
+    behind and never drifts out of frame alignment. No allocation per call: the
+    returned memoryview aliases `frame` and is overwritten by the next read().
+    Works with a socket or a transport.Transport; v2 streams are recognised by
+    their hello and yield the newest frame whose CRC checks out.
+    """
+    def __init__(self, sock, capacity: int = 64 * 1024, timeout: float | None = 1.0):
+        self.sock = sock
+        self.timeout = timeout
+        sock.settimeout(0)                        # drain without blocking; waits go via select
+        cap = max(capacity, 2 * PACKET_LEN) // PACKET_LEN * PACKET_LEN
+        self._buf = bytearray(cap)
+        self._view = memoryview(self._buf)
+        self._n = 0
+        self.frame = bytearray(PACKET_LEN)
+        self._frame_view = memoryview(self.frame)
+        self.frames_read = 0                      # frames returned
+        self.frames_skipped = 0                   # older frames drained and dropped
+        self.protocol = None
+
+    def _drain(self) -> int:
+        """Pull every queued byte; returns complete frames seen (newest lands in `frame`)."""
+        seen = 0
+        while True:
+            try:
+                k = self.sock.recv_into(self._view[self._n:])
+            except (BlockingIOError, socket.timeout):
+                break
+            if k == 0:
+                if seen:
+                    break
+                raise ConnectionError("socket closed")
+            self._n += k
+            if self.protocol is None and not self._detect():
+                continue
+            if self.protocol == 2:
+                seen += self._take_v2()
+                continue
+            whole = self._n // PACKET_LEN
+            if whole:
+                end = whole * PACKET_LEN
+                self._frame_view[:] = self._view[end - PACKET_LEN:end]
+                self._keep(end)
+                seen += whole
+        return seen
+
+    def _keep(self, start: int):
+        """Drop everything before `start`."""
+        rest = self._n - start
+        if rest > 0:
+            self._buf[:rest] = self._view[start:self._n]
+        self._n = max(0, rest)
+
+    def _detect(self) -> bool:
+        first = self._buf[0]
+        if first == V2_HELLO[0]:
+            if self._n < len(V2_HELLO):
+                return False
+            if self._buf[:len(V2_HELLO)] == V2_HELLO:
+                self.protocol = 2
+                self._keep(len(V2_HELLO))
+                return True
+        self.protocol = 2 if first == V2_SYNC[0] else 1
+        return True
+
+    def _take_v2(self) -> int:
+        """Newest valid v2 frame in the buffer -> `frame`; returns frames passed over."""
+        marker = V2_SYNC + bytes([V2_VERSION])
+        end = self._n - V2_LEN + len(marker)          # a match must leave room for a whole frame
+        while end >= len(marker):
+            p = self._buf.rfind(marker, 0, end)
+            if p < 0:
+                break
+            if crc16(self._view[p + 2:p + 30]) == V2_CRC.unpack_from(self._buf, p + 30)[0]:
+                self._frame_view[:] = self._view[p + 10:p + 30]
+                self._keep(p + V2_LEN)
+                return p // V2_LEN + 1
+            end = p + len(marker) - 1
+        self._keep(max(0, self._n - V2_LEN + 1))      # nothing valid; keep a possible partial frame
+        return 0
+
+    def read(self, block: bool = True):
+        """Newest complete frame (memoryview of `frame`), or None if nothing new arrived."""
+        seen = self._drain()
+        if not seen and block:
+            deadline = None if self.timeout is None else time.monotonic() + self.timeout
+            while not seen:
+                wait = None if deadline is None else deadline - time.monotonic()
+                if (wait is not None and wait <= 0) or not select.select([self.sock], [], [], wait)[0]:
+                    break
+                seen = self._drain()         # may still be 0: a partial or corrupt frame
+        if not seen:
+            return None
+        self.frames_read += 1
+        self.frames_skipped += seen - 1
+        return self._frame_view
@@ -0,0 +1,330 @@
+import argparse, os, struct, time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from protocol import FRAME_DTYPE
+from recorder import KIND_FRAME, LogReader
+
+# Multi-resolution min/max/mean summary of a flight log's telemetry, so any time
+# range can be drawn or summarized by touching ~width buckets instead of every
+# sample. Level 0 folds BASE consecutive frames per bucket; each level above
+# folds FANOUT buckets of the one below. The recorder builds it as it writes and
+# appends finished level-0 buckets to a "<log>.pyr" sidecar on every commit;
+# the upper levels are a few NumPy reductions over level 0 and are rebuilt on
+# open. Frames the sidecar is missing (crash, old log) are folded in from the log.
+# Needs NumPy.
+
+CHANNELS = ('bat_adc', 'm_fl', 'm_fr', 'm_bl', 'm_br', 'ax', 'ay', 'az', 'gx', 'gy', 'gz')
+_IMU = ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+NCH = len(CHANNELS)
+BASE = 16
+FANOUT = 4
+
+MAGIC = b"DRNPYR1\0"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sHHHH4x")    # magic, version, base, fanout, channels
+
+if np is not None:
+    # t0/t1: timestamps of the first/last frame; rec_end: log record after the last frame
+    BUCKET_DTYPE = np.dtype([('t0', '<i8'), ('t1', '<i8'), ('rec_end', '<i8'), ('n', '<i8'),
+                             ('lo', '<f4', (NCH,)), ('hi', '<f4', (NCH,)), ('sum', '<f8', (NCH,))])
+    assert FILE_HEADER.size == 20
+
+
+def channel_values(frames):
+    """(n, NCH) float32 matrix of CHANNELS from NumPy-decoded frames."""
+    out = np.empty((len(frames), NCH), dtype=np.float32)
+    out[:, 0] = frames['bat_adc']
+    out[:, 1:5] = frames['motors']
+    for j, f in enumerate(_IMU):
+        out[:, 5 + j] = frames[f]
+    return out
+
+
+class _Level:
+    """Growable array of buckets."""
+    def __init__(self, capacity: int = 256):
+        self._buf = np.zeros(capacity, dtype=BUCKET_DTYPE)
+        self.n = 0
+
+    @property
+    def b(self):
+        return self._buf[:self.n]
+
+    def append(self, rows):
+        if self.n + len(rows) > len(self._buf):
+            cap = len(self._buf)
+            while self.n + len(rows) > cap:
+                cap *= 2
+            buf = np.zeros(cap, dtype=BUCKET_DTYPE)
+            buf[:self.n] = self._buf[:self.n]
+            self._buf = buf
+        self._buf[self.n:self.n + len(rows)] = rows
+        self.n += len(rows)
+
+
+def _fold(children):
+    """One parent bucket per FANOUT consecutive children."""
+    c = children.reshape(-1, FANOUT)
+    out = np.empty(len(c), dtype=BUCKET_DTYPE)
+    out['t0'] = c['t0'][:, 0]
+    out['t1'] = c['t1'][:, -1]
+    out['rec_end'] = c['rec_end'][:, -1]
+    out['n'] = c['n'].sum(axis=1)
+    out['lo'] = c['lo'].min(axis=1)
+    out['hi'] = c['hi'].max(axis=1)
+    out['sum'] = c['sum'].sum(axis=1)
+    return out
+
+
+class PyramidBuilder:
+    """
+    Incremental pyramid. add() takes decoded frames with their timestamps and
+    log record numbers; flush() appends the level-0 buckets finished since the
+    last flush to `path` (if given). Levels above 0 stay in memory.
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.levels = [_Level()]
+        self._pending = None          # (values, t, rec) of frames not yet in a bucket
+        self._flushed = 0
+        self._f = None
+        if path is not None:
+            self._f = open(path, "wb")
+            self._f.write(FILE_HEADER.pack(MAGIC, VERSION, BASE, FANOUT, NCH))
+            self._f.flush()
+
+    @property
+    def frames(self) -> int:
+        pending = len(self._pending[1]) if self._pending is not None else 0
+        return int(self.levels[0].b['n'].sum()) + pending
+
+    def add(self, frames, t_ns, rec):
+        """frames: FRAME_DTYPE array; t_ns, rec: per-frame arrays (or scalars to broadcast)."""
+        k = len(frames)
+        if not k:
+            return
+        vals = channel_values(frames)
+        t = np.broadcast_to(np.asarray(t_ns, dtype=np.int64), (k,))
+        rec = np.broadcast_to(np.asarray(rec, dtype=np.int64), (k,))
+        if self._pending is not None:
+            pv, pt, pr = self._pending
+            vals, t, rec = np.concatenate((pv, vals)), np.concatenate((pt, t)), np.concatenate((pr, rec))
+        nb = len(t) // BASE
+        m = nb * BASE
+        self._pending = (vals[m:], t[m:], rec[m:]) if m < len(t) else None
+        if nb:
+            v = vals[:m].reshape(nb, BASE, NCH)
+            rows = np.empty(nb, dtype=BUCKET_DTYPE)
+            rows['t0'] = t[:m:BASE]
+            rows['t1'] = t[BASE - 1:m:BASE]
+            rows['rec_end'] = rec[BASE - 1:m:BASE] + 1
+            rows['n'] = BASE
+            rows['lo'] = v.min(axis=1)
+            rows['hi'] = v.max(axis=1)
+            rows['sum'] = v.sum(axis=1, dtype=np.float64)
+            self._extend(rows)
+
+    def _extend(self, rows):
+        self.levels[0].append(rows)
+        lvl = 0
+        while True:
+            child = self.levels[lvl]
+            have = len(self.levels[lvl + 1].b) if lvl + 1 < len(self.levels) else 0
+            new = child.n // FANOUT - have
+            if new <= 0:
+                return
+            if lvl + 1 == len(self.levels):
+                self.levels.append(_Level())
+            self.levels[lvl + 1].append(_fold(child.b[have * FANOUT:(have + new) * FANOUT]))
+            lvl += 1
+
+    def finish(self):
+        """Close the partial bucket (fewer than BASE frames) into level 0. Nothing
+        can be added afterwards; upper levels don't include it."""
+        if self._pending is None:
+            return
+        vals, t, rec = self._pending
+        self._pending = None
+        row = np.empty(1, dtype=BUCKET_DTYPE)
+        row['t0'], row['t1'], row['rec_end'], row['n'] = t[0], t[-1], rec[-1] + 1, len(t)
+        row['lo'], row['hi'] = vals.min(axis=0), vals.max(axis=0)
+        row['sum'] = vals.sum(axis=0, dtype=np.float64)
+        self.levels[0].append(row)
+
+    def flush(self):
+        if self._f is None:
+            return
+        lvl0 = self.levels[0]
+        if lvl0.n > self._flushed:
+            self._f.write(lvl0.b[self._flushed:].tobytes())
+            self._f.flush()
+            self._flushed = lvl0.n
+
+    def close(self):
+        self.finish()
+        self.flush()
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def pyramid(self, log=None) -> "Pyramid":
+        return Pyramid([lv.b for lv in self.levels], log)
+
+
+class Pyramid:
+    """
+    Read side. levels[i] is a BUCKET_DTYPE array; log (a LogReader) lets queries
+    narrower than one level-0 bucket per pixel read the raw frames instead.
+    """
+    def __init__(self, levels, log=None):
+        self.levels = levels
+        self.log = log
+
+    @classmethod
+    def open(cls, path: str, save: bool = True) -> "Pyramid":
+        """Pyramid of the log at `path`: the sidecar if present, plus whatever it is
+        missing folded in from the log. save writes a complete sidecar back."""
+        log = LogReader(path)
+        builder = PyramidBuilder()
+        side = path + ".pyr"
+        have = 0
+        try:
+            with open(side, "rb") as f:
+                head = f.read(FILE_HEADER.size)
+                if len(head) == FILE_HEADER.size and FILE_HEADER.unpack(head) == (MAGIC, VERSION, BASE, FANOUT, NCH):
+                    data = f.read()
+                    rows = np.frombuffer(data, dtype=BUCKET_DTYPE, count=len(data) // BUCKET_DTYPE.itemsize)
+                    rows = rows[rows['rec_end'] <= log.count]
+                    if len(rows) and rows['n'][-1] != BASE:
+                        # partial bucket written by close(): the recording ended cleanly
+                        builder._extend(rows[:-1])
+                        builder.levels[0].append(rows[-1:])
+                        have = log.count
+                    elif len(rows):
+                        builder._extend(rows)
+                        have = int(rows['rec_end'][-1])
+        except OSError:
+            pass
+        added = 0
+        for start in range(have, log.count, 1 << 16):
+            recs = log.records(start, start + (1 << 16))
+            idx = np.flatnonzero(recs['kind'] == KIND_FRAME)
+            if len(idx):
+                builder.add(recs['payload'][idx].reshape(-1).view(FRAME_DTYPE), recs['t_ns'][idx], start + idx)
+                added += len(idx)
+        builder.finish()
+        if added and save:
+            tmp = side + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, BASE, FANOUT, NCH))
+                f.write(builder.levels[0].b.tobytes())
+            os.replace(tmp, side)
+        return builder.pyramid(log)
+
+    @property
+    def t_start(self) -> int:
+        return int(self.levels[0]['t0'][0]) if len(self.levels[0]) else 0
+
+    @property
+    def t_end(self) -> int:
+        return int(self.levels[0]['t1'][-1]) if len(self.levels[0]) else 0
+
+    @property
+    def frames(self) -> int:
+        return int(self.levels[0]['n'].sum())
+
+    def _buckets(self, lvl: int, t0: int, t1: int, first: int = 0):
+        """Buckets of level lvl (from index `first`) overlapping [t0, t1], followed by
+        finer buckets covering whatever lvl hasn't folded yet."""
+        b = self.levels[lvl]
+        lo = max(first, int(np.searchsorted(b['t1'], t0, 'left')))
+        hi = int(np.searchsorted(b['t0'], t1, 'right'))
+        parts = [b[lo:max(lo, hi)]]
+        # every level below may hold an unfolded tail, even when the next one is
+        # fully folded; it can't be told by time either, since frames of one
+        # batch share a timestamp (an empty slice per level costs nothing)
+        if lvl > 0:
+            parts.append(self._buckets(lvl - 1, t0, t1, len(b) * FANOUT))
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def _raw(self, t0: int, t1: int):
+        """Frames in [t0, t1] as one-sample buckets."""
+        recs = self.log.records(self.log.seek(t0), self.log.seek(t1 + 1))
+        idx = np.flatnonzero(recs['kind'] == KIND_FRAME)
+        vals = channel_values(recs['payload'][idx].reshape(-1).view(FRAME_DTYPE))
+        out = np.empty(len(idx), dtype=BUCKET_DTYPE)
+        out['t0'] = out['t1'] = recs['t_ns'][idx]
+        out['n'] = 1
+        out['lo'] = out['hi'] = vals
+        out['sum'] = vals
+        return out
+
+    def buckets(self, t0: int, t1: int, width: int):
+        """About `width` or more buckets (never many more than FANOUT * width) covering [t0, t1]."""
+        for lvl in range(len(self.levels) - 1, -1, -1):
+            b = self.levels[lvl]
+            count = np.searchsorted(b['t0'], t1, 'right') - np.searchsorted(b['t1'], t0, 'left')
+            if count >= width:
+                return self._buckets(lvl, t0, t1)
+        if self.log is not None:
+            return self._raw(t0, t1)
+        return self._buckets(0, t0, t1)
+
+    def query(self, channel: str, t0: int, t1: int, width: int):
+        """
+        Per-pixel (lo, hi, mean) of one channel over [t0, t1] (log ns) split into
+        `width` columns; columns with no data are NaN.
+        """
+        c = CHANNELS.index(channel)
+        b = self.buckets(t0, t1, width)
+        lo = np.full(width, np.nan)
+        hi = np.full(width, np.nan)
+        mean = np.full(width, np.nan)
+        if not len(b):
+            return lo, hi, mean
+        mid = (b['t0'] + b['t1']) // 2
+        px = np.clip((mid - t0) * width // max(1, t1 - t0), 0, width - 1)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(px)) + 1))
+        cols = px[starts]
+        lo[cols] = np.minimum.reduceat(b['lo'][:, c], starts)
+        hi[cols] = np.maximum.reduceat(b['hi'][:, c], starts)
+        mean[cols] = np.add.reduceat(b['sum'][:, c], starts) / np.add.reduceat(b['n'], starts)
+        return lo, hi, mean
+
+    def summary(self, t0: int, t1: int, resolution: int = 256) -> dict:
+        """{channel: (min, max, mean)} over [t0, t1], exact to 1/resolution of the range."""
+        b = self.buckets(t0, t1, resolution)
+        if not len(b):
+            return {}
+        lo, hi = b['lo'].min(axis=0), b['hi'].max(axis=0)
+        mean = b['sum'].sum(axis=0) / b['n'].sum()
+        return {ch: (float(lo[i]), float(hi[i]), float(mean[i])) for i, ch in enumerate(CHANNELS)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build/query the min/max/mean pyramid of a flight log.")
+    ap.add_argument("log")
+    ap.add_argument("--from", dest="t_from", type=float, default=0.0, help="seconds from log start")
+    ap.add_argument("--to", dest="t_to", type=float, help="seconds from log start (default: end)")
+    args = ap.parse_args()
+
+    t = time.perf_counter()
+    pyr = Pyramid.open(args.log)
+    opened = time.perf_counter() - t
+    t0 = pyr.t_start + int(args.t_from * 1e9)
+    t1 = pyr.t_end if args.t_to is None else pyr.t_start + int(args.t_to * 1e9)
+    t = time.perf_counter()
+    summary = pyr.summary(t0, t1)
+    queried = time.perf_counter() - t
+    print(f"{pyr.frames} frames, {(pyr.t_end - pyr.t_start) / 1e9:.1f} s, {len(pyr.levels)} levels; "
+          f"open {opened * 1e3:.1f} ms, summary {queried * 1e3:.2f} ms")
+    for ch, (lo, hi, mean) in summary.items():
+        print(f"  {ch:8s} min {lo:9.1f}  max {hi:9.1f}  mean {mean:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
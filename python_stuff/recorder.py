@@ -0,0 +1,259 @@
+import bisect, mmap, os, struct, threading, time
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from protocol import FRAME_DTYPE, PACKET_LEN
+
+# Flight log = fixed 64-byte header + fixed 32-byte records, preallocated and mmapped.
+#   header: magic, version, record size, committed record count, start time
+#   record: t_ns (host monotonic), kind, payload length, payload (raw frame or motor packet)
+# `committed` is only bumped after the records before it are flushed to disk, so
+# after a crash the log is valid up to the last flushed chunk.
+# A sidecar .idx file holds (t_ns, record number) every INDEX_EVERY records, and
+# (with NumPy) a .pyr file the min/max/mean pyramid of the telemetry (pyramid.py).
+MAGIC = b"DRNLOG1\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIqqd24x")   # magic, version, rec size, pad, committed, t0_ns, wall start
+RECORD = struct.Struct("<qBBxx20s")
+RECORD_LEN = RECORD.size
+assert HEADER.size == 64 and RECORD_LEN == 32
+
+KIND_FRAME = 1
+KIND_COMMAND = 2
+
+INDEX_EVERY = 256
+INDEX_ENTRY = struct.Struct("<qq")
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([('t_ns', '<i8'), ('kind', 'u1'), ('len', 'u1'), ('pad', '<u2'),
+                             ('payload', 'u1', (20,))])
+    assert RECORD_DTYPE.itemsize == RECORD_LEN
+
+
+def _pack_records(t_ns: int, kind: int, raw: bytes, size: int) -> bytes:
+    """Records for raw cut into `size`-byte payloads, all stamped t_ns."""
+    n = len(raw) // size
+    if np is not None and size == PACKET_LEN:
+        rec = np.zeros(n, dtype=RECORD_DTYPE)
+        rec['t_ns'] = t_ns
+        rec['kind'] = kind
+        rec['len'] = size
+        rec['payload'] = np.frombuffer(raw, dtype=np.uint8, count=n * size).reshape(n, size)
+        return rec.tobytes()
+    return b"".join(RECORD.pack(t_ns, kind, size, raw[i*size:(i+1)*size]) for i in range(n))
+
+
+class Recorder:
+    """
+    Always-on flight recorder. record_frames()/record_command() never block: they
+    append to a bounded write-behind queue (overflow is dropped and counted) and a
+    background thread copies records into the mmapped log and flushes in chunks.
+    """
+    def __init__(self, path: str, capacity: int = 1 << 20, max_pending: int = 4096,
+                 flush_interval: float = 0.5, pyramid: bool = True):
+        self.path = path
+        self.max_pending = max_pending      # queued batches
+        self.flush_interval = flush_interval
+        self.dropped = 0                    # records lost to a full queue
+        self.written = 0
+        self.committed = 0
+        self.t0_ns = time.monotonic_ns()
+        self.wall_start = time.time()
+
+        self._q = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._index = []
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._capacity = 0
+        self._mm = None
+        self._map(max(capacity, INDEX_EVERY))
+        self._write_header()
+        self._idx = open(path + ".idx", "wb")
+        self._pyramid = None
+        if pyramid and np is not None:
+            from pyramid import PyramidBuilder     # pyramid.py reads logs through this module
+            self._pyramid = PyramidBuilder(path + ".pyr")
+
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    # --- producer side (ingest / send path) ---
+    def record_frames(self, raw: bytes, t_ns: int | None = None):
+        self._put(KIND_FRAME, raw, PACKET_LEN, t_ns)
+
+    def record_command(self, data: bytes, t_ns: int | None = None):
+        self._put(KIND_COMMAND, data, len(data), t_ns)
+
+    def _put(self, kind, raw, size, t_ns):
+        if len(self._q) >= self.max_pending:
+            self.dropped += len(raw) // max(1, size)
+            return
+        self._q.append((time.monotonic_ns() if t_ns is None else t_ns, kind, bytes(raw), size))
+        self._wake.set()
+
+    @property
+    def fill_level(self) -> float:
+        """Write-behind queue fill, 0..1."""
+        return len(self._q) / self.max_pending
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._mm.flush()
+        self._mm.close()
+        os.ftruncate(self._fd, HEADER.size + self.committed * RECORD_LEN)
+        os.close(self._fd)
+        self._idx.close()
+        if self._pyramid is not None:
+            self._pyramid.close()
+
+    # --- writer thread ---
+    def _map(self, capacity: int):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+        os.ftruncate(self._fd, HEADER.size + capacity * RECORD_LEN)
+        self._mm = mmap.mmap(self._fd, HEADER.size + capacity * RECORD_LEN)
+        self._capacity = capacity
+
+    def _write_header(self):
+        self._mm[:HEADER.size] = HEADER.pack(MAGIC, VERSION, RECORD_LEN, 0,
+                                             self.committed, self.t0_ns, self.wall_start)
+
+    def _write(self, t_ns, kind, raw, size):
+        data = _pack_records(t_ns, kind, raw, size)
+        n = len(data) // RECORD_LEN
+        if self.written + n > self._capacity:
+            cap = self._capacity
+            while self.written + n > cap:
+                cap *= 2
+            self._map(cap)
+        off = HEADER.size + self.written * RECORD_LEN
+        self._mm[off:off + len(data)] = data
+        first = self.written
+        self.written += n
+        if self._pyramid is not None and kind == KIND_FRAME:
+            self._pyramid.add(np.frombuffer(raw, dtype=FRAME_DTYPE, count=n),
+                              t_ns, first + np.arange(n))
+        # sparse time index: one entry per INDEX_EVERY records
+        nxt = -(-first // INDEX_EVERY) * INDEX_EVERY
+        while nxt < self.written:
+            self._index.append((t_ns, nxt))
+            nxt += INDEX_EVERY
+
+    def _commit(self):
+        if self.committed == self.written:
+            return
+        self._mm.flush()
+        self.committed = self.written
+        self._write_header()
+        self._mm.flush(0, mmap.PAGESIZE)
+        for t_ns, rec in self._index:
+            self._idx.write(INDEX_ENTRY.pack(t_ns, rec))
+        self._idx.flush()
+        self._index.clear()
+        if self._pyramid is not None:
+            self._pyramid.flush()      # after the log, so the sidecar never runs ahead of it
+
+    def _run(self):
+        last_commit = time.monotonic()
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while True:
+                    self._write(*self._q.popleft())
+            except IndexError:
+                pass
+            now = time.monotonic()
+            stopping = self._stop.is_set()
+            if stopping or now - last_commit >= self.flush_interval:
+                self._commit()
+                last_commit = now
+            if stopping:
+                return
+
+
+class LogReader:
+    """Read-only view of a flight log (committed records only) with O(log n) time seek."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rec_len, _, committed, t0_ns, wall = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or rec_len != RECORD_LEN:
+            raise ValueError(f"{path}: not a drone flight log")
+        self.version = version
+        self.t0_ns = t0_ns
+        self.wall_start = wall
+        # never trust more records than actually made it into the file
+        self.count = min(committed, (len(self._mm) - HEADER.size) // RECORD_LEN)
+        self._index_t, self._index_rec = self._load_index()
+
+    def _load_index(self):
+        ts, recs = [], []
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                data = f.read()
+                # a torn last entry is just ignored
+                data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+                for t_ns, rec in INDEX_ENTRY.iter_unpack(data):
+                    if rec >= self.count:
+                        break
+                    ts.append(t_ns); recs.append(rec)
+        except OSError:
+            ts, recs = [], []
+        # rebuild whatever the sidecar is missing (crash, or copied without it)
+        start = recs[-1] + INDEX_EVERY if recs else 0
+        for rec in range(start, self.count, INDEX_EVERY):
+            ts.append(self.record(rec)[0]); recs.append(rec)
+        return ts, recs
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+
+    def record(self, i: int):
+        """(t_ns, kind, payload bytes) of record i."""
+        t_ns, kind, n, payload = RECORD.unpack_from(self._mm, HEADER.size + i * RECORD_LEN)
+        return t_ns, kind, payload[:n]
+
+    def records(self, start: int = 0, stop: int | None = None):
+        """Structured NumPy view (no copy) of records [start, stop)."""
+        stop = self.count if stop is None else min(stop, self.count)
+        return np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=stop - start,
+                             offset=HEADER.size + start * RECORD_LEN)
+
+    @property
+    def t_start(self) -> int:
+        return self.record(0)[0] if self.count else self.t0_ns
+
+    @property
+    def t_end(self) -> int:
+        return self.record(self.count - 1)[0] if self.count else self.t0_ns
+
+    def seek(self, t_ns: int) -> int:
+        """Index of the first record stamped at or after t_ns."""
+        # last entry strictly before t_ns: one batch shares a timestamp, so an entry
+        # stamped t_ns can sit past the first record stamped t_ns
+        k = bisect.bisect_left(self._index_t, t_ns) - 1
+        i = self._index_rec[k] if k >= 0 else 0
+        while i < self.count and self.record(i)[0] < t_ns:
+            i += 1
+        return i
+
+    def iter_records(self, start: int = 0, stop: int | None = None, kind: int | None = None):
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(start, stop):
+            rec = self.record(i)
+            if kind is None or rec[1] == kind:
+                yield rec
@@ -0,0 +1,144 @@
+from PyQt6 import QtCore, QtGui
+from PyQt6.QtGui import QGuiApplication
+
+from profiler import span
+
+
+class RenderScheduler(QtCore.QObject):
+    """
+    Coalesces widget updates to one flush per tick of a refresh-rate timer.
+
+    Widgets call mark_dirty() when their model changes instead of update();
+    every tick the `frame` signal fires (pull new data here), then each dirty
+    widget is flushed exactly once. The tick is a PreciseTimer at the screen's
+    refresh rate, capped at max_hz (e.g. 30 on a laptop on battery): it matches
+    the display's rate, not its phase, so a flush can land anywhere in a frame.
+    """
+    frame = QtCore.pyqtSignal()
+
+    def __init__(self, max_hz: float = 60.0, parent=None):
+        super().__init__(parent)
+        self._dirty = {}     # key -> flush callable, insertion ordered
+        self._texts = {}     # label -> pending text
+        self._max_hz = float(max_hz)
+        self._refresh_hz = 60.0
+        screen = QGuiApplication.primaryScreen()
+        if screen is not None and screen.refreshRate() > 0:
+            self._refresh_hz = screen.refreshRate()
+
+        # counters
+        self.marked = 0      # mark_dirty() calls
+        self.coalesced = 0   # marks on something already dirty (update saved)
+        self.painted = 0     # flushes actually done
+        self.ticks = 0
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self._tick)
+        self._apply_interval()
+
+    # --- config ---
+    @property
+    def rate_hz(self) -> float:
+        return min(self._refresh_hz, self._max_hz)
+
+    def set_max_hz(self, hz: float):
+        self._max_hz = max(1.0, float(hz))
+        self._apply_interval()
+
+    def set_screen(self, screen):
+        if screen is not None and screen.refreshRate() > 0:
+            self._refresh_hz = screen.refreshRate()
+            self._apply_interval()
+
+    def _apply_interval(self):
+        self.timer.setInterval(max(1, round(1000.0 / self.rate_hz)))
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    # --- marking ---
+    def mark_dirty(self, key, flush=None):
+        """Schedule `flush` (default: key.update) for the next tick, once."""
+        self.marked += 1
+        if key in self._dirty:
+            self.coalesced += 1
+            return
+        self._dirty[key] = flush or key.update
+
+    def set_text(self, label, text: str):
+        """QLabel.setText deferred to the next tick (only the last text is applied)."""
+        self._texts[label] = text
+        self.mark_dirty(label, lambda: self._flush_text(label))
+
+    def _flush_text(self, label):
+        text = self._texts.pop(label)
+        if label.text() != text:
+            label.setText(text)
+
+    # --- tick ---
+    def _tick(self):
+        self.ticks += 1
+        self.frame.emit()
+        dirty, self._dirty = self._dirty, {}
+        with span("flush"):
+            for flush in dirty.values():
+                flush()
+        self.painted += len(dirty)
+
+    def stats(self) -> dict:
+        return {
+            "rate_hz": self.rate_hz,
+            "ticks": self.ticks,
+            "marked": self.marked,
+            "coalesced": self.coalesced,
+            "painted": self.painted,
+        }
+
+
+class ScheduledUpdates:
+    """Mixin for widgets: schedule_update() goes through a RenderScheduler if one is set."""
+    scheduler: RenderScheduler | None = None
+
+    def schedule_update(self, flush=None):
+        if self.scheduler is None:
+            (flush or self.update)()
+        else:
+            self.scheduler.mark_dirty(self, flush)
+
+
+class StaticLayer:
+    """
+    Cached pixmap of the parts of a widget that don't change between updates.
+    draw(painter, widget) is only re-run when the widget's size or device pixel
+    ratio changes (resize, moving to another screen).
+    """
+    def __init__(self, draw):
+        self._draw = draw
+        self._pix = None
+        self.rebuilds = 0
+
+    def invalidate(self):
+        self._pix = None
+
+    def pixmap(self, widget) -> QtGui.QPixmap:
+        dpr = widget.devicePixelRatioF()
+        size = widget.size()
+        pix = self._pix
+        if pix is None or pix.devicePixelRatio() != dpr or pix.deviceIndependentSize().toSize() != size:
+            pix = QtGui.QPixmap(size * dpr)
+            pix.setDevicePixelRatio(dpr)
+            pix.fill(QtCore.Qt.GlobalColor.transparent)
+            p = QtGui.QPainter(pix)
+            p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+            self._draw(p, widget)
+            p.end()
+            self._pix = pix
+            self.rebuilds += 1
+        return pix
+
+    def paint(self, painter, widget):
+        painter.drawPixmap(0, 0, self.pixmap(widget))
@@ -0,0 +1,143 @@
+import argparse, socket, threading, time
+
+from ingest import IngestWorker, LinkState
+from protocol import PACKET_LEN
+from recorder import KIND_FRAME, LogReader
+from transport import Transport
+
+
+class ReplaySocket(Transport):
+    """
+    Socket stand-in that streams the telemetry frames of a flight log.
+
+    Pass it to IngestWorker as the transport and the UI/estimators see the
+    recorded session exactly as if it came off the drone. speed=1 is real time,
+    speed=N is N x, speed=0 plays as fast as the consumer can read.
+    Motor packets written to it are counted and dropped.
+    """
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = False):
+        self.log = LogReader(path)
+        self.name = f"replay:{path}"
+        self.speed = float(speed)
+        self.loop = loop
+        self._timeout = None
+        self._pos = 0
+        self._seek_to = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._restart_clock(0)
+
+        self.frames_out = 0
+        self.commands_in = 0
+        self._rate_t0 = time.monotonic()
+        self._rate_n = 0
+        self.rate = 0.0          # frames/s delivered, refreshed every half second
+
+    # --- control (any thread) ---
+    def seek(self, t_ns: int):
+        """Continue playback from the first record at or after t_ns (log time)."""
+        with self._lock:
+            self._seek_to = t_ns
+
+    def set_speed(self, speed: float):
+        with self._lock:
+            self.speed = float(speed)
+            self._restart_clock(self._pos)
+
+    @property
+    def position_ns(self) -> int:
+        """Log timestamp of the next record to be played."""
+        i = min(self._pos, len(self.log) - 1)
+        return self.log.record(i)[0] if i >= 0 else self.log.t0_ns
+
+    # --- transport API used by IngestWorker ---
+    def settimeout(self, t):
+        self._timeout = t
+
+    def sendall(self, data: bytes):
+        self.commands_in += 1
+
+    def close(self):
+        self._closed = True
+
+    def _restart_clock(self, pos: int):
+        self._pos = pos
+        self._wall0 = time.monotonic()
+        self._log0 = self.log.record(pos)[0] if pos < len(self.log) else 0
+
+    def _due_ns(self) -> int:
+        """Log time that playback has reached by now."""
+        if self.speed <= 0:
+            return 1 << 62
+        return self._log0 + int((time.monotonic() - self._wall0) * self.speed * 1e9)
+
+    def recv_into(self, buf) -> int:
+        room = len(buf) // PACKET_LEN
+        out = memoryview(buf)
+        while True:
+            if self._closed:
+                return 0
+            with self._lock:
+                if self._seek_to is not None:
+                    self._restart_clock(self.log.seek(self._seek_to))
+                    self._seek_to = None
+
+            if self._pos >= len(self.log):
+                if not self.loop:
+                    self._count(0, final=True)
+                    return 0
+                self._restart_clock(0)
+
+            # wait (bounded by the socket timeout) until the next record is due
+            t_next = self.log.record(self._pos)[0]
+            if self.speed > 0:
+                wait = (t_next - self._due_ns()) / 1e9 / self.speed
+                if wait > 0:
+                    if self._timeout is not None and wait > self._timeout:
+                        time.sleep(self._timeout)
+                        raise socket.timeout()
+                    time.sleep(max(wait, 0.001))   # >= 1 ms so fast replays arrive in batches
+
+            due = self._due_ns()
+            n = 0
+            while self._pos < len(self.log) and n < room:
+                t_ns, kind, payload = self.log.record(self._pos)
+                if t_ns > due:
+                    break
+                self._pos += 1
+                if kind == KIND_FRAME:
+                    out[n*PACKET_LEN:(n+1)*PACKET_LEN] = payload
+                    n += 1
+            if n:
+                self._count(n)
+                return n * PACKET_LEN
+            # only motor commands were due; keep going
+
+    def _count(self, n: int, final: bool = False):
+        self.frames_out += n
+        self._rate_n += n
+        now = time.monotonic()
+        if now - self._rate_t0 >= 0.5 or (final and self._rate_n):
+            self.rate = self._rate_n / (now - self._rate_t0)
+            self._rate_t0, self._rate_n = now, 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a flight log through the ingest pipeline (no UI).")
+    ap.add_argument("log")
+    ap.add_argument("--speed", type=float, default=0.0, help="1 = real time, 0 = as fast as possible")
+    args = ap.parse_args()
+
+    player = ReplaySocket(args.log, args.speed)
+    worker = IngestWorker(player)
+    t0 = time.perf_counter()
+    worker.start()
+    worker.join()
+    dt = time.perf_counter() - t0
+    if worker.state != LinkState.closed:
+        raise SystemExit(f"replay failed: {worker.error}")
+    print(f"{player.frames_out} frames in {dt:.3f} s = {player.frames_out / dt:,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse, os, struct, sys, time
+from multiprocessing import resource_tracker, shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from protocol import FRAME_DTYPE, IMU_FIELDS
+
+# Decoded telemetry in shared memory, for scripts in other processes (the firmware
+# serves one socket, and the UI or hub already holds it). One writer, any number
+# of readers, no copies and no serialization: a reader maps the segment and gets
+# NumPy views straight onto it.
+#
+#   header (64 bytes): magic, version, record size, capacity, then two u64
+#                      counters `begin` and `head` (records ever written) and
+#                      the writer's pid
+#   ring: 2 * capacity records of SHM_DTYPE
+#
+# Record j is stored twice, at slots j % capacity and j % capacity + capacity, so
+# the newest n records (n <= capacity) are always one contiguous slice. The
+# counters make a seqlock: the writer bumps `begin` to the end of a batch, writes
+# the records, then sets `head` to the same value. Readers never write anything,
+# so writer cost does not depend on how many there are. A view of records
+# [start, head) stays intact while begin <= start + capacity; check with
+# ShmRingReader.valid() after using it, or take a checked copy with read().
+# Counter stores are single aligned 8-byte writes, done in program order.
+# A writer only replaces an existing segment of the same name if the pid in it
+# is gone (a crash); while that writer lives, a second one refuses to start.
+# Needs NumPy.
+
+MAGIC = b"DRNSHM1\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQ")   # magic, version, record size, pad, capacity
+HEADER_LEN = 64
+_BEGIN, _HEAD, _PID = 3, 4, 5      # u64 slots after HEADER: counters, writer pid
+NAME_DEFAULT = "drone-telemetry"
+
+if np is not None:
+    SHM_DTYPE = np.dtype([('t_ns', '<i8'), ('bat_adc', '<u2'), ('motors', 'u1', (4,))] +
+                         [(f, '<i2') for f in IMU_FIELDS] + [('pad', 'u1', (4,))])
+    assert SHM_DTYPE.itemsize == 32
+    # the frame fields sit together, so a whole frame converts in one assignment
+    _STAGE_DTYPE = np.dtype({'names': ['t_ns', 'frame'], 'formats': ['<i8', FRAME_DTYPE.newbyteorder('<')],
+                             'offsets': [0, 8], 'itemsize': SHM_DTYPE.itemsize})
+
+_OWNED = set()             # rings this process writes (see ShmRingReader)
+
+
+def _alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        return True        # a segment outlives nobody there: if it exists, its writer is running
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True        # someone else's process
+    return True
+
+
+def _layout(buf):
+    counters = np.ndarray(HEADER_LEN // 8, np.uint64, buffer=buf)
+    capacity = HEADER.unpack_from(buf)[4]
+    ring = np.ndarray(2 * capacity, SHM_DTYPE, buffer=buf, offset=HEADER_LEN)
+    return counters, ring, capacity
+
+
+class ShmRingWriter:
+    """
+    Publishes decoded frames into a named shared-memory ring. A segment left
+    behind by a writer that crashed is replaced. close() unlinks it.
+    """
+    def __init__(self, name: str = NAME_DEFAULT, capacity: int = 1 << 16):
+        size = HEADER_LEN + 2 * capacity * SHM_DTYPE.itemsize
+        if name in _OWNED:
+            raise FileExistsError(f"{name}: this process already writes it")
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            old = shared_memory.SharedMemory(name)
+            ours = len(old.buf) >= HEADER_LEN and HEADER.unpack_from(old.buf)[0] == MAGIC
+            pid = struct.unpack_from("<Q", old.buf, _PID * 8)[0] if ours else 0
+            old.close()
+            if not ours or _alive(pid):
+                raise FileExistsError(f"{name}: in use" + (f" by a live writer (pid {pid})" if ours else
+                                                            " by something else")) from None
+            old = shared_memory.SharedMemory(name)      # left by a writer that crashed
+            old.close()
+            old.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = name
+        _OWNED.add(name)
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, SHM_DTYPE.itemsize, 0, capacity)
+        self._counters, self.ring, self.capacity = _layout(self.shm.buf)
+        self._counters[_BEGIN] = self._counters[_HEAD] = 0
+        self._counters[_PID] = os.getpid()
+        self.head = 0
+        self._words = self.ring.view(np.uint64).reshape(-1, 4)    # copies as plain words
+        self._batch = np.zeros(64, _STAGE_DTYPE)
+
+    def write(self, frames, t_ns: int):
+        """Append a batch of frames (FRAME_DTYPE array), all stamped t_ns."""
+        k = len(frames)
+        if not k:
+            return
+        if k > self.capacity:
+            frames = frames[-self.capacity:]
+            self.head += k - self.capacity
+            k = self.capacity
+        if len(self._batch) < k:
+            self._batch = np.zeros(max(k, 2 * len(self._batch)), _STAGE_DTYPE)
+        stage = self._batch[:k]
+        stage['t_ns'] = t_ns
+        stage['frame'] = frames
+        rec = self._batch.view(np.uint64).reshape(-1, 4)[:k]
+        ring, cap, head = self._words, self.capacity, self.head
+        end = head + k
+        self._counters[_BEGIN] = end
+        p = head % cap
+        ring[p:p + k] = rec                       # may run into the upper copy: that is its mirror
+        a = min(k, cap - p)
+        ring[p + cap:p + cap + a] = rec[:a]
+        if a < k:
+            ring[:k - a] = rec[a:]
+        self._counters[_HEAD] = end
+        self.head = end
+
+    def close(self):
+        self._counters[_PID] = 0
+        del self._counters, self.ring, self._words
+        _OWNED.discard(self.name)
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ShmRingReader:
+    """Maps a writer's ring read-only. Views alias live memory; see valid()."""
+    def __init__(self, name: str = NAME_DEFAULT):
+        try:
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:         # before 3.13 attaching also registers for unlink at exit
+            self.shm = shared_memory.SharedMemory(name)
+            if name not in _OWNED:    # same process: that registration is the writer's
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        magic, version, rec_size, _, _ = HEADER.unpack_from(self.shm.buf)
+        if magic != MAGIC or version != VERSION or rec_size != SHM_DTYPE.itemsize:
+            self.shm.close()
+            raise ValueError(f"{name}: not a telemetry ring (or a different version)")
+        self.name = name
+        self._counters, self.ring, self.capacity = _layout(self.shm.buf)
+
+    @property
+    def head(self) -> int:
+        """Records written so far."""
+        return int(self._counters[_HEAD])
+
+    def valid(self, start: int) -> bool:
+        """True if records from `start` on have not been overwritten (yet)."""
+        return int(self._counters[_BEGIN]) <= start + self.capacity
+
+    def latest(self, n: int):
+        """(view, start): the newest n records (fewer if not written yet), zero-copy."""
+        head = self.head
+        n = min(n, head, self.capacity)
+        p = head % self.capacity + self.capacity
+        return self.ring[p - n:p], head - n
+
+    def since(self, pos: int):
+        """(view, start, lost) of the records after index pos; lost = overwritten ones skipped."""
+        head = self.head
+        start = max(pos, head - self.capacity)
+        view, start = self.latest(head - start)
+        return view, start, start - pos
+
+    def read(self, n: int, retries: int = 8):
+        """Checked copy of the newest n records."""
+        for _ in range(retries):
+            view, start = self.latest(n)
+            out = view.copy()
+            if self.valid(start):
+                return out
+        raise RuntimeError(f"{self.name}: writer keeps lapping the reader")
+
+    def close(self):
+        del self._counters, self.ring
+        self.shm.close()
+
+
+def main():
+    from protocol import A_SENS, G_SENS
+    ap = argparse.ArgumentParser(description="Watch the shared-memory telemetry ring (UI.py/hub.py --shm).")
+    ap.add_argument("name", nargs="?", default=NAME_DEFAULT)
+    ap.add_argument("--window", type=int, default=100, help="samples averaged per line")
+    args = ap.parse_args()
+    try:
+        reader = ShmRingReader(args.name)
+    except FileNotFoundError:
+        sys.exit(f"no ring named {args.name!r}: start UI.py or hub.py with --shm")
+    last, t_last = reader.head, time.monotonic()
+    try:
+        while True:
+            time.sleep(1.0)
+            rec = reader.read(args.window)
+            now, head = time.monotonic(), reader.head
+            if not len(rec):
+                continue
+            acc = np.stack([rec[f] for f in ('ax', 'ay', 'az')], 1) / A_SENS
+            gyr = np.stack([rec[f] for f in ('gx', 'gy', 'gz')], 1) / G_SENS
+            print(f"{(head - last) / (now - t_last):7.1f} Hz  head {head}  bat_adc {int(rec['bat_adc'][-1])}  "
+                  f"motors {rec['motors'][-1].tolist()}  acc {np.round(acc.mean(0), 3).tolist()} g  "
+                  f"gyro rms {np.round(np.sqrt((gyr ** 2).mean(0)), 2).tolist()} °/s")
+            last, t_last = head, now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import argparse, math, random, socket, threading, time
+from dataclasses import dataclass
+
+import battery
+from protocol import A_SENS, FRAME_STRUCT, G_SENS, V2_HELLO, encode_v2
+from transport import UDP_SEQ, seq_newer
+
+# Stand-in for src/main.cpp: TCP server on 2323, one client at a time, reads 4-byte
+# motor packets (FL, FR, BL, BR in servo degrees 0..180) and streams 20-byte frames.
+# --transport udp serves the same model over transport.UdpTransport's datagrams.
+# Over TCP the framed v2 format (hello, sync, seq, timestamp, CRC) is the default,
+# like the firmware's TELEMETRY_V2; --protocol 1 sends bare 20-byte frames.
+
+TEMP_RAW = 3000          # ~30 C
+
+
+class DroneModel:
+    """
+    Small rigid-body quad on a test stand: first-order motor lag, thrust ~ speed^2,
+    roll/pitch/yaw torques from motor differences, and a 3S pack with internal
+    resistance so the voltage sags under load.
+    """
+    def __init__(self, cells: int = 3, capacity_mah: float = 2200, r_int: float = 0.06,
+                 imbalance: float = 0.0, noise: float = 0.01, seed: int | None = None):
+        self.rng = random.Random(seed)
+        self.cmd = [0, 0, 0, 0]            # FL, FR, BL, BR as received
+        self.w = [0.0] * 4                 # normalized motor speed 0..1
+        self.tau_motor = 0.05
+        self.roll = self.pitch = self.yaw = 0.0    # rad
+        self.p = self.q = self.r = 0.0             # rad/s
+        self.torque_gain = 40.0            # rad/s^2 per unit of thrust difference
+        self.yaw_gain = 4.0
+        self.damping = 2.0
+        self.imbalance = imbalance         # constant roll torque, e.g. off-centre battery
+        self.noise = noise                 # accel noise, g
+        self.cells = cells
+        self.capacity_as = capacity_mah * 3.6
+        self.r_int = r_int
+        self.i_max = 60.0                  # pack current at full throttle on all motors, A
+        self.soc = 1.0
+        self.volts = self._ocv()
+        self.t = 0.0
+
+    def set_motors(self, cmd):
+        self.cmd = [max(0, min(180, int(c))) for c in cmd]
+
+    def _ocv(self) -> float:
+        pct = self.soc * 100
+        table = battery.OCV_TABLE
+        for (v1, p1), (v2, p2) in zip(table, table[1:]):
+            if p2 <= pct <= p1:
+                return self.cells * (v2 + (v1 - v2) * (pct - p2) / max(1e-9, p1 - p2))
+        return self.cells * (table[0][0] if pct > 100 else table[-1][0])
+
+    def step(self, dt: float):
+        self.t += dt
+        a = dt / (self.tau_motor + dt)
+        for i in range(4):
+            self.w[i] += a * (self.cmd[i] / 180.0 - self.w[i])
+        fl, fr, bl, br = (w * w for w in self.w)
+
+        # torques -> rates -> angles; the stand limits tilt to +-60 deg
+        self.p += dt * (self.torque_gain * ((fl + bl) - (fr + br)) + self.imbalance - self.damping * self.p)
+        self.q += dt * (self.torque_gain * ((fl + fr) - (bl + br)) - self.damping * self.q)
+        self.r += dt * (self.yaw_gain * ((fl + br) - (fr + bl)) - self.damping * self.r)
+        lim = math.radians(60)
+        self.roll += self.p * dt
+        self.pitch += self.q * dt
+        self.yaw = (self.yaw + self.r * dt + math.pi) % (2 * math.pi) - math.pi
+        if abs(self.roll) > lim:
+            self.roll, self.p = math.copysign(lim, self.roll), 0.0
+        if abs(self.pitch) > lim:
+            self.pitch, self.q = math.copysign(lim, self.pitch), 0.0
+
+        # battery: sag = I * R, charge drawn by I * dt
+        current = self.i_max * (fl + fr + bl + br) / 4
+        self.soc = max(0.0, self.soc - current * dt / self.capacity_as)
+        self.volts = self._ocv() - current * self.r_int
+
+    def frame(self) -> bytes:
+        rng = self.rng
+        # gravity in body frame + noise + vibration from the spinning props
+        vib = sum(w * math.sin(2 * math.pi * (40 + 160 * w) * self.t + i) for i, w in enumerate(self.w)) * 0.05
+        ax = -math.sin(self.pitch) + rng.gauss(0, self.noise) + vib
+        ay = math.sin(self.roll) * math.cos(self.pitch) + rng.gauss(0, self.noise) + vib
+        az = math.cos(self.roll) * math.cos(self.pitch) + rng.gauss(0, self.noise)
+        gx, gy, gz = (math.degrees(v) * G_SENS for v in (self.p, self.q, self.r))
+        adc = round(self.volts / battery.VBAT_RATIO * battery.ADC_MAX)
+
+        def i16(v):
+            return max(-32768, min(32767, int(v)))
+        return FRAME_STRUCT.pack(max(0, min(4095, adc)), *self.cmd,
+                                 i16(ax * A_SENS), i16(ay * A_SENS), i16(az * A_SENS), TEMP_RAW,
+                                 i16(gx), i16(gy), i16(gz))
+
+
+@dataclass
+class Faults:
+    """Link misbehaviour to inject. Times in ms, probabilities per frame/send."""
+    jitter_ms: float = 0.0        # random extra delay before each send
+    burst_every_ms: float = 0.0   # hold frames back this often...
+    burst_hold_ms: float = 0.0    # ...for this long, then send them all at once
+    fragment: float = 0.0         # chance a send is split into random partial segments (TCP)
+    stall_prob: float = 0.0       # chance per send of a stall...
+    stall_ms: float = 0.0         # ...of this length
+    loss: float = 0.0             # chance a datagram is dropped (UDP)
+    drop_byte: float = 0.0        # chance per send that one byte goes missing (TCP)
+    insert_byte: float = 0.0      # chance per send that a junk byte is added (TCP)
+
+
+class _TcpPeer:
+    """The firmware's stream: 4-byte motor packets in, frames out back to back."""
+    def __init__(self, client, server):
+        self.client, self.srv = client, server
+        self._rx = bytearray()
+        client.settimeout(0)
+
+    def poll(self):
+        """Motor packets received since the last call; None once the client is gone."""
+        try:
+            data = self.client.recv(4096)
+            if not data:
+                return None
+            self._rx.extend(data)
+        except BlockingIOError:
+            pass
+        except OSError:
+            return None
+        out = [bytes(self._rx[i:i + 4]) for i in range(0, len(self._rx) - 3, 4)]
+        del self._rx[:4 * len(out)]
+        return out
+
+    def send(self, data: bytes) -> bool:
+        f, rng, client = self.srv.faults, self.srv.rng, self.client
+        if f.drop_byte and rng.random() < f.drop_byte:
+            i = rng.randrange(len(data))
+            data = data[:i] + data[i + 1:]
+        if f.insert_byte and rng.random() < f.insert_byte:
+            i = rng.randrange(len(data) + 1)
+            data = data[:i] + bytes([rng.randrange(256)]) + data[i:]
+        try:
+            client.settimeout(1.0)
+            if f.fragment and rng.random() < f.fragment and len(data) > 1:
+                # split at random points, including mid-frame
+                i = 0
+                while i < len(data):
+                    j = min(len(data), i + rng.randint(1, 24))
+                    client.sendall(data[i:j])
+                    i = j
+                    time.sleep(0.0002)
+            else:
+                client.sendall(data)
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                client.settimeout(0)
+            except OSError:
+                pass
+
+
+class _UdpPeer:
+    """
+    transport.UdpTransport's other end: one sequenced frame per datagram out, one
+    sequenced motor packet per datagram in (stale ones ignored). The client is
+    whoever last said hello; it is dropped after `idle_s` of silence.
+    """
+    def __init__(self, sock, server, idle_s: float = 2.0):
+        self.sock, self.srv = sock, server
+        self.idle_s = idle_s
+        self.addr = None
+        self._heard = 0.0
+        self._tx_seq = 0
+        self._rx_seq = None
+        self.stale = 0
+
+    def poll(self):
+        out = []
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(64)
+            except (BlockingIOError, ConnectionResetError):
+                break
+            except OSError:
+                return None
+            if len(data) < UDP_SEQ.size:
+                continue
+            if addr != self.addr:
+                self.addr, self._rx_seq = addr, None      # new (or restarted) client
+            self._heard = time.monotonic()
+            seq = UDP_SEQ.unpack_from(data)[0]
+            if len(data) != UDP_SEQ.size + 4:
+                continue                                   # hello / keep-alive
+            if self._rx_seq is not None and not seq_newer(seq, self._rx_seq):
+                self.stale += 1
+                continue
+            self._rx_seq = seq
+            out.append(data[UDP_SEQ.size:])
+        if self.addr is not None and time.monotonic() - self._heard > self.idle_s:
+            return None
+        return out
+
+    def send(self, data: bytes) -> bool:
+        f, rng = self.srv.faults, self.srv.rng
+        for i in range(0, len(data), FRAME_STRUCT.size):
+            self._tx_seq = (self._tx_seq + 1) & 0xFFFFFFFF
+            if f.loss and rng.random() < f.loss:
+                continue
+            try:
+                self.sock.sendto(UDP_SEQ.pack(self._tx_seq) + data[i:i + FRAME_STRUCT.size], self.addr)
+            except (BlockingIOError, ConnectionRefusedError):
+                pass          # full buffer or client gone: that frame is lost, like on air
+            except OSError:
+                return False
+        return True
+
+
+class SimServer:
+    """
+    Serves DroneModel telemetry at rate_hz to one client at a time, like the
+    firmware. transport="tcp" is the firmware's stream; "udp" speaks
+    transport.UdpTransport's datagram framing. protocol defaults to 2 (v2
+    frames) over TCP, as the firmware does, and 1 over UDP.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 2323, rate_hz: float = 100.0,
+                 faults: Faults | None = None, model: DroneModel | None = None, seed: int | None = None,
+                 transport: str = "tcp", protocol: int | None = None):
+        self.rate_hz = float(rate_hz)
+        self.faults = faults or Faults()
+        self.model = model or DroneModel(seed=seed)
+        self.rng = random.Random(seed)
+        self.transport = transport
+        if protocol is None:
+            protocol = 2 if transport == "tcp" else 1
+        if protocol not in (1, 2) or (protocol == 2 and transport != "tcp"):
+            raise ValueError(f"protocol {protocol} not available over {transport}")
+        self.protocol = protocol
+        self.frames_sent = 0
+        self.packets_in = 0
+        self.last_packet_t = 0.0     # time.monotonic() of the last motor packet applied
+        self._halt = threading.Event()
+        if transport == "tcp":
+            self._srv = socket.create_server((host, port))
+            self._srv.settimeout(0.2)
+        elif transport == "udp":
+            self._srv = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._srv.bind((host, port))
+            self._srv.setblocking(False)
+        else:
+            raise ValueError(f"unknown transport {transport!r} (tcp or udp)")
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._srv.getsockname()[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="sim-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._halt.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._srv.close()
+
+    def serve_forever(self):
+        while not self._halt.is_set():
+            if self.transport == "udp":
+                peer = _UdpPeer(self._srv, self)
+                while peer.addr is None and not self._halt.is_set():
+                    if peer.poll() is None:
+                        return
+                    time.sleep(0.005)
+                self._session(peer)
+            else:
+                try:
+                    client, _ = self._srv.accept()
+                except socket.timeout:
+                    continue
+                with client:
+                    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self._session(_TcpPeer(client, self))
+            self.model.set_motors((0, 0, 0, 0))   # firmware zeroes motors on disconnect
+
+    def _session(self, peer):
+        period = 1.0 / self.rate_hz
+        f = self.faults
+        t0 = time.monotonic()
+        n = 0
+        pending = bytearray()
+        queued = 0
+        if self.protocol == 2 and not peer.send(V2_HELLO):
+            return
+        next_burst = t0 + f.burst_every_ms / 1000 if f.burst_every_ms else None
+        hold_until = 0.0
+        while not self._halt.is_set():
+            packets = peer.poll()
+            if packets is None:
+                return
+            for pkt in packets:
+                self.model.set_motors(pkt)
+                self.packets_in += 1
+                self.last_packet_t = time.monotonic()
+
+            # generate every frame due by now (absolute schedule, no drift)
+            now = time.monotonic()
+            due = int((now - t0) * self.rate_hz)
+            while n < due:
+                self.model.step(period)
+                if self.protocol == 2:
+                    pending += encode_v2(self.model.frame(), n, int(self.model.t * 1e6))
+                else:
+                    pending += self.model.frame()
+                n += 1
+                queued += 1
+
+            if next_burst is not None and now >= next_burst:
+                hold_until = now + f.burst_hold_ms / 1000
+                next_burst += f.burst_every_ms / 1000
+            if pending and now >= hold_until:
+                if f.jitter_ms:
+                    time.sleep(self.rng.random() * f.jitter_ms / 1000)
+                if f.stall_prob and self.rng.random() < f.stall_prob:
+                    time.sleep(f.stall_ms / 1000)
+                if not peer.send(bytes(pending)):
+                    return
+                self.frames_sent += queued
+                pending.clear()
+                queued = 0
+            time.sleep(min(period, 0.001))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulated drone speaking the firmware's TCP protocol.")
+    ap.add_argument("--transport", choices=("tcp", "udp"), default="tcp")
+    ap.add_argument("--protocol", type=int, choices=(1, 2),
+                    help="1 = bare v1 frames, 2 = framed v2 (TCP only); default: 2 over tcp, 1 over udp")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2323)
+    ap.add_argument("--rate", type=float, default=100.0, help="telemetry frames/s (firmware: 100)")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--burst-every-ms", type=float, default=0.0)
+    ap.add_argument("--burst-hold-ms", type=float, default=0.0)
+    ap.add_argument("--fragment", type=float, default=0.0, help="probability a send is split up")
+    ap.add_argument("--stall-prob", type=float, default=0.0)
+    ap.add_argument("--stall-ms", type=float, default=0.0)
+    ap.add_argument("--loss", type=float, default=0.0, help="probability a datagram is dropped (udp)")
+    ap.add_argument("--drop-byte", type=float, default=0.0, help="probability a send loses a byte (tcp)")
+    ap.add_argument("--insert-byte", type=float, default=0.0, help="probability a send gains a junk byte (tcp)")
+    ap.add_argument("--imbalance", type=float, default=0.0, help="constant roll torque, rad/s^2")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+
+    faults = Faults(args.jitter_ms, args.burst_every_ms, args.burst_hold_ms,
+                    args.fragment, args.stall_prob, args.stall_ms, args.loss,
+                    args.drop_byte, args.insert_byte)
+    srv = SimServer(args.host, args.port, args.rate, faults,
+                    DroneModel(imbalance=args.imbalance, seed=args.seed), seed=args.seed,
+                    transport=args.transport, protocol=args.protocol)
+    print(f"sim drone on {args.transport}://{args.host}:{srv.address[1]} at {args.rate:g} Hz")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse, math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from protocol import A_SENS, FRAME_DTYPE, G_SENS
+
+# Welch power spectral density of the six IMU axes, streaming. Samples are kept
+# in a fixed history of the last nfft rows; each batch is laid after it in a
+# reused work buffer, every window that completes (one per `hop` samples) is
+# Hann-windowed and FFT'd in one batched call, and the per-window PSDs are
+# averaged: exponentially over ~`averages` windows for a live view, or evenly
+# over every window for a whole log (averages=None). Per-sample cost is the same
+# for 1 sample or a million, so live use stays flat and offline runs are linear.
+# The IMU is read once per loop, so anything above fs/2 (50 Hz) shows up aliased.
+# No Qt in here; the live plot is UI.SpectrumView. Needs NumPy.
+
+AXES = ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+UNITS = ('g', 'g', 'g', '°/s', '°/s', '°/s')
+SAMPLE_HZ = 100.0       # firmware loop: one frame per 10 ms
+
+
+def imu_values(frames):
+    """(n, 6) float64 of the IMU axes in g and deg/s."""
+    out = np.empty((len(frames), len(AXES)))
+    for j, f in enumerate(AXES):
+        out[:, j] = frames[f]
+    out[:, :3] /= A_SENS
+    out[:, 3:] /= G_SENS
+    return out
+
+
+class WelchSpectrum:
+    """
+    Streaming Welch PSD over nfft-sample Hann windows overlapping by `overlap`.
+    psd is (nfft // 2 + 1, 6) in unit²/Hz (one-sided); freqs in Hz.
+    """
+    def __init__(self, nfft: int = 256, overlap: float = 0.5, fs: float = SAMPLE_HZ,
+                 averages: int | None = 16):
+        self.nfft = int(nfft)
+        self.hop = max(1, int(round(self.nfft * (1 - overlap))))
+        self.fs = float(fs)
+        self.averages = averages
+        self.window = np.hanning(self.nfft)[:, None]
+        self._scale = 1.0 / (self.fs * float((self.window ** 2).sum()))
+        self.freqs = np.fft.rfftfreq(self.nfft, 1.0 / self.fs)
+        self.psd = np.zeros((len(self.freqs), len(AXES)))
+        self.windows = 0          # windows averaged so far
+        self.samples = 0          # samples fed so far
+        self._hist = np.zeros((self.nfft, len(AXES)))     # last nfft samples, oldest first
+        self._work = np.zeros((2 * self.nfft, len(AXES)))
+        self._next_end = self.nfft                         # sample count that completes the next window
+
+    def reset(self):
+        self.psd.fill(0.0)
+        self.windows = self.samples = 0
+        self._hist.fill(0.0)
+        self._next_end = self.nfft
+
+    def feed_frames(self, frames):
+        self.feed(imu_values(frames))
+
+    def feed(self, values):
+        """values: (k, 6) in g / deg/s, oldest first."""
+        k = len(values)
+        if not k:
+            return
+        n = self.nfft
+        total = self.samples + k
+        if total >= self._next_end:
+            if len(self._work) < n + k:
+                self._work = np.zeros((max(n + k, 2 * len(self._work)), len(AXES)))
+            work = self._work[:n + k]          # absolute samples [samples - n, total)
+            work[:n] = self._hist
+            work[n:] = values
+            ends = np.arange(self._next_end, total + 1, self.hop)
+            starts = ends - self.samples          # row in `work` where each window starts
+            segs = np.lib.stride_tricks.sliding_window_view(work, n, axis=0)[starts]   # (m, 6, n)
+            self._add_windows(segs.transpose(0, 2, 1))
+            self._next_end = int(ends[-1]) + self.hop
+        if k >= n:
+            self._hist[:] = values[-n:]
+        else:
+            self._hist[:-k] = self._hist[k:]
+            self._hist[-k:] = values
+        self.samples = total
+
+    def _add_windows(self, segs):
+        seg = (segs - segs.mean(axis=1, keepdims=True)) * self.window     # drop DC (gravity on az)
+        p = np.abs(np.fft.rfft(seg, axis=1)) ** 2 * self._scale
+        p[:, 1:] *= 2.0
+        if self.nfft % 2 == 0:
+            p[:, -1] /= 2.0                   # Nyquist bin is not doubled
+        m = len(p)
+        if self.averages is None or self.windows == 0 and m >= self.averages:
+            self.psd = (self.psd * self.windows + p.sum(axis=0)) / (self.windows + m)
+        else:
+            a = 1.0 / self.averages
+            if self.windows == 0:
+                self.psd, p, m = p[0], p[1:], m - 1
+            w = a * (1 - a) ** np.arange(m - 1, -1, -1)
+            self.psd = (1 - a) ** m * self.psd + np.tensordot(w, p, axes=1)
+        self.windows += len(segs)
+
+    def peaks(self, axis: int, count: int = 3, min_hz: float = 1.0):
+        """The `count` strongest local maxima of one axis above min_hz: [(Hz, unit²/Hz)]."""
+        p = self.psd[:, axis]
+        i = np.flatnonzero((p[1:-1] > p[:-2]) & (p[1:-1] >= p[2:])) + 1
+        i = i[self.freqs[i] >= min_hz]
+        i = i[np.argsort(p[i])[::-1][:count]]
+        return [(float(self.freqs[j]), float(p[j])) for j in i]
+
+
+def main():
+    from recorder import KIND_FRAME, LogReader
+    ap = argparse.ArgumentParser(description="Vibration spectrum (Welch PSD) of a flight log's IMU axes.")
+    ap.add_argument("log")
+    ap.add_argument("--nfft", type=int, default=256)
+    ap.add_argument("--fs", type=float, default=SAMPLE_HZ, help="IMU sample rate, Hz")
+    ap.add_argument("--peaks", type=int, default=3)
+    args = ap.parse_args()
+
+    log = LogReader(args.log)
+    sp = WelchSpectrum(args.nfft, fs=args.fs, averages=None)
+    for start in range(0, len(log), 1 << 16):
+        recs = log.records(start, start + (1 << 16))
+        frames = recs['payload'][recs['kind'] == KIND_FRAME].reshape(-1).view(FRAME_DTYPE)
+        sp.feed_frames(frames)
+    print(f"{sp.samples} samples, {sp.windows} windows of {sp.nfft} at {sp.fs:g} Hz "
+          f"({sp.freqs[1]:.2f} Hz bins)")
+    for j, (axis, unit) in enumerate(zip(AXES, UNITS)):
+        peaks = "  ".join(f"{hz:6.2f} Hz ({psd:.2e})" for hz, psd in sp.peaks(j, args.peaks))
+        rms = math.sqrt(float(sp.psd[1:, j].sum()) * sp.freqs[1])
+        print(f"  {axis}  rms {rms:8.4f} {unit}   {peaks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse, math, os, sys, threading, time
+
+from latency import LatencyHistogram
+from throttle import MOTORS, mix
+
+# Attitude hold on the host. A PID per axis holds roll and pitch at their targets
+# from the newest fused attitude (ingest.TelemetrySnapshot), with the D term on the
+# measured gyro rate so a target step gives no kick. The demands are mixed around
+# the throttle like keyboard input (throttle.mix) and clipped to 0..full.
+# Signs follow the estimator: a positive roll demand raises roll (left motors up);
+# mix()'s pitch is "nose down", which lowers pitch, so the pitch demand goes in
+# negated. Yaw is passed through open loop.
+#
+# The loop runs on its own thread against absolute deadlines (deadline += period,
+# never now + period), so wake-up lateness does not add up into drift; whole
+# periods lost to an overrun are dropped, keeping the phase. The thread asks for
+# SCHED_FIFO where allowed (else a lower nice value): a Qt timer would jitter with
+# painting. Priority alone does not get the GIL back from a busy thread, which
+# only hands it over every sys.getswitchinterval() (5 ms by default), so that is
+# lowered while the loop runs. Wake lateness goes into `jitter`; ticks that ran
+# past the next deadline count as overruns. No fresh telemetry for stale_s stops
+# the motors.
+
+RT_PRIORITY = 10
+SWITCH_INTERVAL_S = 0.0005   # GIL hand-off while the loop runs (Python's default is 5 ms)
+
+
+def _raise_priority() -> str:
+    """Best effort, for the calling thread: SCHED_FIFO, else nice -10, else nothing."""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RT_PRIORITY))
+        return f"SCHED_FIFO {RT_PRIORITY}"
+    except (AttributeError, OSError):
+        pass
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), -10)
+        return "nice -10"
+    except (AttributeError, OSError):
+        return "normal"
+
+
+class PID:
+    """One axis: P and I on the angle error, D on the measured rate. I is clamped to i_limit."""
+    def __init__(self, kp: float, ki: float, kd: float, i_limit: float):
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.i_limit = i_limit
+        self.i = 0.0
+
+    def reset(self):
+        self.i = 0.0
+
+    def update(self, error: float, rate: float, dt: float) -> float:
+        self.i = min(max(self.i + self.ki * error * dt, -self.i_limit), self.i_limit)
+        return self.kp * error + self.i - self.kd * rate
+
+
+class Stabilizer:
+    """
+    Closed-loop motor outputs at rate_hz. source() returns the newest snapshot (or
+    None); send(packet) puts the 4-byte FL, FR, BL, BR packet out and returns True
+    if it went. Gains are motor units per rad (kp), per rad*s (ki) and per rad/s
+    (kd). step() holds the control law and is clock-agnostic, like
+    CommandScheduler.poll(); start() runs it on the control thread.
+    """
+    def __init__(self, source, send, rate_hz: float = 100.0, full: int = 180, authority: float = 40.0,
+                 kp: float = 60.0, ki: float = 40.0, kd: float = 10.0, stale_s: float = 0.2,
+                 realtime: bool = True):
+        self._source = source
+        self._send = send
+        self.rate_hz = float(rate_hz)
+        self.full = full
+        self.authority = authority          # max roll/pitch demand, motor units
+        self.roll_pid = PID(kp, ki, kd, authority / 2)
+        self.pitch_pid = PID(kp, ki, kd, authority / 2)
+        self.stale_ns = int(stale_s * 1e9)
+        self.realtime = realtime
+        self._target = (0.0, 0.0, 0.0, 0.0)   # throttle, roll rad, pitch rad, yaw; replaced wholesale
+        self._last_ns = None
+        self.output = dict.fromkeys(MOTORS, 0)
+        self._halt = threading.Event()
+        self._thread = None
+        self._switch = None
+        self.priority = "normal"
+
+        # stats
+        self.ticks = 0
+        self.sent = 0
+        self.failed = 0
+        self.stale = 0          # ticks without fresh telemetry (motors held at zero)
+        self.overruns = 0       # ticks that ended past the next deadline
+        self.skipped = 0        # deadlines dropped to catch up
+        self.jitter = LatencyHistogram()    # wake-up lateness vs deadline, us
+        self.busy_max_ns = 0
+
+    # --- producer side ---
+    def set_target(self, throttle: float, roll: float = 0.0, pitch: float = 0.0, yaw: float = 0.0):
+        """Throttle in motor units, roll/pitch in rad, yaw demand in motor units."""
+        self._target = (float(throttle), float(roll), float(pitch), float(yaw))
+
+    # --- control law ---
+    def step(self, snap, now_ns: int) -> dict:
+        """Motor outputs for the newest snapshot at now_ns."""
+        throttle, roll_sp, pitch_sp, yaw = self._target
+        dt = 1 / self.rate_hz if self._last_ns is None else min((now_ns - self._last_ns) / 1e9, 0.1)
+        self._last_ns = now_ns
+        if snap is None or now_ns - int(snap.t * 1e9) > self.stale_ns:
+            self.stale += 1
+            throttle = 0.0
+        if throttle <= 0:
+            self.roll_pid.reset()
+            self.pitch_pid.reset()
+            return dict.fromkeys(MOTORS, 0)
+        roll, pitch, _ = snap.attitude
+        p, q, _ = snap.gyro
+        a = self.authority
+        u_roll = min(max(self.roll_pid.update(roll_sp - roll, p, dt), -a), a)
+        u_pitch = min(max(self.pitch_pid.update(pitch_sp - pitch, q, dt), -a), a)
+        return mix(throttle, u_roll, -u_pitch, yaw, self.full)
+
+    def tick(self, now_ns: int | None = None):
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        self.ticks += 1
+        out = self.output = self.step(self._source(), now_ns)
+        if self._send(bytes(out[m] for m in MOTORS)):
+            self.sent += 1
+        else:
+            self.failed += 1
+
+    # --- own thread ---
+    def start(self):
+        self._halt.clear()
+        if self.realtime and self._switch is None:
+            self._switch = sys.getswitchinterval()
+            sys.setswitchinterval(min(self._switch, SWITCH_INTERVAL_S))
+        self._thread = threading.Thread(target=self._run, name="stabilizer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._halt.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._switch is not None:
+            sys.setswitchinterval(self._switch)
+            self._switch = None
+
+    def _run(self):
+        if self.realtime:
+            self.priority = _raise_priority()
+        period = int(1e9 / self.rate_hz)
+        deadline = time.monotonic_ns() + period
+        while not self._halt.wait(max(0, deadline - time.monotonic_ns()) / 1e9):
+            now = time.monotonic_ns()
+            self.jitter.record((now - deadline) / 1000)
+            self.tick(now)
+            end = time.monotonic_ns()
+            self.busy_max_ns = max(self.busy_max_ns, end - now)
+            deadline += period
+            if end > deadline:
+                self.overruns += 1
+                if end - deadline >= period:     # whole periods lost: drop them, keep the phase
+                    missed = (end - deadline) // period
+                    self.skipped += missed
+                    deadline += missed * period
+
+    def stats(self) -> dict:
+        return {
+            "rate_hz": self.rate_hz,
+            "priority": self.priority,
+            "ticks": self.ticks,
+            "sent": self.sent,
+            "failed": self.failed,
+            "stale": self.stale,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitter_p50_us": self.jitter.percentile(50),
+            "jitter_p99_us": self.jitter.percentile(99),
+            "jitter_max_us": self.jitter.max_us,
+            "busy_max_us": self.busy_max_ns / 1000,
+        }
+
+
+def main():
+    from ingest import IngestWorker, LinkState
+    from transport import TRANSPORT_HELP, make_transport
+    ap = argparse.ArgumentParser(description="Hold the drone level from the host (test stand).")
+    ap.add_argument("--host", default="127.0.0.1", help="sim_server.py by default; the drone is 192.168.4.1")
+    ap.add_argument("--port", type=int, default=2323)
+    ap.add_argument("--transport", choices=("tcp", "udp"), default="tcp", help=TRANSPORT_HELP)
+    ap.add_argument("--rate", type=float, default=100.0, help="control loop Hz")
+    ap.add_argument("--throttle", type=float, default=0.0, help="motor units, 0..180 (0: hold the motors off)")
+    ap.add_argument("--arm", action="store_true", help="allow a non-zero throttle: this spins the propellers")
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args()
+    if args.throttle > 0 and not args.arm:
+        sys.exit(f"--throttle {args.throttle:g} spins the motors on {args.host}: add --arm")
+
+    w = IngestWorker(make_transport(args.transport, args.host, args.port))
+    w.start()
+    while w.state in (LinkState.idle, LinkState.connecting):
+        time.sleep(0.01)
+    if w.state != LinkState.connected:
+        sys.exit(w.error or "could not connect")
+    stab = Stabilizer(lambda: w.latest, w.send, args.rate)
+    stab.set_target(args.throttle)
+    stab.start()
+    t_end = time.monotonic() + args.seconds
+    try:
+        while time.monotonic() < t_end and w.state == LinkState.connected:
+            time.sleep(0.5)
+            snap = w.latest
+            if snap is not None:
+                roll, pitch, _ = (math.degrees(v) for v in snap.attitude)
+                st = stab.stats()
+                print(f"roll {roll:+6.2f}°  pitch {pitch:+6.2f}°  motors {list(stab.output.values())}  "
+                      f"jitter p99 {st['jitter_p99_us'] / 1000:.2f} ms  overruns {st['overruns']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stab.stop()
+        w.send(bytes(4))
+        w.stop()
+        w.join()
+    print(stab.stats())
+
+
+if __name__ == "__main__":
+    main()
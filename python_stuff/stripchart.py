@@ -0,0 +1,362 @@
+import math, time
+
+import numpy as np
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+from profiler import profiled
+from render import ScheduledUpdates, StaticLayer
+
+# Scrolling strip charts. Samples go into fixed-size NumPy rings (memory bounded
+# whatever the session length) and are folded, as they arrive, into one min/max
+# pair per pixel column. A refresh therefore draws `width` columns no matter how
+# many samples the window spans: 10 minutes at 1 kHz costs the same as 10 seconds.
+# The raw ring is only re-read when the column layout changes (resize, new span).
+# Columns are rasterized with NumPy into one image per chart (a min..max run of
+# pixels each), which is cheaper than stroking thousands of tiny line segments.
+# LogChart draws a recorded flight the same way, with the columns coming from the
+# log's min/max pyramid (pyramid.py) instead of a ring.
+# Needs NumPy.
+
+
+class SampleRing:
+    """Fixed-capacity (t, value) ring; the oldest samples are overwritten."""
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self.t = np.zeros(self.capacity, dtype=np.float64)
+        self.v = np.zeros(self.capacity, dtype=np.float32)
+        self.count = 0            # samples ever appended
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def extend(self, t, v):
+        t = np.asarray(t, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float32)
+        n = len(t)
+        if n >= self.capacity:
+            t, v = t[-self.capacity:], v[-self.capacity:]
+            self.count += n - self.capacity
+            n = self.capacity
+        i = self.count % self.capacity
+        k = min(n, self.capacity - i)
+        self.t[i:i + k], self.v[i:i + k] = t[:k], v[:k]
+        if k < n:
+            self.t[:n - k], self.v[:n - k] = t[k:], v[k:]
+        self.count += n
+
+    def ordered(self):
+        """(t, v) oldest first (copies)."""
+        n = len(self)
+        start = (self.count - n) % self.capacity
+        idx = (start + np.arange(n)) % self.capacity
+        return self.t[idx], self.v[idx]
+
+
+class MinMaxColumns:
+    """
+    Per-pixel min/max of one series. Column c holds bucket ids b with b % width == c,
+    where b = floor(t / bucket_dt); only the newest `width` buckets are kept.
+    """
+    def __init__(self, width: int, bucket_dt: float):
+        self.width = max(1, int(width))
+        self.bucket_dt = bucket_dt
+        self.lo = np.full(self.width, np.inf, dtype=np.float32)
+        self.hi = np.full(self.width, -np.inf, dtype=np.float32)
+        self.head = None          # newest bucket id seen
+
+    def add(self, t, v):
+        if not len(t):
+            return
+        b = np.floor(np.asarray(t) / self.bucket_dt).astype(np.int64)
+        new_head = int(b[-1]) if self.head is None else max(self.head, int(b[-1]))
+        if self.head is not None and new_head > self.head:
+            if new_head - self.head >= self.width:
+                self.lo.fill(np.inf); self.hi.fill(-np.inf)
+            else:
+                cleared = np.arange(self.head + 1, new_head + 1) % self.width
+                self.lo[cleared], self.hi[cleared] = np.inf, -np.inf
+        self.head = new_head
+        keep = b > new_head - self.width
+        if not keep.all():
+            b, v = b[keep], np.asarray(v)[keep]
+        if not len(b):
+            return
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(b)) + 1))
+        cols = b[starts] % self.width
+        self.lo[cols] = np.minimum(self.lo[cols], np.minimum.reduceat(v, starts))
+        self.hi[cols] = np.maximum(self.hi[cols], np.maximum.reduceat(v, starts))
+
+    def window(self, newest: int):
+        """(lo, hi) for buckets newest-width+1 .. newest, oldest first; empty = inf/-inf."""
+        if self.head is None:
+            return np.full(self.width, np.inf), np.full(self.width, -np.inf)
+        ids = np.arange(newest - self.width + 1, newest + 1)
+        held = (ids <= self.head) & (ids > self.head - self.width)
+        cols = ids % self.width
+        return np.where(held, self.lo[cols], np.inf), np.where(held, self.hi[cols], -np.inf)
+
+
+class _Series:
+    def __init__(self, name, color, capacity):
+        self.name = name
+        self.pen = QtGui.QPen(QtGui.QColor(color), 1)
+        self.argb = QtGui.QColor(color).rgba()      # opaque, so already premultiplied
+        self.ring = SampleRing(capacity)
+        self.cols = None
+
+
+class StripChart(QtWidgets.QWidget, ScheduledUpdates):
+    """
+    Scrolling time plot of a few series over the last `span_s` seconds. y_range
+    fixes the axis, or None autoscales to what is on screen. Timestamps are
+    time.monotonic() seconds; the right edge is "now".
+    """
+    MARGIN_L, MARGIN_R, MARGIN_T, MARGIN_B = 44, 6, 16, 4
+
+    def __init__(self, title: str, span_s: float = 600.0, y_range=None, unit: str = "",
+                 max_rate_hz: float = 200.0, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.span_s = float(span_s)
+        self.unit = unit
+        self.fixed_range = y_range
+        self._range = tuple(y_range) if y_range else (-1.0, 1.0)
+        self.capacity = int(self.span_s * max_rate_hz)
+        self.series = []
+        self._static = StaticLayer(self._draw_static)
+        self._img = None
+        self.setMinimumHeight(90)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Expanding)
+
+    def add_series(self, name: str, color: str) -> int:
+        self.series.append(_Series(name, color, self.capacity))
+        self._static.invalidate()
+        return len(self.series) - 1
+
+    def set_span(self, span_s: float):
+        """Window length; at most the ring's capacity worth of samples can be shown."""
+        self.span_s = float(span_s)
+        for s in self.series:
+            s.cols = None
+        self._static.invalidate()
+        self.schedule_update()
+
+    # --- data ---
+    def append(self, index: int, t, values):
+        s = self.series[index]
+        s.ring.extend(t, values)
+        if s.cols is not None:
+            s.cols.add(t, values)
+        self.schedule_update()
+
+    def _plot_rect(self) -> QtCore.QRectF:
+        return QtCore.QRectF(self.rect()).adjusted(self.MARGIN_L, self.MARGIN_T, -self.MARGIN_R, -self.MARGIN_B)
+
+    def _columns(self, s, width: int):
+        bucket_dt = self.span_s / width
+        if s.cols is None or s.cols.width != width or s.cols.bucket_dt != bucket_dt:
+            s.cols = MinMaxColumns(width, bucket_dt)      # layout changed: refold the ring once
+            t, v = s.ring.ordered()
+            s.cols.add(t, v)
+        return s.cols
+
+    # --- paint ---
+    def _draw_static(self, p, _w):
+        r = self._plot_rect()
+        p.fillRect(self.rect(), QtGui.QColor("#ffffff"))
+        p.setPen(QtGui.QPen(QtGui.QColor("#e4e4e4"), 1))
+        for i in range(1, 4):
+            y = r.top() + r.height() * i / 4
+            p.drawLine(QtCore.QPointF(r.left(), y), QtCore.QPointF(r.right(), y))
+        p.setPen(QtGui.QPen(QtGui.QColor("#aaa"), 1))
+        p.drawRect(r)
+        lo, hi = self._range
+        p.setPen(QtGui.QColor("#666"))
+        font = p.font(); font.setPointSizeF(max(6.0, font.pointSizeF() * 0.8)); p.setFont(font)
+        for frac, val in ((0.0, hi), (1.0, lo), (0.5, (lo + hi) / 2)):
+            y = r.top() + r.height() * frac
+            p.drawText(QtCore.QRectF(0, y - 8, self.MARGIN_L - 4, 16),
+                       QtCore.Qt.AlignmentFlag.AlignRight | QtCore.Qt.AlignmentFlag.AlignVCenter, f"{val:.4g}")
+        caption = self._caption()
+        p.drawText(QtCore.QPointF(r.left(), self.MARGIN_T - 4), caption)
+        x = r.left() + p.fontMetrics().horizontalAdvance(caption) + 12
+        for s in self.series:
+            p.setPen(s.pen)
+            p.drawText(QtCore.QPointF(x, self.MARGIN_T - 4), s.name)
+            x += p.fontMetrics().horizontalAdvance(s.name) + 8
+
+    def _caption(self) -> str:
+        return f"{self.title} [{self.unit}]  last {self.span_s:g} s"
+
+    def _windows(self, width: int):
+        """Per series (lo, hi) of each pixel column, oldest first; empty = inf/-inf."""
+        newest = math.floor(time.monotonic() / (self.span_s / width))
+        return [self._columns(s, width).window(newest) for s in self.series]
+
+    def _draw_overlay(self, p, r):
+        pass
+
+    @staticmethod
+    def _nice_range(lo: float, hi: float):
+        """Round an autoscale range outwards so it only changes in steps (keeps the
+        cached axis labels valid most frames)."""
+        if not (math.isfinite(lo) and math.isfinite(hi)):
+            return -1.0, 1.0
+        if hi - lo < 1e-6:
+            lo, hi = lo - 0.5, hi + 0.5
+        step = 10 ** math.floor(math.log10(hi - lo)) / 2
+        return math.floor(lo / step) * step, math.ceil(hi / step) * step
+
+    @profiled("paint StripChart")
+    def paintEvent(self, ev):
+        r = self._plot_rect()
+        width = max(1, int(r.width()))
+        windows = self._windows(width)
+
+        if self.fixed_range is None and windows:
+            lo = min(float(w[0].min()) for w in windows)
+            hi = max(float(w[1].max()) for w in windows)
+            rng = self._nice_range(lo, hi)
+            if rng != self._range:
+                self._range = rng
+                self._static.invalidate()
+
+        height = max(1, int(r.height()))
+        if self._img is None or self._img.shape != (height, width):
+            self._img = np.zeros((height, width), dtype=np.uint32)
+            self._rows = np.arange(height, dtype=np.int32)[:, None]
+        img = self._img
+        img.fill(0)
+        lo_v, hi_v = self._range
+        scale = (height - 1) / ((hi_v - lo_v) or 1.0)
+        for s, (lo, hi) in zip(self.series, windows):
+            ok = lo <= hi
+            if not ok.any():
+                continue
+            # stretch each column to meet its neighbour so the trace stays connected
+            both = ok[1:] & ok[:-1]
+            lo[1:] = np.where(both, np.minimum(lo[1:], hi[:-1]), lo[1:])
+            hi[1:] = np.where(both, np.maximum(hi[1:], lo[:-1]), hi[1:])
+            top = np.clip((hi_v - np.where(ok, hi, hi_v)) * scale, 0, height - 1).astype(np.int32)
+            bot = np.clip((hi_v - np.where(ok, lo, hi_v)) * scale, 0, height - 1).astype(np.int32)
+            np.putmask(img, ok & (self._rows >= top) & (self._rows <= bot), np.uint32(s.argb))
+
+        p = QtGui.QPainter(self)
+        self._static.paint(p, self)
+        qimg = QtGui.QImage(img.data, width, height, 4 * width, QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        p.drawImage(QtCore.QPointF(r.left(), r.top()), qimg)
+        self._draw_overlay(p, r)
+        p.end()
+
+
+class LogChart(StripChart):
+    """
+    A whole recorded flight. Each repaint asks the log's Pyramid for about one
+    bucket per pixel column over the visible span, so the pyramid level follows
+    the zoom and an hour of telemetry draws as fast as a minute. The wheel zooms
+    around the pointer, dragging pans, a click calls on_seek(t_ns) (log time);
+    set_position() moves the playhead. on_view((t0, t1)) is told whenever the
+    user changes the span, e.g. to keep several charts in step with set_view().
+    """
+    MIN_SPAN_NS = 100_000_000
+
+    def __init__(self, pyramid, title: str, y_range=None, unit: str = "",
+                 on_seek=None, on_view=None, parent=None):
+        super().__init__(title, span_s=0.0, y_range=y_range, unit=unit, parent=parent)
+        self.pyramid = pyramid
+        self.on_seek = on_seek
+        self.on_view = on_view
+        self.channels = []
+        self.view = (pyramid.t_start, max(pyramid.t_end, pyramid.t_start + 1))
+        self.position_ns = None
+        self._cache = None        # ((view, width), windows)
+        self._press = None        # (x, view) while a button is down
+
+    def add_series(self, name: str, color: str, channel: str | None = None, convert=None) -> int:
+        """channel: one of pyramid.CHANNELS (default: name); convert maps its raw
+        values to the chart's unit and must be increasing (it is applied to min/max)."""
+        self.channels.append((channel or name, convert))
+        return super().add_series(name, color)
+
+    # --- view ---
+    def set_view(self, t0: int, t1: int):
+        start, end = self.pyramid.t_start, self.pyramid.t_end
+        span = min(max(int(t1 - t0), self.MIN_SPAN_NS), max(1, end - start))
+        t0 = min(max(int(t0), start), max(start, end - span))
+        if (t0, t0 + span) != self.view:
+            self.view = (t0, t0 + span)
+            self._static.invalidate()
+            self.schedule_update()
+
+    def _user_view(self, t0: int, t1: int):
+        self.set_view(t0, t1)
+        if self.on_view is not None:
+            self.on_view(self.view)
+
+    def set_position(self, t_ns: int):
+        """Playhead; repaints only when it moves by a pixel."""
+        old, self.position_ns = self.position_ns, t_ns
+        if old is None or self._x(old) != self._x(t_ns):
+            self.schedule_update()
+
+    def _x(self, t_ns: int) -> int:
+        r = self._plot_rect()
+        t0, t1 = self.view
+        return int(r.left() + (t_ns - t0) * r.width() / (t1 - t0))
+
+    def _t(self, x: float, view=None) -> int:
+        r = self._plot_rect()
+        t0, t1 = view or self.view
+        return int(t0 + (x - r.left()) * (t1 - t0) / max(1.0, r.width()))
+
+    # --- input ---
+    def wheelEvent(self, ev):
+        t0, t1 = self.view
+        at = self._t(ev.position().x())
+        k = 0.8 ** (ev.angleDelta().y() / 120)
+        self._user_view(at - (at - t0) * k, at + (t1 - at) * k)
+        ev.accept()
+
+    def mousePressEvent(self, ev):
+        self._press = (ev.position().x(), self.view)
+
+    def mouseMoveEvent(self, ev):
+        if self._press is None:
+            return
+        x0, view = self._press
+        dt = self._t(ev.position().x(), view) - self._t(x0, view)
+        self._user_view(view[0] - dt, view[1] - dt)
+
+    def mouseReleaseEvent(self, ev):
+        if self._press is not None and abs(ev.position().x() - self._press[0]) < 3 and self.on_seek is not None:
+            self.on_seek(self._t(ev.position().x()))
+        self._press = None
+
+    # --- paint ---
+    def _caption(self) -> str:
+        t0, t1 = self.view
+        base = self.pyramid.t_start
+        return (f"{self.title} [{self.unit}]  {(t0 - base) / 1e9:.1f}–{(t1 - base) / 1e9:.1f} s"
+                f" of {(self.pyramid.t_end - base) / 1e9:.1f} s")
+
+    def _windows(self, width: int):
+        key = (self.view, width)
+        if self._cache is None or self._cache[0] != key:
+            t0, t1 = self.view
+            windows = []
+            for ch, convert in self.channels:
+                lo, hi, _mean = self.pyramid.query(ch, t0, t1, width)
+                if convert is not None:
+                    lo, hi = convert(lo), convert(hi)
+                empty = np.isnan(lo)
+                windows.append((np.where(empty, np.inf, lo), np.where(empty, -np.inf, hi)))
+            self._cache = (key, windows)
+        return [(lo.copy(), hi.copy()) for lo, hi in self._cache[1]]    # paintEvent joins columns in place
+
+    def _draw_overlay(self, p, r):
+        if self.position_ns is None:
+            return
+        x = self._x(self.position_ns)
+        if r.left() <= x <= r.right():
+            p.setPen(QtGui.QPen(QtGui.QColor("#000"), 1))
+            p.drawLine(QtCore.QPointF(x, r.top()), QtCore.QPointF(x, r.bottom()))
@@ -0,0 +1,4 @@
+import os, sys
+
+# the scripts import each other by module name, as when run from python_stuff/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
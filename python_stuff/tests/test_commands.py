@@ -0,0 +1,54 @@
+from commands import CommandScheduler
+
+MS = 1_000_000
+
+
+def scheduler(results=None):
+    sent = []
+
+    def send(pkt):
+        sent.append(pkt)
+        return results.pop(0) if results else True
+    return CommandScheduler(send, rate_hz=30, keepalive_s=0.5), sent
+
+
+def test_nothing_before_the_first_setpoint():
+    c, _ = scheduler()
+    assert c.poll(0) is None
+
+
+def test_unchanged_setpoint_is_deduped_until_keepalive():
+    c, _ = scheduler()
+    c.set(b"\x10\x10\x10\x10")
+    assert c.poll(0) == b"\x10\x10\x10\x10"
+    assert c.poll(33 * MS) is None
+    assert c.poll(499 * MS) is None
+    assert c.poll(500 * MS) == b"\x10\x10\x10\x10"
+    assert (c.deduped, c.keepalives) == (2, 1)
+    assert c.poll(600 * MS) is None           # keep-alive restarts the interval
+
+
+def test_new_setpoint_goes_out_on_the_next_tick():
+    c, _ = scheduler()
+    c.set(b"\x10\x10\x10\x10")
+    c.poll(0)
+    c.set(b"\x20\x20\x20\x20")
+    assert c.poll(33 * MS) == b"\x20\x20\x20\x20"
+    assert c.keepalives == 0
+
+
+def test_latest_value_wins_between_ticks():
+    c, _ = scheduler()
+    for v in range(5):
+        c.set(bytes([v]) * 4)
+    assert c.poll(0) == b"\x04" * 4
+    assert c.overwritten == 4
+
+
+def test_failed_send_is_retried_next_tick():
+    c, sent = scheduler(results=[False, True])
+    c.set(b"\x10\x10\x10\x10")
+    c.tick(0)
+    c.tick(33 * MS)
+    assert sent == [b"\x10\x10\x10\x10"] * 2
+    assert (c.failed, c.sent, c.deduped) == (1, 1, 0)
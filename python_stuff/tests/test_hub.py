@@ -0,0 +1,52 @@
+from hub import Backlog, DropPolicy
+from protocol import PACKET_LEN
+
+
+def frames(first: int, n: int) -> bytes:
+    return b"".join(bytes([i]) * PACKET_LEN for i in range(first, first + n))
+
+
+def ids(data: bytes):
+    return [data[j] for j in range(0, len(data), PACKET_LEN)]
+
+
+def test_oldest_keeps_the_newest_frames():
+    b = Backlog(5, DropPolicy.oldest)
+    assert b.push(frames(0, 3))
+    assert b.push(frames(3, 4))
+    assert (b.frames, b.dropped) == (5, 2)
+    assert ids(b.take()) == [2, 3, 4, 5, 6]
+
+
+def test_oldest_batch_bigger_than_the_backlog():
+    b = Backlog(3, DropPolicy.oldest)
+    b.push(frames(0, 2))
+    b.push(frames(2, 5))
+    assert ids(b.take()) == [4, 5, 6]
+    assert b.dropped == 4
+
+
+def test_newest_keeps_what_is_queued():
+    b = Backlog(5, DropPolicy.newest)
+    assert b.push(frames(0, 3))
+    assert b.push(frames(3, 4))
+    assert b.push(frames(7, 1))
+    assert (b.frames, b.dropped) == (5, 3)
+    assert ids(b.take()) == [0, 1, 2, 3, 4]
+
+
+def test_disconnect_refuses_instead_of_dropping():
+    b = Backlog(5, DropPolicy.disconnect)
+    assert b.push(frames(0, 5))
+    assert not b.push(frames(5, 1))
+    assert (b.frames, b.dropped) == (5, 0)
+
+
+def test_take_splits_chunks():
+    b = Backlog(10, DropPolicy.oldest)
+    b.push(frames(0, 3))
+    b.push(frames(3, 3))
+    assert ids(b.take(4)) == [0, 1, 2, 3]
+    assert b.frames == 2
+    assert ids(b.take()) == [4, 5]
+    assert b.take() == b""
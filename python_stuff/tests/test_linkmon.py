@@ -0,0 +1,97 @@
+import pytest
+
+from linkmon import DEGRADED, OK, STALLED, LinkMonitor
+
+MS = 1_000_000
+S = 1000 * MS
+T0 = 10 * S + 500 * MS          # mid-second: the partial first second is skipped
+
+
+class Feed:
+    """Synthetic arrivals: one 20-byte frame per chunk unless told otherwise."""
+    def __init__(self, mon, t=T0):
+        self.mon, self.t = mon, t
+
+    def chunk(self, after_ns: int, frames: int = 1):
+        self.t += after_ns
+        self.mon.on_chunk(self.t, 20 * frames, frames, 0)
+
+    def steady(self, seconds: float, period_ns: int = 10 * MS):
+        for _ in range(round(seconds * S / period_ns)):
+            self.chunk(period_ns)
+
+
+def test_steady_link_is_ok():
+    m = LinkMonitor()
+    f = Feed(m)
+    f.steady(7)
+    now = f.t + MS
+    assert m.rate(now) == pytest.approx(100.0)
+    assert (m.jitter_us, m.bursts, m.stalls) == (0.0, 0, 0)
+    assert m.check(now) == (OK, [])
+
+
+def test_rate_window_counts_whole_seconds_only():
+    m = LinkMonitor(window_s=5)
+    f = Feed(m)
+    f.steady(3)                           # 10.5 .. 13.5 s: 11 and 12 are whole
+    assert m.rate(13 * S + 600 * MS) == pytest.approx(100.0)
+    f.steady(4, period_ns=20 * MS)        # 50 Hz from 13.5 s on
+    now = f.t + MS                        # 17.5 s: 12..16, one of them half at 100 Hz
+    assert m.rate(now) == pytest.approx((100 + 75 + 50 + 50 + 50) / 5)
+    assert m.rate(now + 10 * S) == 0.0    # the window has moved past everything
+
+
+def test_low_rate_degrades_once_a_window_is_seen():
+    m = LinkMonitor(window_s=5, min_rate_pct=90)
+    f = Feed(m)
+    f.steady(3, period_ns=20 * MS)
+    assert m.check(f.t + MS)[0] == OK     # too early to judge the rate
+    f.steady(4, period_ns=20 * MS)
+    level, reasons = m.check(f.t + MS)
+    assert level == DEGRADED
+    assert reasons == ["50 frames/s (< 90% of 100)"]
+
+
+def test_jitter_against_the_nominal_period():
+    m = LinkMonitor(max_jitter_ms=1.5)
+    f = Feed(m)
+    for _ in range(300):                  # 8 / 12 ms: 2 ms off every time
+        f.chunk(8 * MS)
+        f.chunk(12 * MS)
+    assert m.jitter_us == pytest.approx(2000.0)
+    assert m.jitter.percentile(50) == pytest.approx(2000, rel=0.1)
+    f.chunk(20 * MS, frames=2)            # two periods' worth after two periods: on time
+    assert m.jitter_us == pytest.approx(2000.0 * 15 / 16)
+    assert m.jitter.max_us == pytest.approx(2000, rel=0.1)
+    assert m.check(f.t + MS) == (DEGRADED, ["jitter 1.9 ms (> 1.5)"])
+
+
+def test_held_and_released_frames_are_one_burst_and_one_stall():
+    m = LinkMonitor(stall_ms=50, burst_gap_ms=1)
+    f = Feed(m)
+    f.steady(1)
+    for _ in range(4):                    # Wi-Fi retry: 120 ms held, then 12 frames at once
+        f.chunk(120 * MS)
+        for _ in range(11):
+            f.chunk(MS // 10)
+        f.steady(0.5)
+    assert (m.bursts, m.burst_max, m.burst_counts[12]) == (4, 12, 4)
+    assert m.stalls == 4
+    assert m.last_stall[1] == 120 * MS
+    assert m.stall_hist.max_us == pytest.approx(120_000, rel=0.05)
+    level, reasons = m.check(f.t + MS)
+    assert level == DEGRADED and any(r.startswith("stalled 120 ms") for r in reasons)
+    f.steady(6)                           # the last stall leaves the window
+    assert m.check(f.t + MS)[0] == OK
+
+
+def test_silence_is_stalled_until_data_returns():
+    m = LinkMonitor(stall_ms=50)
+    f = Feed(m)
+    f.steady(1)
+    assert m.check(f.t + 50 * MS)[0] == OK
+    assert m.check(f.t + 51 * MS) == (STALLED, ["no data for 51 ms"])
+    f.chunk(200 * MS)
+    assert m.check(f.t + MS)[0] == DEGRADED
+    assert m.stalls == 1
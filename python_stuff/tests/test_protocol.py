@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from protocol import FRAME_STRUCT, PACKET_LEN, V2_HELLO, V2_LEN, V2_SYNC, FrameDecoder, encode_v2
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DECODERS = [pytest.param(False, id="python"),
+            pytest.param(True, id="numpy", marks=pytest.mark.skipif(np is None, reason="needs NumPy"))]
+
+
+def payloads(n: int, first: int = 0):
+    """n distinct v1 frames."""
+    return [FRAME_STRUCT.pack((first + i) % 4096, 1, 2, 3, 4, first + i, -(first + i), 16384, 0, 7, 8, 9)
+            for i in range(n)]
+
+
+def v2_stream(frames, seq0: int = 0):
+    return b"".join(encode_v2(p, seq0 + i, 1000 * i) for i, p in enumerate(frames))
+
+
+def feed_chunked(dec, data: bytes, rng: random.Random):
+    """Everything feed() returns for data cut into random-size chunks, as frame bytes."""
+    out, i = [], 0
+    while i < len(data):
+        k = rng.randint(1, 3 * V2_LEN)
+        frames = dec.feed(data[i:i + k])
+        out.append(frames.tobytes())
+        i += k
+    raw = b"".join(out)
+    return [raw[j:j + PACKET_LEN] for j in range(0, len(raw), PACKET_LEN)]
+
+
+@pytest.mark.parametrize("use_numpy", DECODERS)
+def test_v1_round_trip(use_numpy):
+    frames = payloads(500)
+    got = feed_chunked(FrameDecoder(use_numpy=use_numpy, protocol=1), b"".join(frames), random.Random(1))
+    assert got == frames
+
+
+@pytest.mark.parametrize("use_numpy", DECODERS)
+def test_v2_round_trip(use_numpy):
+    frames = payloads(500)
+    dec = FrameDecoder(use_numpy=use_numpy)
+    got = feed_chunked(dec, V2_HELLO + v2_stream(frames, seq0=65500), random.Random(2))
+    assert got == frames
+    assert dec.protocol == 2
+    assert dec.last_seq == (65500 + 499) & 0xFFFF
+    assert (dec.seq_lost, dec.crc_errors, dec.resyncs, dec.bytes_skipped) == (0, 0, 0, 0)
+
+
+@pytest.mark.parametrize("use_numpy", DECODERS)
+@pytest.mark.parametrize("protocol", [None, 1, 2])
+def test_arbitrary_bytes_never_raise(use_numpy, protocol):
+    rng = random.Random(3)
+    for _ in range(200):
+        dec = FrameDecoder(capacity=64, use_numpy=use_numpy, protocol=protocol)
+        data = rng.randbytes(rng.randint(0, 2000))
+        if rng.random() < 0.5:          # sync lookalikes are the interesting case for v2
+            data = data.replace(bytes([rng.randrange(256)]), V2_SYNC + b"\x02")
+        got = feed_chunked(dec, data, rng)
+        assert all(len(f) == PACKET_LEN for f in got)
+        assert dec.pending <= len(data)
+
+
+@pytest.mark.parametrize("use_numpy", DECODERS)
+def test_v2_rejects_every_corrupted_frame(use_numpy):
+    # CRC-16 catches any error burst up to 16 bits, so one bad byte per frame
+    # must always cost exactly that frame
+    rng = random.Random(4)
+    frames = payloads(2000)
+    stream = bytearray(v2_stream(frames))
+    corrupted = set(rng.sample(range(len(frames)), 300))
+    version_hit = 0                 # no sync + version match, so not a CRC error either
+    for i in corrupted:
+        off = rng.randrange(2, V2_LEN)
+        stream[i * V2_LEN + off] ^= rng.randrange(1, 256)
+        version_hit += off == 2
+    dec = FrameDecoder(use_numpy=use_numpy, protocol=2)
+    got = feed_chunked(dec, bytes(stream), rng)
+    assert got == [f for i, f in enumerate(frames) if i not in corrupted]
+    assert dec.crc_errors == len(corrupted) - version_hit
+
+
+@pytest.mark.parametrize("use_numpy", DECODERS)
+@pytest.mark.parametrize("garbage", [b"\x00" * 7, b"\xa5\x5a\x02" + b"\x11" * 40, b"\xff" * 100])
+def test_v2_resyncs_on_the_first_frame_after_garbage(use_numpy, garbage):
+    before, after = payloads(10), payloads(10, first=10)
+    stream = v2_stream(before) + garbage + encode_v2(after[0], 10, 0)[:V2_LEN // 2] + v2_stream(after, 10)
+    dec = FrameDecoder(use_numpy=use_numpy, protocol=2)
+    got = feed_chunked(dec, stream, random.Random(5))
+    assert got == before + after
+    assert dec.resyncs == 1
+    assert dec.bytes_skipped == len(garbage) + V2_LEN // 2
+    assert dec.seq_lost == 0
@@ -0,0 +1,147 @@
+import os, shutil, struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from protocol import FRAME_DTYPE
+from pyramid import BUCKET_DTYPE, CHANNELS, FILE_HEADER, Pyramid, channel_values
+from recorder import HEADER, KIND_FRAME, LogReader, Recorder
+
+T0 = 10**12
+
+
+@pytest.fixture(scope="module")
+def log(tmp_path_factory):
+    """A recorded flight: uneven frame batches with motor commands in between,
+    spikes on the first and last frame (the last sits in the unfolded tail)."""
+    rng = np.random.default_rng(1)
+    path = str(tmp_path_factory.mktemp("log") / "flight.dlog")
+    rec = Recorder(path, capacity=256)
+    t, total = T0, 0
+    while total < 5003:
+        n = min(int(rng.integers(1, 40)), 5003 - total)
+        f = np.zeros(n, FRAME_DTYPE)
+        f['bat_adc'] = rng.integers(3000, 4096, n)
+        f['motors'] = rng.integers(0, 181, (n, 4))
+        for name in ('ax', 'ay', 'az', 'gx', 'gy', 'gz'):
+            f[name] = rng.integers(-20000, 20000, n)
+        if total == 0:
+            f['ax'][0] = -32768
+        if total + n == 5003:
+            f['gz'][-1] = 32767
+        rec.record_frames(f.tobytes(), t)
+        if rng.random() < 0.3:
+            rec.record_command(bytes(rng.integers(0, 181, 4).tolist()), t + 1)
+        t += 10_000_000 * n
+        total += n
+    rec.close()
+    return path
+
+
+def brute(path, t0=None, t1=None):
+    """Per-frame timestamps and channel values straight from the log."""
+    r = LogReader(path)
+    recs = r.records()
+    idx = np.flatnonzero(recs['kind'] == KIND_FRAME)
+    t = recs['t_ns'][idx].copy()
+    vals = channel_values(recs['payload'][idx].reshape(-1).view(FRAME_DTYPE))
+    del recs                       # a view onto the map
+    r.close()
+    keep = np.ones(len(t), bool) if t0 is None else (t >= t0) & (t <= t1)
+    return t[keep], vals[keep]
+
+
+def assert_summary(pyr, path, resolution):
+    t, vals = brute(path)
+    got = pyr.summary(pyr.t_start, pyr.t_end, resolution)
+    for i, ch in enumerate(CHANNELS):
+        lo, hi, mean = got[ch]
+        assert (lo, hi) == (vals[:, i].min(), vals[:, i].max()), ch
+        assert mean == pytest.approx(vals[:, i].astype(np.float64).mean()), ch
+
+
+def reopen(path, tmp_path, side=None):
+    """Copy of the log with the given sidecar bytes (None: no sidecar), opened."""
+    dst = str(tmp_path / "copy.dlog")
+    shutil.copy(path, dst)
+    shutil.copy(path + ".idx", dst + ".idx")
+    if side is not None:
+        with open(dst + ".pyr", "wb") as f:
+            f.write(side)
+    return dst, Pyramid.open(dst, save=False)
+
+
+def test_recorded_sidecar_covers_every_frame(log):
+    pyr = Pyramid.open(log, save=False)
+    t, _ = brute(log)
+    assert pyr.frames == len(t) == 5003
+    assert (pyr.t_start, pyr.t_end) == (t[0], t[-1])
+    assert len(pyr.levels) > 2
+
+
+@pytest.mark.parametrize("resolution", [1, 4, 256])
+def test_summary_matches_brute_force(log, resolution):
+    # a coarse resolution reads the top level, which hasn't folded the tail
+    assert_summary(Pyramid.open(log, save=False), log, resolution)
+
+
+def test_query_at_sample_level_is_exact(log):
+    pyr = Pyramid.open(log, save=False)
+    t0, t1 = pyr.t_start + 10**9, pyr.t_start + 3 * 10**9
+    width = 1000                     # more columns than level-0 buckets: raw frames
+    t, vals = brute(log, t0, t1)
+    px = np.clip((t - t0) * width // (t1 - t0), 0, width - 1)
+    c = CHANNELS.index('ay')
+    lo, hi, mean = pyr.query('ay', t0, t1, width)
+    for col in range(width):
+        v = vals[px == col, c]
+        if len(v):
+            assert (lo[col], hi[col]) == (v.min(), v.max())
+            assert mean[col] == pytest.approx(v.mean())
+        else:
+            assert np.isnan(lo[col]) and np.isnan(hi[col])
+
+
+def test_coarse_query_keeps_the_extremes(log):
+    pyr = Pyramid.open(log, save=False)
+    _, vals = brute(log)
+    for ch in ('ax', 'gz'):
+        lo, hi, _ = pyr.query(ch, pyr.t_start, pyr.t_end, 8)
+        c = CHANNELS.index(ch)
+        assert (np.nanmin(lo), np.nanmax(hi)) == (vals[:, c].min(), vals[:, c].max())
+
+
+@pytest.mark.parametrize("cut", ["missing", "header", "torn_row", "half", "no_tail"])
+def test_reopen_with_a_damaged_sidecar(log, tmp_path, cut):
+    full = Pyramid.open(log, save=False)
+    with open(log + ".pyr", "rb") as f:
+        side = f.read()
+    rows = (len(side) - FILE_HEADER.size) // BUCKET_DTYPE.itemsize
+    size = {"missing": None, "header": FILE_HEADER.size,
+            "torn_row": FILE_HEADER.size + rows // 3 * BUCKET_DTYPE.itemsize + 17,
+            "half": FILE_HEADER.size + rows // 2 * BUCKET_DTYPE.itemsize,
+            "no_tail": FILE_HEADER.size + (rows - 1) * BUCKET_DTYPE.itemsize}[cut]
+    path, pyr = reopen(log, tmp_path, None if size is None else side[:size])
+    assert pyr.levels[0].tobytes() == full.levels[0].tobytes()
+    assert_summary(pyr, path, 4)
+
+
+def test_sidecar_ahead_of_a_crashed_log(log, tmp_path):
+    # the log only committed part of what the sidecar describes
+    with open(log + ".pyr", "rb") as f:
+        side = f.read()
+    path, _ = reopen(log, tmp_path, side)
+    with open(path, "r+b") as f:
+        head = list(HEADER.unpack(f.read(HEADER.size)))
+        head[4] = 3001                     # committed records
+        f.seek(0)
+        f.write(HEADER.pack(*head))
+    pyr = Pyramid.open(path, save=False)
+    os.remove(path + ".pyr")
+    scratch = Pyramid.open(path, save=True)
+    assert pyr.levels[0].tobytes() == scratch.levels[0].tobytes()
+    assert pyr.frames == len(brute(path)[0])
+    assert_summary(pyr, path, 4)
+    # save=True wrote a complete sidecar back
+    assert Pyramid.open(path, save=False).levels[0].tobytes() == scratch.levels[0].tobytes()
@@ -0,0 +1,88 @@
+import os, shutil
+
+import pytest
+
+from protocol import FRAME_STRUCT, PACKET_LEN
+from recorder import HEADER, INDEX_ENTRY, INDEX_EVERY, KIND_COMMAND, KIND_FRAME, LogReader, Recorder
+
+T0 = 10**12
+
+
+@pytest.fixture(scope="module")
+def log(tmp_path_factory):
+    """(path, [(t_ns, kind, payload)]): frame batches of 1..25 with a command after every third."""
+    path = str(tmp_path_factory.mktemp("log") / "flight.dlog")
+    rec = Recorder(path, capacity=256, pyramid=False)
+    expect, t = [], T0
+    for i in range(300):
+        frames = [FRAME_STRUCT.pack(4000, 1, 2, 3, i % 256, i, j, 0, 0, 0, 0, 0) for j in range(1 + i % 25)]
+        rec.record_frames(b"".join(frames), t)
+        expect += [(t, KIND_FRAME, f) for f in frames]
+        if i % 3 == 0:
+            cmd = bytes([i % 181, 0, 0, 90])
+            rec.record_command(cmd, t + 3)
+            expect.append((t + 3, KIND_COMMAND, cmd))
+        t += 10_000_000 * (1 + i % 25)
+    rec.close()
+    return path, expect
+
+
+def copy_log(path, tmp_path, idx=None):
+    """Copy of the log with the given index sidecar bytes (None: none)."""
+    dst = str(tmp_path / "copy.dlog")
+    shutil.copy(path, dst)
+    if idx is not None:
+        with open(dst + ".idx", "wb") as f:
+            f.write(idx)
+    return dst
+
+
+def test_records_round_trip(log):
+    path, expect = log
+    r = LogReader(path)
+    assert len(r) == len(expect)
+    assert list(r.iter_records()) == expect
+    assert [p for _, _, p in r.iter_records(kind=KIND_COMMAND)] == [p for _, k, p in expect if k == KIND_COMMAND]
+    assert all(len(p) == PACKET_LEN for _, _, p in r.iter_records(kind=KIND_FRAME))
+    assert (r.t_start, r.t_end) == (expect[0][0], expect[-1][0])
+
+
+def test_seek_matches_a_linear_scan(log):
+    path, expect = log
+    r = LogReader(path)
+    times = [t for t, _, _ in expect]
+    probes = sorted({t + d for t in times[::7] for d in (-1, 0, 1)} | {0, times[-1] + 1})
+    for t in probes:
+        assert r.seek(t) == next((i for i, ti in enumerate(times) if ti >= t), len(times)), t
+
+
+@pytest.mark.parametrize("cut", ["missing", "empty", "torn", "half"])
+def test_index_rebuilt_from_the_log(log, tmp_path, cut):
+    path, expect = log
+    full = LogReader(path)
+    assert len(full._index_rec) == -(-len(expect) // INDEX_EVERY)
+    with open(path + ".idx", "rb") as f:
+        idx = f.read()
+    keep = {"missing": None, "empty": b"", "torn": idx[:len(idx) - 5],
+            "half": idx[:len(idx) // 2 // INDEX_ENTRY.size * INDEX_ENTRY.size]}[cut]
+    r = LogReader(copy_log(path, tmp_path, keep))
+    assert (r._index_t, r._index_rec) == (full._index_t, full._index_rec)
+    assert [r.seek(t) for t, _, _ in expect[::11]] == [full.seek(t) for t, _, _ in expect[::11]]
+
+
+def test_uncommitted_records_are_ignored(log, tmp_path):
+    # a crash leaves records past `committed` and index entries pointing at them
+    path, expect = log
+    dst = copy_log(path, tmp_path)
+    shutil.copy(path + ".idx", dst + ".idx")
+    with open(dst, "r+b") as f:
+        head = list(HEADER.unpack(f.read(HEADER.size)))
+        head[4] = 1000
+        f.seek(0)
+        f.write(HEADER.pack(*head))
+    r = LogReader(dst)
+    assert len(r) == 1000
+    assert r._index_rec == list(range(0, 1000, INDEX_EVERY))
+    assert r.t_end == expect[999][0]
+    assert r.seek(expect[-1][0]) == 1000
+    assert list(r.iter_records()) == expect[:1000]
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from protocol import FRAME_DTYPE
+from shm import ShmRingReader, ShmRingWriter
+
+
+@pytest.fixture
+def ring():
+    w = ShmRingWriter(f"drone-test-{os.getpid()}", capacity=8)
+    r = ShmRingReader(w.name)
+    yield w, r
+    r.close()
+    w.close()
+
+
+def batch(first: int, n: int):
+    f = np.zeros(n, FRAME_DTYPE)
+    f['ax'] = np.arange(first, first + n)
+    f['motors'] = (np.arange(first, first + n) % 180)[:, None]
+    return f
+
+
+def test_latest_is_contiguous_across_the_wrap(ring):
+    w, r = ring
+    for first in range(0, 21, 3):
+        w.write(batch(first, 3), t_ns=first)
+    view, start = r.latest(8)
+    assert (r.head, start) == (21, 13)
+    assert view['ax'].tolist() == list(range(13, 21))
+    assert view['motors'][:, 2].tolist() == list(range(13, 21))
+    assert view['t_ns'].tolist() == [12, 12, 15, 15, 15, 18, 18, 18]
+    assert r.valid(start)
+
+
+def test_since_counts_overwritten_records(ring):
+    w, r = ring
+    w.write(batch(0, 5), t_ns=0)
+    view, start, lost = r.since(2)
+    assert (view['ax'].tolist(), start, lost) == ([2, 3, 4], 2, 0)
+    w.write(batch(5, 10), t_ns=1)
+    view, start, lost = r.since(5)
+    assert (view['ax'].tolist(), start, lost) == (list(range(7, 15)), 7, 2)
+    assert not r.valid(5)
+
+
+def test_batch_bigger_than_the_ring_keeps_its_tail(ring):
+    w, r = ring
+    w.write(batch(0, 20), t_ns=0)
+    assert r.head == 20
+    assert r.read(8)['ax'].tolist() == list(range(12, 20))
+
+
+def test_second_writer_is_refused(ring):
+    w, _ = ring
+    with pytest.raises(FileExistsError):
+        ShmRingWriter(w.name, capacity=8)
@@ -0,0 +1,146 @@
+import threading
+
+from latency import LatencyHistogram
+
+# Keyboard flying without a tick-counting timer. Held keys are integrated over
+# monotonic time: the throttle moves ramp_per_s units per second held, however
+# often (or unevenly) advance() gets called, so a loaded event loop only changes
+# how fine the steps are, not how fast the ramp is. A key-down acts right away:
+# the state is brought up to the press instant, then moved by one `tap` step.
+# Roll, pitch and yaw are digital axes that ease towards their held direction at
+# axis_per_s and are mixed into the four motors around the throttle:
+#   pitch > 0  nose down (forward): back motors up, front motors down
+#   roll  > 0  right: left motors up, right motors down
+#   yaw   > 0  right: FL and BR up, FR and BL down (YAW_SIGN flips it for the other prop layout)
+# No Qt in here; the UI maps keys to (control, direction).
+
+CONTROLS = ('throttle', 'roll', 'pitch', 'yaw')
+MOTORS = ('FrontLeft', 'FrontRight', 'BackLeft', 'BackRight')
+YAW_SIGN = 1
+_MIX = {                 # per-motor sign of roll, pitch, yaw
+    'FrontLeft':  (1, -1, YAW_SIGN),
+    'FrontRight': (-1, -1, -YAW_SIGN),
+    'BackLeft':   (1, 1, -YAW_SIGN),
+    'BackRight':  (-1, 1, YAW_SIGN),
+}
+
+
+def mix(throttle: float, roll: float, pitch: float, yaw: float, full: int) -> dict:
+    """Motor name -> int power for a throttle and roll/pitch/yaw demands in motor
+    units, within 0..full. Nothing spins with the throttle at zero."""
+    if throttle <= 0:
+        return dict.fromkeys(MOTORS, 0)
+    return {m: int(round(min(max(throttle + sr * roll + sp * pitch + sy * yaw, 0.0), full)))
+            for m, (sr, sp, sy) in _MIX.items()}
+
+
+class InputEngine:
+    """
+    Time-integrated throttle and axis state from press/release events stamped with
+    time.monotonic_ns(). Events must arrive in time order; repeats of a press or
+    release (auto-repeat, an event seen twice on its way through Qt) are ignored.
+
+    Every input event also stamps the packet it produces: the UI calls
+    mark_input() when it hands a changed setpoint over, and take_input() when that
+    packet goes on the wire (from the command thread), recording the key-to-wire
+    time in `latency`.
+    """
+    def __init__(self, full: int = 180, ramp_per_s: float = 33.0, boost: float = 4.0, tap: float = 1.0,
+                 authority: float = 20.0, axis_per_s: float = 5.0, axis_tap: float = 0.25):
+        self.full = full
+        self.ramp_per_s = ramp_per_s      # throttle units per second held (the old 1 step / 30 ms)
+        self.boost = boost                # rate multiplier while boosted (Shift)
+        self.tap = tap                    # throttle units applied at the press itself
+        self.authority = authority        # motor units at full roll/pitch/yaw deflection
+        self.axis_per_s = axis_per_s      # deflection per second (1 = full)
+        self.axis_tap = axis_tap
+        self.latency = LatencyHistogram()
+        self._held = {c: set() for c in CONTROLS}
+        self._lock = threading.Lock()
+        self._input_t = None
+        self.reset()
+
+    def reset(self, throttle: float = 0.0, t_ns: int | None = None):
+        """Drop all held input and set the throttle (stop button, takeover)."""
+        self.throttle = min(max(float(throttle), 0.0), self.full)
+        self.axes = {c: 0.0 for c in CONTROLS[1:]}
+        for held in self._held.values():
+            held.clear()
+        self.boosted = False
+        self._t = t_ns
+
+    # --- events ---
+    def press(self, control: str, direction: int, t_ns: int):
+        held = self._held[control]
+        if direction in held:
+            return
+        self.advance(t_ns)
+        held.add(direction)
+        if control == 'throttle':
+            self.throttle = min(max(self.throttle + direction * self.tap, 0.0), self.full)
+        else:
+            target = self._target(control)
+            v = self.axes[control]
+            if target and v * target < self.axis_tap:
+                self.axes[control] = target * self.axis_tap
+
+    def release(self, control: str, direction: int, t_ns: int):
+        held = self._held[control]
+        if direction not in held:
+            return
+        self.advance(t_ns)
+        held.discard(direction)
+
+    def set_boost(self, on: bool, t_ns: int):
+        if on != self.boosted:
+            self.advance(t_ns)
+            self.boosted = on
+
+    # --- time ---
+    @property
+    def active(self) -> bool:
+        """True while advance() can still change something (a key is held or an axis is off centre)."""
+        return any(self._held.values()) or any(self.axes.values())
+
+    def _target(self, control: str) -> int:
+        held = self._held[control]
+        return (1 in held) - (-1 in held)
+
+    def advance(self, t_ns: int) -> bool:
+        """Integrate held input up to t_ns; True if the motor outputs may have changed."""
+        t0, self._t = self._t, t_ns
+        if t0 is None or t_ns <= t0:
+            return False
+        dt = (t_ns - t0) / 1e9
+        changed = False
+        d = self._target('throttle')
+        if d:
+            rate = self.ramp_per_s * (self.boost if self.boosted else 1.0)
+            new = min(max(self.throttle + d * rate * dt, 0.0), self.full)
+            changed = new != self.throttle
+            self.throttle = new
+        step = self.axis_per_s * dt
+        for c, v in self.axes.items():
+            target = self._target(c)
+            if v != target:
+                self.axes[c] = min(v + step, target) if v < target else max(v - step, target)
+                changed = True
+        return changed
+
+    def motors(self) -> dict:
+        """Motor name -> int power, throttle plus the mixed axes, within 0..full."""
+        return mix(self.throttle, *(self.axes[c] * self.authority for c in CONTROLS[1:]), self.full)
+
+    # --- key-to-wire latency ---
+    def mark_input(self, t_ns: int):
+        """The setpoint just handed to the sender came from an input event at t_ns."""
+        with self._lock:
+            if self._input_t is None:
+                self._input_t = t_ns          # keep the oldest input not on the wire yet
+
+    def take_input(self, sent_ns: int):
+        """A packet went on the wire at sent_ns; record the input that caused it, if any."""
+        with self._lock:
+            t, self._input_t = self._input_t, None
+        if t is not None:
+            self.latency.record((sent_ns - t) / 1000)
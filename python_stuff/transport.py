@@ -0,0 +1,231 @@
+import select, socket, struct, threading, time
+from collections import deque
+
+from protocol import PACKET_LEN
+
+# Everything the ingest worker talks to looks like a small socket:
+#   open() -> self, recv_into(buf) -> n (0 = closed, socket.timeout when idle),
+#   sendall(data), settimeout(t), close()
+# TCP is the firmware's stream. UDP carries one frame per datagram behind a 4-byte
+# big-endian sequence number (and one motor packet per datagram the other way), so
+# a lost or late datagram never holds newer ones back; stale ones are dropped.
+# The firmware (src/main.cpp) only serves TCP: UDP works against sim_server.py
+# alone, and against the drone it opens fine and then never receives anything.
+# Loopback is an in-process pipe for tests and simulations.
+
+UDP_SEQ = struct.Struct(">I")
+UDP_HELLO = b""            # header-only datagram: "send telemetry to this address"
+TRANSPORT_HELP = "udp is sim_server.py only: the firmware serves TCP"
+
+
+def seq_newer(a: int, b: int) -> bool:
+    """True if sequence number a comes after b (mod 2**32)."""
+    return a != b and ((a - b) & 0xFFFFFFFF) < 0x80000000
+
+
+class Transport:
+    name = "transport"
+
+    def open(self):
+        return self
+
+    def recv_into(self, buf) -> int:
+        raise NotImplementedError
+
+    def sendall(self, data: bytes):
+        raise NotImplementedError
+
+    def settimeout(self, t):
+        pass
+
+    def close(self):
+        pass
+
+    def recv(self, n: int) -> bytes:
+        buf = bytearray(n)
+        got = self.recv_into(buf)
+        return bytes(buf[:got])
+
+
+class TcpTransport(Transport):
+    def __init__(self, host: str, port: int, connect_timeout: float = 5.0):
+        self.host, self.port = host, port
+        self.name = f"tcp://{host}:{port}"
+        self.connect_timeout = connect_timeout
+        self._sock = None
+
+    def open(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)   # 4-byte packets go out now
+        self._sock = sock
+        return self
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def recv_into(self, buf) -> int:
+        return self._sock.recv_into(buf)
+
+    def sendall(self, data: bytes):
+        self._sock.sendall(data)
+
+    def settimeout(self, t):
+        self._sock.settimeout(t)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+
+
+class UdpTransport(Transport):
+    """Datagram link to sim_server.py --transport udp. The firmware has no UDP endpoint."""
+    def __init__(self, host: str, port: int, hello_interval: float = 0.5):
+        self.host, self.port = host, port
+        self.name = f"udp://{host}:{port}"
+        self.hello_interval = hello_interval
+        self._sock = None
+        self._timeout = None
+        self._tx_seq = 0
+        self._rx_seq = None
+        self._last_hello = 0.0
+        self._dgram = bytearray(UDP_SEQ.size + PACKET_LEN + 64)
+        # stats
+        self.datagrams = 0
+        self.stale = 0         # arrived after a newer one; dropped
+        self.lost = 0          # sequence gaps
+        self.malformed = 0
+
+    def open(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect((self.host, self.port))
+        sock.setblocking(False)     # the timeout is applied by select() in recv_into
+        self._sock = sock
+        self._hello()
+        return self
+
+    def _hello(self):
+        self._last_hello = time.monotonic()
+        try:
+            self._sock.send(UDP_SEQ.pack(self._tx_seq) + UDP_HELLO)
+        except OSError:
+            pass
+
+    def settimeout(self, t):
+        self._timeout = t
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def sendall(self, data: bytes):
+        self._tx_seq = (self._tx_seq + 1) & 0xFFFFFFFF
+        self._sock.send(UDP_SEQ.pack(self._tx_seq) + bytes(data))
+
+    def _accept(self, n: int) -> bool:
+        """Check one datagram's header; True if its frame is fresh."""
+        self.datagrams += 1
+        if n != UDP_SEQ.size + PACKET_LEN:
+            self.malformed += 1
+            return False
+        seq = UDP_SEQ.unpack_from(self._dgram)[0]
+        if self._rx_seq is not None:
+            if not seq_newer(seq, self._rx_seq):
+                self.stale += 1
+                return False
+            self.lost += ((seq - self._rx_seq) & 0xFFFFFFFF) - 1
+        self._rx_seq = seq
+        return True
+
+    def recv(self, n: int) -> bytes:
+        # datagrams are whole frames; hand back the head of the next fresh one
+        buf = bytearray(max(n, PACKET_LEN))
+        return bytes(buf[:min(n, self.recv_into(buf))])
+
+    def recv_into(self, buf) -> int:
+        """Fresh frames only, as many as are queued (up to len(buf)), back to back."""
+        if time.monotonic() - self._last_hello >= self.hello_interval:
+            self._hello()     # re-register in case the drone restarted
+        out = memoryview(buf)
+        room = len(buf) // PACKET_LEN
+        if not room:
+            raise ValueError(f"buffer smaller than one {PACKET_LEN}-byte frame")
+        n = 0
+        if not select.select([self._sock], [], [], self._timeout)[0]:
+            raise socket.timeout()
+        try:
+            while n < room:
+                if self._accept(self._sock.recv_into(self._dgram)):
+                    out[n*PACKET_LEN:(n+1)*PACKET_LEN] = self._dgram[UDP_SEQ.size:UDP_SEQ.size + PACKET_LEN]
+                    n += 1
+        except BlockingIOError:
+            pass
+        except ConnectionRefusedError:
+            pass      # ICMP port unreachable: nobody listening (yet); look like an idle link
+        if n == 0:
+            raise socket.timeout()
+        return n * PACKET_LEN
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+
+
+class LoopbackTransport(Transport):
+    """
+    In-process byte pipe. `peer` is the other end (the "drone" side); bytes sent on
+    one end are received on the other, in order, with no kernel in between.
+    """
+    name = "loopback"
+
+    def __init__(self, _peer=None):
+        self._rx = deque()
+        self._cond = threading.Condition()
+        self._timeout = None
+        self._closed = False
+        self.peer = _peer or LoopbackTransport(self)
+
+    def _push(self, data: bytes):
+        with self._cond:
+            self._rx.append(bytes(data))
+            self._cond.notify()
+
+    def sendall(self, data: bytes):
+        if self._closed or self.peer._closed:
+            raise BrokenPipeError("loopback closed")
+        self.peer._push(data)
+
+    def settimeout(self, t):
+        self._timeout = t
+
+    def recv_into(self, buf) -> int:
+        with self._cond:
+            if not self._rx and not self._closed and not self.peer._closed:
+                if not self._cond.wait(self._timeout):
+                    raise socket.timeout()
+            if not self._rx:
+                return 0
+            out = memoryview(buf)
+            n = 0
+            while self._rx and n < len(buf):
+                chunk = self._rx[0]
+                k = min(len(chunk), len(buf) - n)
+                out[n:n + k] = chunk[:k]
+                n += k
+                if k < len(chunk):
+                    self._rx[0] = chunk[k:]
+                else:
+                    self._rx.popleft()
+            return n
+
+    def close(self):
+        self._closed = True
+        for end in (self, self.peer):
+            with end._cond:
+                end._cond.notify_all()
+
+
+def make_transport(kind: str, host: str, port: int) -> Transport:
+    if kind == "tcp":
+        return TcpTransport(host, port)
+    if kind == "udp":
+        return UdpTransport(host, port)
+    raise ValueError(f"unknown transport {kind!r} (tcp or udp)")
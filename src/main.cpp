@@ -26,6 +26,25 @@ uint8_t mFL=0, mFR=0, mBL=0, mBR=0; //latest motors
 Servo motorFL, motorFR, motorBL, motorBR;
 uint32_t lastTxMs = 0;
 
+// Telemetry v2: the 20-byte frame wrapped as
+//   sync A5 5A | version 2 | flags | seq u16 | micros u32 | frame[20] | crc16
+// (all big-endian, CRC-16/CCITT-FALSE over version..frame). Each connection starts
+// with "DRN\x02" so the host knows which layout follows. Set to 0 for the bare
+// 20-byte frames that older host tools expect.
+#ifndef TELEMETRY_V2
+#define TELEMETRY_V2 1
+#endif
+uint16_t txSeq = 0;
+
+uint16_t crc16(const uint8_t *p, size_t n) {
+  uint16_t crc = 0xFFFF;
+  while (n--) {
+    crc ^= (uint16_t)(*p++) << 8;
+    for (int i = 0; i < 8; ++i) crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
 void setup_motors(){
 
   ESP32PWM::allocateTimer(0);
@@ -130,6 +149,13 @@ void setup() {
 void loop() {
   if (!client || !client.connected()) {
     client = server.available();
+#if TELEMETRY_V2
+    if (client) {
+      const uint8_t hello[4] = {'D', 'R', 'N', 2};
+      client.write(hello, sizeof(hello));
+      txSeq = 0;
+    }
+#endif
     // set motors to 0
     motorFL.write(0);
     motorFR.write(0);
@@ -170,7 +196,20 @@ void loop() {
     frame[2]=mFL; frame[3]=mFR; frame[4]=mBL; frame[5]=mBR;
     memcpy(frame+6, raw14, 14);
 
+#if TELEMETRY_V2
+    uint8_t v2[32];
+    uint32_t us = micros();
+    v2[0] = 0xA5; v2[1] = 0x5A; v2[2] = 2; v2[3] = 0;
+    v2[4] = txSeq >> 8; v2[5] = txSeq & 0xFF;
+    v2[6] = us >> 24; v2[7] = (us >> 16) & 0xFF; v2[8] = (us >> 8) & 0xFF; v2[9] = us & 0xFF;
+    memcpy(v2 + 10, frame, sizeof(frame));
+    uint16_t crc = crc16(v2 + 2, 28);
+    v2[30] = crc >> 8; v2[31] = crc & 0xFF;
+    txSeq++;
+    client.write(v2, sizeof(v2)); // one complete v2 frame
+#else
     client.write(frame, sizeof(frame)); // one complete frame
+#endif
     // client.flush(); // optional
   }
 }